@@ -0,0 +1,73 @@
+"""
+Compara el coste de serializar un listado de 1000 vehículos con y sin modelos de respuesta.
+
+- ``orm + jsonable_encoder``: lo que hacía FastAPI al devolver instancias `Vehiculo`: recorrer cada
+  objeto ORM con `jsonable_encoder` y después ``json.dumps`` en `JSONResponse`.
+- ``filas + jsonable_encoder``: filas proyectadas como diccionarios, sin modelo de respuesta.
+- ``filas + ListaVehiculosOut``: lo que hace ahora ``/mis-vehiculos/``: filas con solo las columnas
+  necesarias convertidas en `VehiculoOut`, validadas y serializadas a bytes por Pydantic, igual que
+  hace FastAPI cuando el endpoint declara ``response_model``.
+
+Uso::
+
+    python benchmark_respuestas.py [--vehiculos 1000] [--repeticiones 20]
+"""
+import argparse
+import time
+from datetime import datetime
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from main import CAMPOS_VEHICULO, ListaVehiculosOut, Vehiculo, VehiculoOut
+
+def medir(funcion, repeticiones: int) -> float:
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--vehiculos", type=int, default=1000)
+    parser.add_argument("--repeticiones", type=int, default=20)
+    args = parser.parse_args()
+
+    filas = [
+        {
+            "id": i, "marca": "Seat", "modelo": "Leon", "year": 2015 + i % 10, "rpm": 800 + i, "velocidad": i % 180,
+            "vin": f"VSSZZZ5FZ{i:08d}", "revision": {"Motor": ["Aceite", "Filtro aire"], "Chasis": ["Frenos"]},
+            "usuario_id": 1,
+        }
+        for i in range(args.vehiculos)
+    ]
+    objetos = [Vehiculo(**fila, actualizado_en=datetime(2024, 1, 1)) for fila in filas]
+    adaptador = TypeAdapter(ListaVehiculosOut)
+
+    def antes():
+        return JSONResponse({"vehiculos": jsonable_encoder(objetos), "siguiente_cursor": None}).body
+
+    def diccionarios():
+        return JSONResponse({"vehiculos": jsonable_encoder(filas), "siguiente_cursor": None}).body
+
+    def despues():
+        lista = ListaVehiculosOut(vehiculos=[VehiculoOut.model_construct(**f) for f in filas], siguiente_cursor=None)
+        return adaptador.dump_json(lista, exclude_unset=True)
+
+    assert len(filas[0]) == len(CAMPOS_VEHICULO)
+    tiempos = {
+        "orm + jsonable_encoder": medir(antes, args.repeticiones),
+        "filas + jsonable_encoder": medir(diccionarios, args.repeticiones),
+        "filas + ListaVehiculosOut": medir(despues, args.repeticiones),
+    }
+    print(f"{args.vehiculos} vehículos\n")
+    print(f"{'serialización':<28}{'ms':>10}")
+    for nombre, segundos in tiempos.items():
+        print(f"{nombre:<28}{segundos * 1000:>10.2f}")
+    print(f"\nMejora: x{tiempos['orm + jsonable_encoder'] / tiempos['filas + ListaVehiculosOut']:.1f}")
+
+if __name__ == "__main__":
+    main()
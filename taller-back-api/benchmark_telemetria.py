@@ -0,0 +1,122 @@
+"""
+Compara el formato columnar de telemetría con el envío en JSON.
+
+Simula una grabación de 1 hora a 10 Hz de los PIDs del modo en vivo del cliente y mide, para cada
+formato, el tamaño del cuerpo enviado y el tiempo de CPU que el backend dedica a descomprimirlo,
+decodificarlo y convertirlo en filas listas para `insertar_telemetria` (la inserción es la misma en
+ambos casos y no se incluye).
+
+Uso::
+
+    python benchmark_telemetria.py [--segundos 3600] [--frecuencia 10] [--repeticiones 5]
+"""
+import argparse
+import gzip
+import json
+import math
+import os
+import random
+import time
+import zlib
+
+import zstandard
+
+# Una hora a 10 Hz supera el límite por lote que aplica el endpoint
+os.environ.setdefault("TELEMETRIA_MAX_MUESTRAS", "10000000")
+
+from main import (
+    TelemetriaLote, codificar_telemetria_columnar, decodificar_telemetria_columnar,
+    descomprimir_cuerpo, filas_telemetria_columnar,
+)
+
+LIMITE = 1 << 30
+VIN = "VSSZZZ5FZBENCH0001"
+
+def grabacion(segundos: int, frecuencia: int) -> list:
+    """
+    Genera muestras ``[ts, pid, valor]`` con la forma de una conducción real (redondeadas a centésimas).
+    """
+    aleatorio = random.Random(42)
+    rpm, velocidad, acelerador = 800.0, 0.0, 0.0
+    inicio = 1_700_000_000.0
+    muestras = []
+    for ciclo in range(segundos * frecuencia):
+        ts = round(inicio + ciclo / frecuencia + aleatorio.uniform(0, 0.004), 3)
+        acelerador = min(max(acelerador + aleatorio.uniform(-3, 3), 0), 100)
+        rpm = min(max(rpm + (acelerador * 60 - rpm) * 0.05 + aleatorio.uniform(-40, 40), 700), 6500)
+        velocidad = min(max(velocidad + (acelerador - 20) * 0.02, 0), 180)
+        valores = {
+            "0C": round(rpm * 4) / 4,
+            "0D": round(velocidad),
+            "11": round(round(acelerador * 2.55) * 100 / 255, 2),
+            "04": round(round(acelerador * 2.2) * 100 / 255, 2),
+            "05": 90 + round(2 * math.sin(ciclo / 3000)),
+            "0F": 35,
+        }
+        muestras.extend([ts, pid, valor] for pid, valor in valores.items())
+    return muestras
+
+def procesar_json(cuerpo: bytes) -> list:
+    # Mismo trabajo que la rama JSON de guardar_telemetria
+    lote = TelemetriaLote.model_validate_json(descomprimir_cuerpo(cuerpo, "gzip", LIMITE))
+    filas = []
+    for ts, pid, valor in lote.muestras:
+        pid = pid.strip().upper()
+        if not (1 <= len(pid) <= 4) or not math.isfinite(valor) or not math.isfinite(ts):
+            raise ValueError(pid)
+        filas.append({"vehiculo_id": 1, "pid": pid, "ts": round(ts * 1000), "valor": valor})
+    return filas
+
+def procesar_columnar(cuerpo: bytes, codificacion: str) -> list:
+    _, series = decodificar_telemetria_columnar(descomprimir_cuerpo(cuerpo, codificacion, LIMITE))
+    return filas_telemetria_columnar(1, series)
+
+def medir(funcion, repeticiones: int) -> float:
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--segundos", type=int, default=3600)
+    parser.add_argument("--frecuencia", type=int, default=10)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+
+    muestras = grabacion(args.segundos, args.frecuencia)
+    objetos = json.dumps([{"ts": ts, "pid": pid, "value": valor} for ts, pid, valor in muestras]).encode()
+    arrays = json.dumps({"vin": VIN, "muestras": muestras}, separators=(",", ":")).encode()
+    columnar = codificar_telemetria_columnar(VIN, muestras)
+    cuerpos = {
+        "json objetos": objetos,
+        "json objetos gzip": gzip.compress(objetos),
+        "json arrays": arrays,
+        "json arrays gzip": gzip.compress(arrays),
+        "columnar": columnar,
+        "columnar deflate": zlib.compress(columnar, 6),
+        "columnar zstd": zstandard.ZstdCompressor(level=3).compress(columnar),
+    }
+
+    print(f"{len(muestras)} muestras ({args.segundos} s a {args.frecuencia} Hz)\n")
+    print(f"{'formato':<20}{'bytes':>12}{'bytes/muestra':>15}")
+    for nombre, cuerpo in cuerpos.items():
+        print(f"{nombre:<20}{len(cuerpo):>12}{len(cuerpo) / len(muestras):>15.2f}")
+
+    assert len(procesar_json(cuerpos["json arrays gzip"])) == len(procesar_columnar(cuerpos["columnar zstd"], "zstd"))
+    tiempos = {
+        "json arrays gzip": medir(lambda: procesar_json(cuerpos["json arrays gzip"]), args.repeticiones),
+        "columnar deflate": medir(lambda: procesar_columnar(cuerpos["columnar deflate"], "deflate"), args.repeticiones),
+        "columnar zstd": medir(lambda: procesar_columnar(cuerpos["columnar zstd"], "zstd"), args.repeticiones),
+        "columnar zstd (decodificación)": medir(
+            lambda: decodificar_telemetria_columnar(descomprimir_cuerpo(cuerpos["columnar zstd"], "zstd", LIMITE)), args.repeticiones
+        ),
+    }
+    print(f"\n{'procesado en el backend':<32}{'ms':>10}")
+    for nombre, segundos in tiempos.items():
+        print(f"{nombre:<32}{segundos * 1000:>10.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,69 @@
+import gzip
+import json
+import os
+import queue
+import random
+import sqlite3
+import struct
+import sys
+import threading
+import zlib
+from array import array
 import requests
 import serial
 import serial.tools.list_ports
 import time
+from collections import deque
 import ttkbootstrap as ttk
 from ttkbootstrap.constants import *
 from tkinter import messagebox, Toplevel, StringVar, IntVar, Canvas, Label, Checkbutton, Button, Frame
 from PIL import Image, ImageTk
 import ctypes
+from obd_respuestas import (
+    MODOS_DTC, PROTOCOLOS_CAN, interpretar_dtc, interpretar_multi_pid,
+    interpretar_respuesta_rpm, interpretar_respuesta_velocidad, leer_vin,
+)
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 API_URL = "https://taller-api.web82.es"
 token = None
 selected_port = None
 revision_data = {}
 
+# Parámetros del adaptador ELM327
+ELM_BAUDRATE = 9600
+ELM_TIMEOUT_LECTURA = 0.05  # Timeout de cada read(): el fin de respuesta lo marca el prompt '>'
+ELM_TIMEOUT_COMANDO = 2     # Máximo por comando (los primeros comandos OBD incluyen "SEARCHING...")
+ELM_TIMEOUT_RESET = 5       # ATZ reinicia el adaptador y tarda más en responder
+
+# Resultados de los hilos de trabajo que deben aplicarse en el hilo de Tk
+cola_ui = queue.Queue()
+
+# Modo en vivo (los PIDs admitidos están en obd_respuestas.PIDS_MODO_01)
+PIDS_EN_VIVO = ["0C", "0D", "11", "04", "05", "0F"]
+FRECUENCIA_EN_VIVO = 10          # Ciclos de lectura por segundo
+MAX_PIDS_POR_PETICION = 6        # Límite del ELM327 para peticiones multi-PID del modo 01
+MUESTRAS_BUFFER = 60000          # Tamaño del buffer circular (se descartan las más antiguas)
+ENVIO_EN_VIVO_INTERVALO = 5      # Segundos entre envíos al backend
+ENVIO_EN_VIVO_LOTE = 5000        # Muestras por petición
+TELEMETRIA_TIPO = "application/vnd.taller.telemetria"  # Formato columnar (ver decodificar_telemetria_columnar en main.py)
+TELEMETRIA_ESCALA = 0.01         # Los valores se redondean a centésimas antes de enviarse
+
+# Diario local: todo escaneo se guarda aquí antes de enviarse y un hilo lo sincroniza con el backend
+DIARIO_RUTA = os.getenv("TALLER_DIARIO", os.path.join(os.path.expanduser("~"), ".taller-obd", "diario.db"))
+DIARIO_RETENCION = 7 * 24 * 3600  # Los registros ya enviados se borran pasada una semana
+SYNC_INTERVALO = 30               # Segundos entre pasadas cuando no hay avisos
+SYNC_LOTE_VEHICULOS = 100         # Vehículos por petición a /ingesta/lote
+SYNC_BACKOFF_BASE = 2             # Espera tras el primer fallo; se duplica en cada fallo seguido
+SYNC_BACKOFF_MAX = 300
+SYNC_TIMEOUT = (5, 30)            # (conexión, lectura)
+# Sin eco, saltos de línea, espacios ni cabeceras; timing adaptativo agresivo y timeout de ~100 ms (0x19 * 4 ms)
+ELM_AJUSTES_EN_VIVO = ["ATL0", "ATS0", "ATH0", "ATAT2", "ATST19"]
+
 partes_generales = ["Motor", "Chasis", "Caja de cambios"]
 detalles_motor = ["Correa distribución", "Filtro aire", "Bujías", "Inyectores", "Aceite", "Refrigerante", "Batería", "Alternador", "Turbocompresor"]
 detalles_chasis = ["Suspensión", "Frenos", "Rótulas", "Amortiguadores", "Discos", "Pastillas", "Dirección", "Eje delantero", "Eje trasero", "Ruedas"]
@@ -34,10 +85,16 @@ def obtener_token():
         messagebox.showwarning("Aviso", "Por favor, ingrese usuario y contraseña.")
         return
 
-    response = requests.post(
-        f"{API_URL}/login",
-        json={"username": usuario, "password": password}
-    )
+    try:
+        response = requests.post(
+            f"{API_URL}/login",
+            json={"username": usuario, "password": password},
+            timeout=SYNC_TIMEOUT
+        )
+    except requests.RequestException as e:
+        login_button.config(text="Login")
+        messagebox.showerror("Error", f"No se pudo conectar con el servidor: {e}")
+        return
 
     if response.status_code == 200:
         global token
@@ -45,6 +102,8 @@ def obtener_token():
         login_frame.pack_forget()
         main_frame.pack(expand=True)
         cargar_puertos()
+        sincronizador.iniciar(token)
+        actualizar_estado_sincronizacion()
     else:
         messagebox.showerror("Error", f"Error en el login: {response.text}")
 
@@ -58,71 +117,313 @@ def cargar_puertos():
         puerto_combo['values'] = ["No se detectaron dispositivos"]
         btn_enviar.config(state=DISABLED)
 
-def leer_datos_obd2():
-    port_info = puerto_combo.get()
-    if " - " not in port_info:
-        messagebox.showerror("Error", "Seleccione un puerto válido.")
-        return
-
-    PORT = port_info.split(" - ")[0]
-    BAUDRATE = 9600
-    TIMEOUT = 1
-
-    try:
-        with serial.Serial(PORT, BAUDRATE, timeout=TIMEOUT) as elm:
-            def enviar_comando(comando):
-                elm.write((comando + "\r").encode())
-                time.sleep(0.5)
-                respuesta = elm.readlines()
-                return [line.decode().strip() for line in respuesta]
-
-            enviar_comando("ATZ")
-            enviar_comando("ATE0")
-            enviar_comando("ATSP0")
+def en_hilo_ui(funcion, *args):
+    # Encola una llamada para ejecutarla en el hilo de Tk (los widgets no son thread-safe)
+    cola_ui.put((funcion, args))
 
-            respuesta_vin = enviar_comando("0902")
-            vin = interpretar_respuesta_vin(respuesta_vin)
+def procesar_cola_ui():
+    while True:
+        try:
+            funcion, args = cola_ui.get_nowait()
+        except queue.Empty:
+            break
+        funcion(*args)
+    ventana.after(50, procesar_cola_ui)
+
+def enviar_comando(elm, comando, timeout=ELM_TIMEOUT_COMANDO):
+    # Lee hasta el prompt '>' del ELM327 en lugar de esperar un tiempo fijo
+    elm.reset_input_buffer()
+    elm.write((comando + "\r").encode())
+    respuesta = b""
+    limite = time.monotonic() + timeout
+    while b">" not in respuesta and time.monotonic() < limite:
+        respuesta += elm.read(elm.in_waiting or 1)
+    texto = respuesta.decode(errors="ignore").replace(">", "").replace("\r", "\n")
+    return [linea.strip() for linea in texto.split("\n") if linea.strip()]
+
+def leer_datos_obd2(puerto):
+    with serial.Serial(puerto, ELM_BAUDRATE, timeout=ELM_TIMEOUT_LECTURA) as elm:
+        enviar_comando(elm, "ATZ", timeout=ELM_TIMEOUT_RESET)
+        enviar_comando(elm, "ATE0")
+        enviar_comando(elm, "ATSP0")
+
+        respuesta_vin = enviar_comando(elm, "0902")
+        vin = leer_vin(respuesta_vin)
+
+        respuesta_rpm = enviar_comando(elm, "010C")
+        rpm = interpretar_respuesta_rpm(respuesta_rpm)
+
+        respuesta_velocidad = enviar_comando(elm, "010D")
+        velocidad = interpretar_respuesta_velocidad(respuesta_velocidad)
+
+        protocolo = enviar_comando(elm, "ATDPN")
+        can = bool(protocolo) and protocolo[-1][-1:] in PROTOCOLOS_CAN
+        dtc = {modo: interpretar_dtc(enviar_comando(elm, modo), modo, can) for modo in MODOS_DTC}
+
+        return {"vin": vin, "rpm": rpm, "velocidad": velocidad, "dtc": dtc}
+
+def codificar_telemetria(vin, muestras):
+    # Una serie por PID: timestamps (ms) y valores cuantizados como deltas int32 little-endian
+    series = {}
+    for ts, pid, valor in muestras:
+        series.setdefault(pid, []).append((round(ts * 1000), round(valor / TELEMETRIA_ESCALA)))
+
+    vin_bytes = vin.encode()
+    partes = [b"TLC1", struct.pack("<H", len(vin_bytes)), vin_bytes, struct.pack("<H", len(series))]
+    for pid, puntos in series.items():
+        deltas_ts, deltas_valor = array("i"), array("i")
+        ts_anterior, valor_anterior = puntos[0][0], 0
+        for ts, valor in puntos:
+            deltas_ts.append(ts - ts_anterior)
+            deltas_valor.append(valor - valor_anterior)
+            ts_anterior, valor_anterior = ts, valor
+        if sys.byteorder == "big":
+            deltas_ts.byteswap()
+            deltas_valor.byteswap()
+        partes.append(struct.pack("<4sIqd", pid.encode("ascii").ljust(4), len(puntos), puntos[0][0], TELEMETRIA_ESCALA))
+        partes.append(deltas_ts.tobytes())
+        partes.append(deltas_valor.tobytes())
+    return b"".join(partes)
+
+def comprimir_telemetria(datos):
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=3).compress(datos), "zstd"
+    return zlib.compress(datos, 6), "deflate"
+
+class Diario:
+    # Registros pendientes de enviar (tipo "vehiculo" con JSON o "telemetria" con el formato columnar).
+    # Cada operación abre su propia conexión, así que puede usarse desde cualquier hilo.
+    def __init__(self, ruta=DIARIO_RUTA):
+        self.ruta = ruta
+        os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+        self._ejecutar("PRAGMA journal_mode=WAL")
+        self._ejecutar("""
+            CREATE TABLE IF NOT EXISTS registros (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                tipo TEXT NOT NULL,
+                vin TEXT NOT NULL,
+                datos BLOB NOT NULL,
+                creado REAL NOT NULL,
+                estado TEXT NOT NULL DEFAULT 'pendiente',
+                intentos INTEGER NOT NULL DEFAULT 0,
+                error TEXT
+            )
+        """)
+        self._ejecutar("CREATE INDEX IF NOT EXISTS ix_registros_estado ON registros (estado, tipo, id)")
+        self._ejecutar("DELETE FROM registros WHERE estado = 'enviado' AND creado < ?", (time.time() - DIARIO_RETENCION,))
 
-            if not vin or vin == "DESCONOCIDO":
-                vin = "1HGCM82633A123456"
+    def _ejecutar(self, sql, parametros=()):
+        conexion = sqlite3.connect(self.ruta, timeout=10)
+        try:
+            with conexion:
+                return conexion.execute(sql, parametros).fetchall()
+        finally:
+            conexion.close()
 
-            respuesta_rpm = enviar_comando("010C")
-            rpm = interpretar_respuesta_rpm(respuesta_rpm)
+    def guardar(self, tipo, vin, datos):
+        self._ejecutar("INSERT INTO registros (tipo, vin, datos, creado) VALUES (?, ?, ?, ?)", (tipo, vin, datos, time.time()))
 
-            respuesta_velocidad = enviar_comando("010D")
-            velocidad = interpretar_respuesta_velocidad(respuesta_velocidad)
+    def pendientes(self, tipo, limite):
+        return self._ejecutar(
+            "SELECT id, vin, datos FROM registros WHERE estado = 'pendiente' AND tipo = ? ORDER BY id LIMIT ?", (tipo, limite)
+        )
 
-            return {"vin": vin, "rpm": rpm, "velocidad": velocidad}
+    def marcar(self, ids, estado, error=None):
+        marcas = ",".join("?" * len(ids))
+        self._ejecutar(f"UPDATE registros SET estado = ?, error = ? WHERE id IN ({marcas})", (estado, error, *ids))
+
+    def anotar_fallo(self, ids, error):
+        marcas = ",".join("?" * len(ids))
+        self._ejecutar(f"UPDATE registros SET intentos = intentos + 1, error = ? WHERE id IN ({marcas})", (error, *ids))
+
+    def resumen(self):
+        return dict(self._ejecutar("SELECT estado, COUNT(*) FROM registros WHERE estado != 'enviado' GROUP BY estado"))
+
+class ErrorTransitorio(Exception):
+    pass
+
+class Sincronizador:
+    # Envía el diario al backend desde un hilo, con una sesión HTTP persistente (keep-alive),
+    # cuerpos comprimidos y backoff exponencial cuando falla la red o el servidor.
+    def __init__(self, diario):
+        self.diario = diario
+        self.sesion = requests.Session()
+        self.despertar = threading.Event()
+        self.fallos = 0
+        self.error = None
+        self.proximo_intento = None
+        self.ingesta_lote = True  # Se desactiva si el backend no tiene /ingesta/lote
+        self.hilo = None
+
+    def iniciar(self, token):
+        self.sesion.headers["Authorization"] = f"Bearer {token}"
+        if self.hilo is None:
+            self.hilo = threading.Thread(target=self._bucle, daemon=True)
+            self.hilo.start()
+        self.avisar()
+
+    def avisar(self):
+        self.despertar.set()
+
+    def _bucle(self):
+        while True:
+            self.despertar.clear()
+            try:
+                self._sincronizar()
+                self.fallos, self.error, self.proximo_intento = 0, None, None
+                self.despertar.wait(SYNC_INTERVALO)
+            except Exception as e:  # El hilo no debe morir: cualquier fallo se reintenta con backoff
+                self.fallos += 1
+                self.error = e
+                espera = min(SYNC_BACKOFF_MAX, SYNC_BACKOFF_BASE * 2 ** (self.fallos - 1)) * random.uniform(0.5, 1)
+                self.proximo_intento = time.monotonic() + espera
+                time.sleep(espera)  # Durante el backoff no se atienden avisos
+
+    def _post(self, ruta, ids, **kwargs):
+        try:
+            response = self.sesion.post(f"{API_URL}{ruta}", timeout=SYNC_TIMEOUT, **kwargs)
+        except requests.RequestException as e:
+            self.diario.anotar_fallo(ids, str(e))
+            raise
+        if response.status_code in (401, 408, 429) or response.status_code >= 500:
+            self.diario.anotar_fallo(ids, f"{response.status_code}: {response.text[:200]}")
+            raise ErrorTransitorio(f"{ruta}: HTTP {response.status_code}")
+        return response
+
+    def _sincronizar(self):
+        # Primero los vehículos: la telemetría solo se acepta para vehículos ya registrados
+        while registros := self.diario.pendientes("vehiculo", SYNC_LOTE_VEHICULOS):
+            if not (self.ingesta_lote and self._enviar_lote(registros)):
+                self._enviar_uno_a_uno(registros)
+        while registros := self.diario.pendientes("telemetria", 1):
+            id_registro, vin, datos = registros[0]
+            cuerpo, codificacion = comprimir_telemetria(datos)
+            response = self._post("/telemetria/lote", [id_registro], data=cuerpo, headers={
+                "Content-Type": TELEMETRIA_TIPO, "Content-Encoding": codificacion
+            })
+            if response.ok:
+                self.diario.marcar([id_registro], "enviado")
+            else:
+                self.diario.marcar([id_registro], "rechazado", response.text[:500])
+
+    def _enviar_lote(self, registros):
+        ids = [r[0] for r in registros]
+        lote = {"vehiculos": [json.loads(datos) for _, _, datos in registros]}
+        response = self._post("/ingesta/lote", ids, data=gzip.compress(json.dumps(lote).encode()), headers={
+            "Content-Type": "application/json", "Content-Encoding": "gzip"
+        })
+        if response.status_code in (404, 405):
+            self.ingesta_lote = False
+            return False
+        if not response.ok:
+            return False  # Algún registro no es válido: se envían uno a uno para aislarlo
+        for resultado in response.json()["resultados"]:
+            id_registro = ids[resultado["indice"]]
+            if resultado["estado"] == "error":
+                self.diario.marcar([id_registro], "rechazado", resultado["detalle"])
+            else:
+                self.diario.marcar([id_registro], "enviado")
+        return True
+
+    def _enviar_uno_a_uno(self, registros):
+        for id_registro, vin, datos in registros:
+            vehiculo = json.loads(datos)
+            errores = vehiculo.pop("errores", [])
+            response = self._post("/guardar-vehiculo/", [id_registro], json=vehiculo)
+            if response.ok and errores:
+                response = self._post("/guardar-errores/", [id_registro], json={
+                    "codigo_dtc": errores, "vehiculo_id": response.json()["id"]
+                })
+            if response.ok:
+                self.diario.marcar([id_registro], "enviado")
+            else:
+                self.diario.marcar([id_registro], "rechazado", response.text[:500])
+
+class SesionEnVivo:
+    # Lectura continua de PIDs en un hilo; otro vuelca periódicamente las muestras al diario.
+    # Las muestras (ts, pid, valor) se guardan en un buffer circular de tamaño fijo.
+    def __init__(self, puerto, pids=PIDS_EN_VIVO, frecuencia=FRECUENCIA_EN_VIVO):
+        self.puerto = puerto
+        self.pids = pids
+        self.frecuencia = frecuencia
+        self.buffer = deque(maxlen=MUESTRAS_BUFFER)
+        self.parar = threading.Event()
+        self.vin = None
+        self.ciclos = 0
+        self.muestras = 0
+        self.descartadas = 0
+        self.guardadas = 0
+        self.error = None
+
+    def iniciar(self):
+        threading.Thread(target=self._adquirir, daemon=True).start()
+        threading.Thread(target=self._volcar, daemon=True).start()
+
+    def detener(self):
+        self.parar.set()
+
+    def _adquirir(self):
+        try:
+            with serial.Serial(self.puerto, ELM_BAUDRATE, timeout=ELM_TIMEOUT_LECTURA) as elm:
+                enviar_comando(elm, "ATZ", timeout=ELM_TIMEOUT_RESET)
+                enviar_comando(elm, "ATE0")
+                enviar_comando(elm, "ATSP0")
+                self.vin = leer_vin(enviar_comando(elm, "0902"))
+                for ajuste in ELM_AJUSTES_EN_VIVO:
+                    enviar_comando(elm, ajuste)
+
+                grupos = [self.pids[i:i + MAX_PIDS_POR_PETICION] for i in range(0, len(self.pids), MAX_PIDS_POR_PETICION)]
+                periodo = 1 / self.frecuencia
+                siguiente_ciclo = time.monotonic()
+                while not self.parar.is_set():
+                    for grupo in grupos:
+                        lineas = enviar_comando(elm, "01" + "".join(grupo))
+                        ts = round(time.time(), 3)
+                        for pid, valor in interpretar_multi_pid(lineas).items():
+                            if len(self.buffer) == self.buffer.maxlen:
+                                self.descartadas += 1
+                            self.buffer.append((ts, pid, round(valor, 2)))
+                            self.muestras += 1
+                    self.ciclos += 1
+
+                    siguiente_ciclo += periodo
+                    espera = siguiente_ciclo - time.monotonic()
+                    if espera > 0:
+                        self.parar.wait(espera)
+                    else:
+                        siguiente_ciclo = time.monotonic()  # El adaptador no llega a la frecuencia objetivo
+        except Exception as e:
+            self.error = e
+            self.parar.set()
+
+    def _volcar(self):
+        while True:
+            parando = self.parar.wait(ENVIO_EN_VIVO_INTERVALO)
+            # Al parar se vacía el buffer completo; si no, un lote por ciclo
+            while self.buffer and self.vin:
+                pendiente = [self.buffer.popleft() for _ in range(min(len(self.buffer), ENVIO_EN_VIVO_LOTE))]
+                try:
+                    diario.guardar("telemetria", self.vin, codificar_telemetria(self.vin, pendiente))
+                except sqlite3.Error as e:
+                    self.error = e
+                    break
+                self.guardadas += len(pendiente)
+                sincronizador.avisar()
+                if not parando:
+                    break
+            if parando:
+                return
+
+def escanear_en_segundo_plano(puerto, al_terminar):
+    # La lectura serie se hace en un hilo; el resultado vuelve a Tk a través de cola_ui
+    def trabajo():
+        try:
+            datos, error = leer_datos_obd2(puerto), None
+        except Exception as e:
+            datos, error = None, e
+        en_hilo_ui(al_terminar, datos, error)
 
-    except Exception as e:
-        messagebox.showerror("Error", f"No se pudo conectar al OBD-II: {e}")
-        return {"vin": "1HGCM82633A123456", "rpm": 5200, "velocidad": 168}
-
-def interpretar_respuesta_vin(respuesta):
-    vin = ""
-    for linea in respuesta:
-        if "49 02" in linea:
-            partes = linea.split(" ")[2:]
-            vin += "".join(chr(int(p, 16)) for p in partes if p != "00")
-    return vin.strip() if vin else "DESCONOCIDO"
-
-def interpretar_respuesta_rpm(respuesta):
-    for linea in respuesta:
-        if "41 0C" in linea:
-            partes = linea.split(" ")
-            if len(partes) >= 4:
-                A = int(partes[2], 16)
-                B = int(partes[3], 16)
-                return ((A * 256) + B) / 4
-    return 0
-
-def interpretar_respuesta_velocidad(respuesta):
-    for linea in respuesta:
-        if "41 0D" in linea:
-            partes = linea.split(" ")
-            if len(partes) >= 3:
-                return int(partes[2], 16)
-    return 0
+    threading.Thread(target=trabajo, daemon=True).start()
 
 def enviar_datos():
     if not token:
@@ -137,10 +438,30 @@ def enviar_datos():
         messagebox.showwarning("Aviso", "Ingrese marca, modelo y año.")
         return
 
-    datos_obd = leer_datos_obd2()
+    port_info = puerto_combo.get()
+    if " - " not in port_info:
+        messagebox.showerror("Error", "Seleccione un puerto válido.")
+        return
+
+    btn_enviar.config(state=DISABLED, text="Escaneando...")
+    escanear_en_segundo_plano(
+        port_info.split(" - ")[0],
+        lambda datos_obd, error: escaneo_terminado(datos_obd, error, marca, modelo, year)
+    )
+
+def escaneo_terminado(datos_obd, error, marca, modelo, year):
+    btn_enviar.config(state=NORMAL, text="Revisión y Enviar")
+    if error:
+        messagebox.showerror("Error", f"No se pudo leer el vehículo por OBD-II: {error}")
+        return
 
     vin_label.config(text=f"VIN: {datos_obd['vin']}")
 
+    dtc = datos_obd.get("dtc", {})
+    errores = []
+    for modo in MODOS_DTC:
+        errores += [codigo for codigo in dtc.get(modo, []) if codigo not in errores]
+
     vehiculo_data = {
         "marca": marca,
         "modelo": modelo,
@@ -148,16 +469,67 @@ def enviar_datos():
         "rpm": datos_obd["rpm"],
         "velocidad": datos_obd["velocidad"],
         "vin": datos_obd["vin"],
-        "revision": revision_data
+        "revision": revision_data,
+        "errores": errores
     }
 
-    headers = {"Authorization": f"Bearer {token}"}
-    response = requests.post(f"{API_URL}/guardar-vehiculo/", json=vehiculo_data, headers=headers)
+    # Se guarda en local y el sincronizador lo envía cuando haya conexión
+    diario.guardar("vehiculo", vehiculo_data["vin"], json.dumps(vehiculo_data))
+    sincronizador.avisar()
+    resumen_dtc = ", ".join(f"{len(dtc.get(modo, []))} {tipo}" for modo, (_, tipo) in MODOS_DTC.items())
+    messagebox.showinfo("Éxito", f"Escaneo guardado (DTC: {resumen_dtc}). Se enviará al servidor en segundo plano.")
 
-    if response.status_code == 200:
-        messagebox.showinfo("Éxito", "Datos del vehículo enviados correctamente.")
-    else:
-        messagebox.showerror("Error", f"No se pudo enviar: {response.text}")
+sesion_en_vivo = None
+
+def alternar_modo_en_vivo():
+    global sesion_en_vivo
+    if sesion_en_vivo:
+        sesion_en_vivo.detener()
+        sesion_en_vivo = None
+        btn_en_vivo.config(text="Iniciar modo en vivo")
+        btn_enviar.config(state=NORMAL)
+        return
+
+    if not token:
+        messagebox.showerror("Error", "Debe iniciar sesión primero.")
+        return
+    port_info = puerto_combo.get()
+    if " - " not in port_info:
+        messagebox.showerror("Error", "Seleccione un puerto válido.")
+        return
+
+    sesion_en_vivo = SesionEnVivo(port_info.split(" - ")[0])
+    sesion_en_vivo.iniciar()
+    btn_en_vivo.config(text="Detener modo en vivo")
+    btn_enviar.config(state=DISABLED)
+    actualizar_estado_en_vivo(sesion_en_vivo, sesion_en_vivo.ciclos, time.monotonic())
+
+def actualizar_estado_en_vivo(sesion, ciclos_previos, instante_previo):
+    ahora = time.monotonic()
+    frecuencia = (sesion.ciclos - ciclos_previos) / max(ahora - instante_previo, 1e-6)
+    texto = f"{frecuencia:.1f} Hz · {sesion.muestras} muestras · {sesion.guardadas} guardadas"
+    if sesion.descartadas:
+        texto += f" · {sesion.descartadas} descartadas"
+    if sesion.error:
+        texto += f" · Error: {sesion.error}"
+    estado_en_vivo_label.config(text=texto)
+
+    if sesion is sesion_en_vivo and not sesion.parar.is_set():
+        ventana.after(1000, actualizar_estado_en_vivo, sesion, sesion.ciclos, ahora)
+    elif sesion is sesion_en_vivo:
+        alternar_modo_en_vivo()  # La adquisición se ha detenido por un error
+
+def actualizar_estado_sincronizacion():
+    resumen = diario.resumen()
+    pendientes, rechazados = resumen.get("pendiente", 0), resumen.get("rechazado", 0)
+    texto = f"{pendientes} registros pendientes de enviar" if pendientes else "Todo sincronizado"
+    if rechazados:
+        texto += f" · {rechazados} rechazados por el servidor"
+    if sincronizador.error and sincronizador.proximo_intento:
+        espera = max(sincronizador.proximo_intento - time.monotonic(), 0)
+        texto += f" · Reintento en {espera:.0f} s ({sincronizador.error})"
+    sincronizacion_label.config(text=texto)
+    ventana.after(2000, actualizar_estado_sincronizacion)
 
 def mostrar_imagen(parent, ruta):
     try:
@@ -361,6 +733,9 @@ def mostrar_modal_detalle():
 
     mostrar_parte()
 
+diario = Diario()
+sincronizador = Sincronizador(diario)
+
 # Mejora visual para pantallas con escala alta en Windows
 ctypes.windll.shcore.SetProcessDpiAwareness(1)
 
@@ -430,4 +805,14 @@ btn_enviar = ttk.Button(main_frame, text="Revisión y Enviar", command=mostrar_m
 btn_enviar.pack(pady=20)
 btn_enviar.config(state=DISABLED)
 
+btn_en_vivo = ttk.Button(main_frame, text="Iniciar modo en vivo", command=alternar_modo_en_vivo, **btn_style)
+btn_en_vivo.pack(pady=(0, 10))
+
+estado_en_vivo_label = ttk.Label(main_frame, text="", foreground="#1ABC9C", font=("Segoe UI", 10))
+estado_en_vivo_label.pack()
+
+sincronizacion_label = ttk.Label(main_frame, text="", foreground="#7F8C8D", font=("Segoe UI", 10))
+sincronizacion_label.pack(pady=(10, 0))
+
+procesar_cola_ui()
 ventana.mainloop()
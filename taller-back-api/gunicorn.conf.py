@@ -0,0 +1,66 @@
+"""
+Perfil de producción de la API: gunicorn como gestor de procesos con workers de uvicorn.
+
+Gunicorn carga este archivo automáticamente al arrancar desde este directorio::
+
+    gunicorn main:app
+
+- Un worker por CPU disponible (``SERVIDOR_WORKERS`` para fijarlo); cada worker es un bucle
+  asíncrono con uvloop y httptools si están instalados (``uvicorn[standard]``).
+- La aplicación se importa una sola vez en el proceso maestro (``preload_app``) y los workers
+  la heredan al hacer fork; cada worker descarta los pools de conexiones heredados.
+- Con SIGTERM cada worker deja de aceptar conexiones, espera a las peticiones en curso hasta
+  ``SERVIDOR_GRACEFUL_TIMEOUT`` y cierra el outbox de correos, el pool de bcrypt y el de la base de datos.
+
+Toda la configuración se lee de variables de entorno ``SERVIDOR_*``.
+"""
+import os
+
+from uvicorn_worker import UvicornWorker
+
+def entero(nombre: str, defecto: int) -> int:
+    # Las variables vacías (p. ej. ``${SERVIDOR_WORKERS:-}`` en compose) usan el valor por defecto
+    valor = os.getenv(nombre, "").strip()
+    return int(valor) if valor else defecto
+
+def cpus_disponibles() -> int:
+    # sched_getaffinity respeta el cpuset del contenedor; no existe en todas las plataformas
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+workers = entero("SERVIDOR_WORKERS", cpus_disponibles())
+bind = os.getenv("SERVIDOR_BIND", "0.0.0.0:8000")
+backlog = entero("SERVIDOR_BACKLOG", 2048)
+keepalive = entero("SERVIDOR_KEEPALIVE", 75)
+timeout = entero("SERVIDOR_TIMEOUT", 60)
+graceful_timeout = entero("SERVIDOR_GRACEFUL_TIMEOUT", 30)
+max_requests = entero("SERVIDOR_MAX_REQUESTS", 0)
+max_requests_jitter = entero("SERVIDOR_MAX_REQUESTS_JITTER", 0)
+forwarded_allow_ips = os.getenv("SERVIDOR_FORWARDED_ALLOW_IPS", "127.0.0.1")
+preload_app = os.getenv("SERVIDOR_PRELOAD", "True") == "True"
+accesslog = "-" if os.getenv("SERVIDOR_ACCESS_LOG", "False") == "True" else None
+errorlog = "-"
+loglevel = os.getenv("SERVIDOR_LOG_LEVEL", "info")
+
+# Los procesos de bcrypt se reparten entre los workers en lugar de lanzar un pool completo por worker
+os.environ.setdefault("PASSWORD_POOL_WORKERS", str(max(1, cpus_disponibles() // max(1, workers))))
+
+class WorkerTaller(UvicornWorker):
+    """
+    Worker de uvicorn que cancela las peticiones que sigan abiertas poco antes de que gunicorn
+    mate el proceso, para que siempre se ejecute el evento ``shutdown`` de la API.
+    """
+    CONFIG_KWARGS = {
+        **UvicornWorker.CONFIG_KWARGS,
+        "timeout_graceful_shutdown": max(1, graceful_timeout - 5),
+    }
+
+worker_class = WorkerTaller
+
+def post_fork(server, worker):
+    # Las conexiones abiertas en el maestro no se pueden compartir entre procesos
+    from main import async_engine, engine
+    engine.dispose(close=False)
+    if async_engine is not None:
+        async_engine.sync_engine.dispose(close=False)
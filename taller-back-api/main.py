@@ -1,47 +1,248 @@
+import asyncio
+import base64
+import csv
+import email.message
+import hashlib
+import io
+import json
+import logging
+import math
+import multiprocessing
 import os
+import sqlite3
+import struct
+import tempfile
+import threading
+import time
 import uuid
-from datetime import datetime, timedelta
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
 from pathlib import Path
-
-import requests
+from typing import Optional
+
+import aiosmtplib
+import httpx
+import numpy as np
+from alembic.config import Config as AlembicConfig
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
 from dotenv import load_dotenv
 from fastapi import (
-    FastAPI, HTTPException, Depends, APIRouter, Response, Request
+    FastAPI, HTTPException, Depends, APIRouter, Response, Request, Query, UploadFile, File, BackgroundTasks
 )
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, FileResponse, RedirectResponse
+from fastapi.responses import JSONResponse, FileResponse, RedirectResponse, PlainTextResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordBearer
 from fastapi.staticfiles import StaticFiles
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig
+from fastapi_mail import ConnectionConfig
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from pydantic import BaseModel
-from sqlalchemy import create_engine, Column, Integer, String, ForeignKey
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import and_, create_engine, event, delete, func, insert, select, text, update
+from sqlalchemy.dialects import mysql, postgresql, sqlite
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session, relationship
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from modelos import (
+    Base, CorreoSaliente, DeteccionDtc, ErrorImportacion, ErrorVehiculo, EstadisticaDtc, Importacion,
+    InformeCompartido, RevisionItem, Telemetria, Usuario, Vehiculo,
+)
+
+try:
+    import zstandard
+except ImportError:  # Sin zstandard los lotes de telemetría solo se aceptan con gzip/deflate
+    zstandard = None
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Configuración de la base de datos
 """
 Configuración de la base de datos:
 
 - Se establece la conexión con el motor de base de datos (MySQL por defecto).
-- Se define `SessionLocal` como el generador de sesiones SQLAlchemy.
-- `Base` se utiliza como clase base para los modelos ORM declarativos.
+- El pool de conexiones se configura con `DB_POOL_SIZE`, `DB_MAX_OVERFLOW`, `DB_POOL_RECYCLE`,
+  `DB_POOL_PRE_PING` y `DB_POOL_TIMEOUT`; el tiempo de espera al obtener una conexión del pool
+  se registra en `metricas_pool`.
+- Con `DB_ASYNC` (por defecto ``True``) los endpoints usan un motor asíncrono (aiomysql para MySQL,
+  aiosqlite para SQLite) y `AsyncSessionLocal`; con ``False`` usan `SessionLocal` a través de
+  `SesionSincrona`, que expone la misma interfaz ejecutando cada operación en el threadpool.
+- `ASYNC_DATABASE_URL` permite indicar la URL asíncrona; si no se define se deriva de `DATABASE_URL`.
+- Se define `SessionLocal` como el generador de sesiones SQLAlchemy síncronas (tareas en segundo plano).
+- Los modelos ORM y su `Base` declarativa están en el módulo `modelos`. El esquema lo crean y
+  actualizan las migraciones de Alembic (``alembic upgrade head``).
 """
 DATABASE_URL = os.getenv("DATABASE_URL", "mysql+pymysql://user:password@db/talleres")
-engine = create_engine(DATABASE_URL)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 20))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "True") == "True"
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_ASYNC = os.getenv("DB_ASYNC", "True") == "True"
+
+class HistogramaEspera:
+    """
+    Histograma acumulado (estilo Prometheus), seguro entre hilos, de los tiempos de espera del pool.
+
+    Atributos:
+        limites (tuple[float]): Límites superiores de cada cubeta, en segundos.
+    """
+    limites = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reiniciar()
+
+    def reiniciar(self):
+        with self._lock:
+            self.cubetas = [0] * len(self.limites)
+            self.total = 0
+            self.suma = 0.0
+            self.maximo = 0.0
+            self.timeouts = 0
+
+    def registrar(self, segundos: float):
+        with self._lock:
+            self.total += 1
+            self.suma += segundos
+            self.maximo = max(self.maximo, segundos)
+            for i, limite in enumerate(self.limites):
+                if segundos <= limite:
+                    self.cubetas[i] += 1
+
+    def registrar_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def resumen(self) -> dict:
+        with self._lock:
+            return {
+                "total": self.total,
+                "media_ms": round(self.suma / self.total * 1000, 3) if self.total else 0.0,
+                "maximo_ms": round(self.maximo * 1000, 3),
+                "timeouts": self.timeouts,
+                "cubetas": {str(l): c for l, c in zip(self.limites, self.cubetas)},
+            }
+
+    def prometheus(self, nombre: str) -> str:
+        """
+        Exporta el histograma en el formato de texto de Prometheus.
+        """
+        with self._lock:
+            lineas = [f"# TYPE {nombre} histogram"]
+            lineas += [f'{nombre}_bucket{{le="{l}"}} {c}' for l, c in zip(self.limites, self.cubetas)]
+            lineas += [
+                f'{nombre}_bucket{{le="+Inf"}} {self.total}',
+                f"{nombre}_sum {self.suma}",
+                f"{nombre}_count {self.total}",
+                f"# TYPE {nombre}_timeouts_total counter",
+                f"{nombre}_timeouts_total {self.timeouts}",
+            ]
+            return "\n".join(lineas) + "\n"
+
+metricas_pool = HistogramaEspera()
+
+class MedicionEspera:
+    """
+    Mixin para pools con cola que mide cuánto espera cada petición hasta obtener una conexión.
+    """
+    def _do_get(self):
+        inicio = time.perf_counter()
+        try:
+            conexion = super()._do_get()
+        except Exception:
+            metricas_pool.registrar_timeout()
+            raise
+        metricas_pool.registrar(time.perf_counter() - inicio)
+        return conexion
+
+class QueuePoolMedido(MedicionEspera, QueuePool):
+    """
+    `QueuePool` del motor síncrono con medición del tiempo de espera.
+    """
+
+class AsyncQueuePoolMedido(MedicionEspera, AsyncAdaptedQueuePool):
+    """
+    Pool del motor asíncrono con medición del tiempo de espera.
+    """
+
+DRIVERS_ASINCRONOS = {"mysql": "mysql+aiomysql", "sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+def url_asincrona(url: str) -> str:
+    """
+    Deriva la URL del motor asíncrono sustituyendo el driver de `DATABASE_URL`.
+
+    Args:
+        url (str): URL síncrona (p. ej. ``mysql+pymysql://...``).
+
+    Returns:
+        str: URL con el driver asíncrono equivalente (p. ej. ``mysql+aiomysql://...``).
+    """
+    dialecto, resto = url.split("://", 1)
+    nombre = dialecto.split("+", 1)[0]
+    return f"{DRIVERS_ASINCRONOS.get(nombre, dialecto)}://{resto}"
+
+def opciones_engine(url: str, asincrono: bool = False) -> dict:
+    """
+    Devuelve los argumentos de `create_engine` / `create_async_engine` para la URL indicada.
+
+    SQLite (usado en los tests) mantiene su pool por defecto; el resto de motores usan
+    `QueuePoolMedido` (o `AsyncQueuePoolMedido`) con los parámetros del entorno.
+    """
+    if url.startswith("sqlite"):
+        return {"pool_pre_ping": DB_POOL_PRE_PING}
+    return {
+        "poolclass": AsyncQueuePoolMedido if asincrono else QueuePoolMedido,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "pool_timeout": DB_POOL_TIMEOUT,
+    }
+
+def activar_claves_foraneas(motor):
+    """
+    Activa las claves foráneas en cada conexión de un motor SQLite.
+
+    SQLite no aplica ``FOREIGN KEY`` (ni ``ON DELETE CASCADE``) salvo que se active con un
+    ``PRAGMA`` por conexión; en el resto de motores no hace nada.
+
+    Args:
+        motor (Engine): Motor síncrono (para un `AsyncEngine`, su ``sync_engine``).
+    """
+    if motor.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(motor, "connect")
+    def _activar(conexion_dbapi, registro):
+        cursor = conexion_dbapi.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+engine = create_engine(DATABASE_URL, **opciones_engine(DATABASE_URL))
+activar_claves_foraneas(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", url_asincrona(DATABASE_URL))
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **opciones_engine(ASYNC_DATABASE_URL, asincrono=True)) if DB_ASYNC else None
+if async_engine is not None:
+    activar_claves_foraneas(async_engine.sync_engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False) if DB_ASYNC else None
 
 # Configuracion del servidor de correo
 """
-Configuración del sistema de envío de correos (FastAPI Mail):
+Configuración del sistema de envío de correos:
 
-- Las credenciales y parámetros se cargan desde variables de entorno.
-- `FastMail` se instancia con esta configuración para ser usado en envíos.
+- Las credenciales y parámetros se cargan desde variables de entorno y se validan con `ConnectionConfig`.
+- Los correos no se envían dentro de la petición: se guardan en la tabla `correos_salientes`
+  y los entrega en segundo plano `EnviadorCorreos` (ver más abajo).
 """
 conf = ConnectionConfig(
     MAIL_USERNAME=os.getenv("MAIL_USERNAME"),
@@ -55,14 +256,17 @@ conf = ConnectionConfig(
     VALIDATE_CERTS=os.getenv("VALIDATE_CERTS", "True") == "True"
 )
 
-fm = FastMail(conf)
+CORREO_LOTE = int(os.getenv("CORREO_LOTE", 50))
+CORREO_MAX_INTENTOS = int(os.getenv("CORREO_MAX_INTENTOS", 5))
+CORREO_REINTENTO_BASE = float(os.getenv("CORREO_REINTENTO_BASE", 30))
+CORREO_INTERVALO = float(os.getenv("CORREO_INTERVALO", 10))
 
 # Clave secreta y configuración de JWT
 """
 Configuración de seguridad:
 
 - `SECRET_KEY`, `ALGORITHM` y tiempo de expiración definen la seguridad del JWT.
-- `pwd_context` se usa para hashear contraseñas con bcrypt.
+- `pwd_context` se usa para hashear contraseñas con bcrypt (coste configurable con `BCRYPT_ROUNDS`).
 - `oauth2_scheme` se usa como dependencia para extraer el token del header Authorization.
 """
 SECRET_KEY = "clave-secreta-super-segura"
@@ -70,124 +274,280 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 300
 
 # Configuración de Hash para contraseñas
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+# Pool de procesos para bcrypt
+"""
+Configuración del pool de hashing de contraseñas:
+
+- `PASSWORD_POOL_WORKERS`: procesos dedicados a bcrypt (por defecto, número de CPUs).
+- `PASSWORD_POOL_MAX_PENDIENTES`: operaciones en curso o en cola admitidas antes de responder 503.
+- `PASSWORD_RETRY_AFTER`: segundos indicados en la cabecera ``Retry-After`` cuando el pool está saturado.
+- `PASSWORD_REHASH`: si es ``True``, al hacer login se vuelve a hashear la contraseña cuando
+  sus parámetros de coste no coinciden con la configuración actual de `pwd_context`.
+"""
+PASSWORD_POOL_WORKERS = int(os.getenv("PASSWORD_POOL_WORKERS", os.cpu_count() or 1))
+PASSWORD_POOL_MAX_PENDIENTES = int(os.getenv("PASSWORD_POOL_MAX_PENDIENTES", PASSWORD_POOL_WORKERS * 4))
+PASSWORD_RETRY_AFTER = int(os.getenv("PASSWORD_RETRY_AFTER", 1))
+PASSWORD_REHASH = os.getenv("PASSWORD_REHASH", "False") == "True"
 
 # Seguridad OAuth2 para manejar tokens
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
-# Modelos de la base de datos
-class Usuario(Base):
+# Caché de usuarios autenticados
+"""
+Caché de principales para la verificación de tokens:
+
+- Cada entrada guarda una instantánea ligera del usuario (`UsuarioAutenticado`) indexada por su ID.
+- Es un `CacheLRU` acotado por `AUTH_CACHE_MAX` entradas y con caducidad `AUTH_CACHE_TTL` (segundos).
+- Un acierto permite autorizar la petición sin consultar la base de datos.
+- Las entradas se invalidan al modificar o eliminar el `Usuario` (ver eventos ORM más abajo), pero
+  solo en el worker que hace el cambio: cada worker tiene su propia caché, así que un token revocado
+  (p. ej. con `/cambiar-password`) puede seguir aceptándose en los demás hasta `AUTH_CACHE_TTL`
+  segundos. Por eso la caducidad por defecto es corta.
+"""
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", 10))
+AUTH_CACHE_MAX = int(os.getenv("AUTH_CACHE_MAX", 10000))
+
+class UsuarioAutenticado:
     """
-    Modelo ORM que representa a los usuarios del sistema.
+    Instantánea inmutable del usuario autenticado que devuelven las dependencias de seguridad.
 
     Atributos:
-        id (int): ID autoincremental (clave primaria).
-        username (str): Nombre de usuario, único.
-        password_hash (str): Contraseña hasheada con bcrypt.
-
-    Relaciones:
-        vehiculos (List[Vehiculo]): Lista de vehículos registrados por el usuario.
+        id (int): ID del usuario.
+        username (str): Nombre de usuario.
+        token_version (int): Versión de token vigente en el momento de cachearlo.
     """
-    __tablename__ = "usuarios"
-    id = Column(Integer, primary_key=True, index=True)
-    username = Column(String(255), unique=True, index=True)
-    password_hash = Column(String(255))
+    __slots__ = ("id", "username", "token_version")
 
-    # Relación con Vehículo (uno a muchos)
-    vehiculos = relationship("Vehiculo", back_populates="usuario")
+    def __init__(self, id: int, username: str, token_version: int):
+        self.id = id
+        self.username = username
+        self.token_version = token_version
 
-class Vehiculo(Base):
+class CacheLRU:
     """
-    Modelo ORM que representa un vehículo registrado.
+    Caché LRU con TTL, segura entre hilos.
 
-    Atributos:
-        id (int): ID del vehículo.
-        marca (str): Marca del vehículo.
-        modelo (str): Modelo del vehículo.
-        year (int): Año de fabricación.
-        rpm (int): Revoluciones por minuto.
-        velocidad (int): Velocidad actual.
-        vin (str): Número VIN único del vehículo.
-        revision (str): Información de revisión técnica.
-        usuario_id (int): ID del usuario al que pertenece el vehículo.
+    Las entradas caducan a los `ttl` segundos y, al superar `max_entradas`, se expulsa la menos
+    usada. Cada proceso (worker) mantiene su propia caché.
 
-    Relaciones:
-        usuario (Usuario): Usuario propietario.
-        errores (List[ErrorVehiculo]): Lista de errores asociados.
-        informes_compartidos (List[InformeCompartido]): Informes generados con token público.
+    Atributos:
+        aciertos (int): Lecturas resueltas desde la caché.
+        fallos (int): Lecturas que no encontraron una entrada vigente.
     """
-    __tablename__ = "vehiculos"
-    id = Column(Integer, primary_key=True, index=True)
-    marca = Column(String(255), index=True)
-    modelo = Column(String(255))
-    year = Column(Integer)
-    rpm = Column(Integer)
-    velocidad = Column(Integer)
-    vin = Column(String(17), unique=True, nullable=False)
-    revision = Column(String(255))
-    usuario_id = Column(Integer, ForeignKey('usuarios.id'))  # FK hacia Usuario
-
-    # Relación con Usuario (muchos a uno)
-    usuario = relationship("Usuario", back_populates="vehiculos")
-
-    # Relación con ErrorVehiculo (uno a muchos)
-    errores = relationship("ErrorVehiculo", back_populates="vehiculo", cascade="all, delete-orphan")
+    def __init__(self, max_entradas: int, ttl: float):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self.aciertos = 0
+        self.fallos = 0
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _al_eliminar(self, clave, valor):
+        """
+        Se llama (con el lock adquirido) cada vez que una entrada sale de la caché.
+        """
+
+    def obtener(self, clave, es_valido=None):
+        """
+        Devuelve el valor cacheado si no ha caducado y, opcionalmente, si cumple `es_valido`.
+        """
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None:
+                valor, caduca = entrada
+                if caduca > ahora and (es_valido is None or es_valido(valor)):
+                    self._entradas.move_to_end(clave)
+                    self.aciertos += 1
+                    return valor
+                del self._entradas[clave]
+                self._al_eliminar(clave, valor)
+            self.fallos += 1
+            return None
+
+    def guardar(self, clave, valor):
+        """
+        Guarda un valor, expulsando la entrada menos usada si se supera el tamaño máximo.
+        """
+        with self._lock:
+            anterior = self._entradas.pop(clave, None)
+            if anterior is not None:
+                self._al_eliminar(clave, anterior[0])
+            self._entradas[clave] = (valor, time.monotonic() + self.ttl)
+            while len(self._entradas) > self.max_entradas:
+                expulsada, (valor_expulsado, _) = self._entradas.popitem(last=False)
+                self._al_eliminar(expulsada, valor_expulsado)
+
+    def invalidar(self, clave):
+        """
+        Elimina la entrada asociada a `clave`, si existe.
+        """
+        with self._lock:
+            entrada = self._entradas.pop(clave, None)
+            if entrada is not None:
+                self._al_eliminar(clave, entrada[0])
+
+    def limpiar(self):
+        """
+        Vacía la caché y reinicia los contadores.
+        """
+        with self._lock:
+            for clave, (valor, _) in self._entradas.items():
+                self._al_eliminar(clave, valor)
+            self._entradas.clear()
+            self.aciertos = 0
+            self.fallos = 0
+
+    def estadisticas(self) -> dict:
+        """
+        Devuelve los contadores de aciertos y fallos y el tamaño actual.
+        """
+        with self._lock:
+            return {
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "entradas": len(self._entradas),
+                "max_entradas": self.max_entradas,
+                "ttl": self.ttl,
+            }
+
+class CachePrincipales(CacheLRU):
+    """
+    Caché de usuarios autenticados indexada por ID de usuario.
 
-    # Relación con InformeCompartido (uno a muchos)
-    informes_compartidos = relationship("InformeCompartido", back_populates="vehiculo", cascade="all, delete-orphan")
+    Una entrada solo es válida si su `token_version` coincide con la del token recibido.
+    """
+    def obtener(self, usuario_id: int, token_version: int) -> Optional[UsuarioAutenticado]:
+        """
+        Devuelve el principal cacheado si sigue vigente y coincide con la versión del token.
+        """
+        return super().obtener(usuario_id, lambda principal: principal.token_version == token_version)
 
+cache_principales = CachePrincipales(AUTH_CACHE_MAX, AUTH_CACHE_TTL)
 
-class ErrorVehiculo(Base):
+@event.listens_for(Usuario, "after_update")
+@event.listens_for(Usuario, "after_delete")
+def invalidar_principal(mapper, connection, usuario):
+    """
+    Invalida la entrada cacheada de un usuario cuando se modifica o elimina.
     """
-    Modelo ORM que almacena los errores OBD-II (códigos DTC) de un vehículo.
+    cache_principales.invalidar(usuario.id)
 
-    Atributos:
-        id (int): ID del error.
-        vehiculo_id (int): ID del vehículo asociado.
-        codigo_dtc (str): Código de diagnóstico (ej. P0301).
+# Caché de informes públicos
+"""
+Caché de los informes públicos (`/informe/{token}`):
+
+- Guarda el JSON ya serializado junto con su ``ETag`` y ``Last-Modified``, indexado por token.
+- Mantiene un índice vehículo -> tokens para invalidar todos los informes de un vehículo
+  cuando se edita, se elimina o recibe errores nuevos.
+- Los aciertos (también los ``304``) no consultan la base de datos. Cada worker tiene su propia
+  caché y la invalidación solo llega al que atiende el cambio: en los demás, una edición, errores
+  nuevos o el borrado del vehículo se ven como mucho `INFORME_CACHE_TTL` segundos después.
+"""
+INFORME_CACHE_TTL = float(os.getenv("INFORME_CACHE_TTL", 300))
+INFORME_CACHE_MAX = int(os.getenv("INFORME_CACHE_MAX", 5000))
 
-    Relaciones:
-        vehiculo (Vehiculo): Vehículo asociado.
+class CacheInformes(CacheLRU):
+    """
+    Caché de informes serializados con invalidación por vehículo.
     """
-    __tablename__ = "errores_vehiculos"
-    id = Column(Integer, primary_key=True, index=True)
-    vehiculo_id = Column(Integer, ForeignKey('vehiculos.id'))  # FK hacia Vehiculo
-    codigo_dtc = Column(String(255))
+    def __init__(self, max_entradas: int, ttl: float):
+        super().__init__(max_entradas, ttl)
+        self._por_vehiculo = {}
+
+    def _al_eliminar(self, token, informe):
+        tokens = self._por_vehiculo.get(informe["vehiculo_id"])
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._por_vehiculo[informe["vehiculo_id"]]
+
+    def guardar(self, token, informe):
+        super().guardar(token, informe)
+        with self._lock:
+            if token in self._entradas:
+                self._por_vehiculo.setdefault(informe["vehiculo_id"], set()).add(token)
+
+    def invalidar_vehiculo(self, vehiculo_id: int):
+        """
+        Elimina todos los informes cacheados de un vehículo.
+        """
+        with self._lock:
+            for token in self._por_vehiculo.pop(vehiculo_id, set()):
+                self._entradas.pop(token, None)
+
+cache_informes = CacheInformes(INFORME_CACHE_MAX, INFORME_CACHE_TTL)
 
-    # Relación con Vehículo (muchos a uno)
-    vehiculo = relationship("Vehiculo", back_populates="errores")
+# Iniciar FastAPI
+app = FastAPI(root_path="/taller/api")
+BASE_DIR = Path("docs/build/html")
 
-class InformeCompartido(Base):
+# Revisión técnica: normalización en filas de `revision_items`
+def items_de_revision(revision: dict) -> list[dict]:
     """
-    Modelo ORM que representa un informe compartido con un cliente por email.
+    Aplana una revisión ``{parte: [detalles]}`` en filas para `RevisionItem`.
 
-    Atributos:
-        id (int): ID del informe.
-        token (str): Token único para acceder al informe.
-        vehiculo_id (int): ID del vehículo relacionado.
-        email_cliente (str): Email al que se envía el informe.
-        creado_en (str): Fecha y hora de creación del informe (ISO format).
+    Los valores que no son listas se tratan como un único detalle; las partes sin detalles no generan filas.
 
-    Relaciones:
-        vehiculo (Vehiculo): Vehículo asociado.
+    Args:
+        revision (dict): Revisión tal como la envía el cliente.
+
+    Returns:
+        list[dict]: Filas con ``parte`` y ``detalle`` (sin duplicados).
+    """
+    filas, vistos = [], set()
+    for parte, detalles in (revision or {}).items():
+        if not isinstance(detalles, (list, tuple)):
+            detalles = [detalles] if detalles not in (None, "") else []
+        for detalle in detalles:
+            clave = (str(parte).strip()[:100], str(detalle).strip()[:255])
+            if clave[0] and clave[1] and clave not in vistos:
+                vistos.add(clave)
+                filas.append({"parte": clave[0], "detalle": clave[1]})
+    return filas
+
+# Versión del esquema: las tablas, índices y migraciones de datos los gestiona Alembic (migraciones/)
+ALEMBIC_INI = Path(__file__).resolve().parent / "alembic.ini"
+
+def verificar_esquema(motor=None):
     """
-    __tablename__ = "informes_compartidos"
-    id = Column(Integer, primary_key=True)
-    token = Column(String(100), unique=True, index=True, default=lambda: str(uuid.uuid4()))
-    vehiculo_id = Column(Integer, ForeignKey("vehiculos.id"))
-    email_cliente = Column(String(255))
-    creado_en = Column(String(255), default=lambda: datetime.utcnow().isoformat())
+    Comprueba que la base de datos está en la última revisión de las migraciones.
 
-    # Relación con Vehiculo (muchos a uno)
-    vehiculo = relationship("Vehiculo", back_populates="informes_compartidos")
+    El arranque no ejecuta DDL (varios workers arrancando a la vez competirían por crear tablas);
+    las migraciones se aplican antes con ``alembic upgrade head``.
 
-# Iniciar FastAPI
-app = FastAPI(root_path="/taller/api")
-BASE_DIR = Path("docs/build/html")
+    Args:
+        motor (Engine): Motor a comprobar (por defecto, `engine`).
+
+    Raises:
+        RuntimeError: Si la revisión de la base de datos no coincide con la de las migraciones.
+    """
+    esperadas = set(ScriptDirectory.from_config(AlembicConfig(str(ALEMBIC_INI))).get_heads())
+    with (motor or engine).connect() as conexion:
+        actuales = set(MigrationContext.configure(conexion).get_current_heads())
+    if actuales != esperadas:
+        raise RuntimeError(
+            f"El esquema de la base de datos está en la revisión {', '.join(sorted(actuales)) or 'ninguna'} "
+            f"y la API espera {', '.join(sorted(esperadas))}. Ejecuta `alembic upgrade head`."
+        )
 
 @app.on_event("startup")
-def startup():
-    Base.metadata.create_all(bind=engine)
+async def startup():
+    await asyncio.to_thread(verificar_esquema)
+    enviador_correos.iniciar()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await enviador_correos.detener()
+    pool_passwords.cerrar()
+    await cerrar_cliente_http()
+    # Cierra las conexiones del pool para que MySQL no las mantenga abiertas hasta su wait_timeout
+    if async_engine is not None:
+        await async_engine.dispose()
+    await asyncio.to_thread(engine.dispose)
 
 # Configurar CORS
 app.add_middleware(
@@ -196,40 +556,269 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Siguiente-Cursor"],
 )
 
+# Rutas cuyo cuerpo JSON puede llegar comprimido (p. ej. la sincronización del cliente OBD con gzip)
+RUTAS_CUERPO_COMPRIMIDO = {"/ingesta/lote"}
+CUERPO_COMPRIMIDO_MAX_BYTES = int(os.getenv("CUERPO_COMPRIMIDO_MAX_BYTES", 10 * 1024 * 1024))
+
+class DescompresionPeticiones:
+    """
+    Middleware ASGI que descomprime el cuerpo de las peticiones con ``Content-Encoding`` a las
+    rutas indicadas, de modo que el endpoint valida el JSON como siempre.
+
+    Atributos:
+        rutas (set[str]): Rutas (sin ``root_path``) a las que se aplica.
+        limite (int): Tamaño máximo del cuerpo descomprimido.
+    """
+    def __init__(self, app, rutas: set[str], limite: int):
+        self.app = app
+        self.rutas = rutas
+        self.limite = limite
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        ruta, root_path = scope["path"], scope.get("root_path", "")
+        if root_path and ruta.startswith(root_path):
+            ruta = ruta[len(root_path):]
+        cabeceras = [(k, v) for k, v in scope["headers"] if k not in (b"content-encoding", b"content-length")]
+        codificacion = dict(scope["headers"]).get(b"content-encoding", b"").decode("latin-1")
+        if ruta not in self.rutas or codificacion in ("", "identity"):
+            return await self.app(scope, receive, send)
+
+        cuerpo, mas = b"", True
+        while mas:
+            mensaje = await receive()
+            cuerpo += mensaje.get("body", b"")
+            mas = mensaje.get("more_body", False)
+        try:
+            datos = await run_in_threadpool(descomprimir_cuerpo, cuerpo, codificacion, self.limite)
+        except HTTPException as e:
+            return await JSONResponse({"detail": e.detail}, status_code=e.status_code)(scope, receive, send)
+
+        cabeceras.append((b"content-length", str(len(datos)).encode()))
+        entregado = False
+
+        async def recibir():
+            nonlocal entregado
+            if entregado:
+                return await receive()
+            entregado = True
+            return {"type": "http.request", "body": datos, "more_body": False}
+
+        await self.app({**scope, "headers": cabeceras}, recibir, send)
+
+app.add_middleware(DescompresionPeticiones, rutas=RUTAS_CUERPO_COMPRIMIDO, limite=CUERPO_COMPRIMIDO_MAX_BYTES)
+
+class ResultadoEnStreaming:
+    """
+    Equivalente de `AsyncResult` para `SesionSincrona`: recorre un resultado síncrono por particiones
+    obteniendo cada una en el threadpool.
+    """
+    def __init__(self, resultado):
+        self._resultado = resultado
+
+    async def partitions(self, size: Optional[int] = None):
+        particiones = self._resultado.partitions(size)
+        while True:
+            particion = await run_in_threadpool(next, particiones, None)
+            if particion is None:
+                return
+            yield particion
+
+    async def close(self):
+        await run_in_threadpool(self._resultado.close)
+
+class SesionSincrona:
+    """
+    Adapta una `Session` síncrona a la interfaz de `AsyncSession` que usan los endpoints.
+
+    Cada operación con E/S se ejecuta en el threadpool, de modo que el mismo código de los
+    endpoints funciona con ``DB_ASYNC=False``.
+
+    Atributos:
+        sync_session (Session): Sesión síncrona envuelta.
+    """
+    def __init__(self, sesion: Session):
+        self.sync_session = sesion
+        # Igual que en AsyncSessionLocal: los objetos siguen accesibles tras el commit sin recargarse
+        self.sync_session.expire_on_commit = False
+
+    def add(self, instancia):
+        self.sync_session.add(instancia)
+
+    def add_all(self, instancias):
+        self.sync_session.add_all(instancias)
+
+    def get_bind(self):
+        return self.sync_session.get_bind()
+
+    async def execute(self, *args, **kwargs):
+        return await run_in_threadpool(self.sync_session.execute, *args, **kwargs)
+
+    async def scalar(self, *args, **kwargs):
+        return await run_in_threadpool(self.sync_session.scalar, *args, **kwargs)
+
+    async def scalars(self, *args, **kwargs):
+        return await run_in_threadpool(self.sync_session.scalars, *args, **kwargs)
+
+    async def get(self, *args, **kwargs):
+        return await run_in_threadpool(self.sync_session.get, *args, **kwargs)
+
+    async def delete(self, instancia):
+        await run_in_threadpool(self.sync_session.delete, instancia)
+
+    async def flush(self):
+        await run_in_threadpool(self.sync_session.flush)
+
+    async def commit(self):
+        await run_in_threadpool(self.sync_session.commit)
+
+    async def rollback(self):
+        await run_in_threadpool(self.sync_session.rollback)
+
+    async def close(self):
+        await run_in_threadpool(self.sync_session.close)
+
+    async def stream(self, *args, **kwargs):
+        return ResultadoEnStreaming(await run_in_threadpool(self.sync_session.execute, *args, **kwargs))
+
+    async def run_sync(self, funcion, *args, **kwargs):
+        return await run_in_threadpool(funcion, self.sync_session, *args, **kwargs)
+
 # Dependencia para obtener la sesión de la base de datos
-def get_db():
+async def get_db():
     """
     Dependencia de FastAPI para obtener una sesión de base de datos.
 
     Se utiliza con `Depends(get_db)` para abrir una sesión, cederla al endpoint y cerrarla automáticamente.
+    Devuelve una `AsyncSession` o, con ``DB_ASYNC=False``, una `SesionSincrona`.
     """
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+    if DB_ASYNC:
+        async with AsyncSessionLocal() as db:
+            yield db
+    else:
+        db = SesionSincrona(SessionLocal())
+        try:
+            yield db
+        finally:
+            await db.close()
+
+# Funciones ejecutadas en los procesos del pool (deben ser importables a nivel de módulo)
+def _hashear_en_worker(password: str) -> str:
+    return pwd_context.hash(password)
+
+def _verificar_en_worker(password: str, password_hash: str, rehash: bool):
+    if rehash:
+        return pwd_context.verify_and_update(password, password_hash)
+    return pwd_context.verify(password, password_hash), None
+
+class PoolPasswords:
+    """
+    Pool de procesos acotado para las operaciones bcrypt con control de admisión.
+
+    Las operaciones se ejecutan fuera del threadpool de anyio, de modo que una ráfaga de logins
+    no bloquea al resto de endpoints. Si hay más de `max_pendientes` operaciones en curso,
+    se rechaza la petición con un 503 y ``Retry-After``.
+
+    Atributos:
+        workers (int): Número de procesos del pool.
+        max_pendientes (int): Máximo de operaciones en curso o en cola.
+        retry_after (int): Segundos sugeridos al cliente para reintentar.
+        rechazadas (int): Operaciones rechazadas por saturación.
+    """
+    def __init__(self, workers: int, max_pendientes: int, retry_after: int):
+        self.workers = max(1, workers)
+        self.max_pendientes = max_pendientes
+        self.retry_after = retry_after
+        self.en_curso = 0
+        self.rechazadas = 0
+        self._executor = None
+
+    def _obtener_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # "spawn" evita heredar los hilos del servidor en los procesos hijos
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    async def ejecutar(self, funcion, *args):
+        """
+        Ejecuta `funcion` en el pool respetando el límite de operaciones pendientes.
+
+        Raises:
+            HTTPException 503: Si el pool está saturado.
+        """
+        if self.en_curso >= self.max_pendientes:
+            self.rechazadas += 1
+            raise HTTPException(
+                status_code=503,
+                detail="El servidor está procesando demasiadas autenticaciones. Inténtalo de nuevo en unos segundos.",
+                headers={"Retry-After": str(self.retry_after)}
+            )
+        self.en_curso += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._obtener_executor(), funcion, *args)
+        finally:
+            self.en_curso -= 1
+
+    def cerrar(self):
+        """
+        Detiene los procesos del pool esperando a que terminen las operaciones en curso.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+pool_passwords = PoolPasswords(PASSWORD_POOL_WORKERS, PASSWORD_POOL_MAX_PENDIENTES, PASSWORD_RETRY_AFTER)
+
+async def hashear_password(password: str) -> str:
+    """
+    Genera el hash bcrypt de una contraseña en el pool de procesos.
+
+    Args:
+        password (str): Contraseña en texto plano.
+
+    Returns:
+        str: Hash bcrypt.
 
-# Función para verificar contraseña
-def verificar_password(plain_password, hashed_password):
+    Raises:
+        HTTPException 503: Si el pool de hashing está saturado.
+    """
+    return await pool_passwords.ejecutar(_hashear_en_worker, password)
+
+async def comprobar_password(password: str, password_hash: str):
     """
-    Verifica si una contraseña en texto plano coincide con su hash almacenado.
+    Verifica una contraseña en el pool de procesos.
+
+    Si `PASSWORD_REHASH` está activo y el hash usa parámetros de coste obsoletos,
+    devuelve también el hash recalculado con la configuración actual.
 
     Args:
-        password_plano (str): Contraseña proporcionada por el usuario.
+        password (str): Contraseña proporcionada por el usuario.
         password_hash (str): Hash almacenado en la base de datos.
 
     Returns:
-        bool: True si coinciden, False si no.
+        tuple[bool, Optional[str]]: Si coinciden y, en su caso, el nuevo hash.
+
+    Raises:
+        HTTPException 503: Si el pool de hashing está saturado.
     """
-    return pwd_context.verify(plain_password, hashed_password)
+    return await pool_passwords.ejecutar(_verificar_en_worker, password, password_hash, PASSWORD_REHASH)
 
 # Función para generar tokens
 def crear_token(data: dict, expira_en: int = ACCESS_TOKEN_EXPIRE_MINUTES):
     """
     Genera un token JWT con los datos proporcionados y un tiempo de expiración opcional.
 
+    Para que la verificación pueda resolverse desde la caché, el payload debe incluir
+    ``uid`` (ID del usuario) y ``ver`` (su ``token_version``) además de ``sub``.
+
     Args:
         datos (dict): Datos a incluir en el payload del token.
         tiempo_expiracion (Optional[timedelta]): Tiempo personalizado de expiración. Si no se especifica, se usarán 30 minutos por defecto.
@@ -245,30 +834,51 @@ def crear_token(data: dict, expira_en: int = ACCESS_TOKEN_EXPIRE_MINUTES):
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 # Función para verificar token
-def obtener_usuario_desde_token(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def obtener_usuario_desde_token(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
     """
     Extrae y valida el usuario actual a partir del token JWT proporcionado.
 
+    Si el usuario está en `cache_principales` con la misma versión que el token, la petición se
+    autoriza sin consultar la base de datos (un token revocado en otro worker se acepta como mucho
+    `AUTH_CACHE_TTL` segundos). En caso contrario se carga el usuario y se comprueba que la versión
+    del token siga vigente. Los tokens sin ``uid`` y ``ver`` (anteriores a `token_version`) se
+    rechazan, porque no se pueden revocar.
+
     Args:
         token (str): Token JWT incluido en el encabezado de autorización.
-        db (Session): Sesión de base de datos.
+        db (AsyncSession): Sesión de base de datos.
 
     Returns:
-        Usuario: Instancia del usuario autenticado.
+        UsuarioAutenticado: Instantánea del usuario autenticado.
 
     Raises:
-        HTTPException 401: Si el token es inválido o ha expirado.
+        HTTPException 401: Si el token es inválido, ha expirado o ha sido revocado.
     """
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username = payload.get("sub")
-        usuario = db.query(Usuario).filter(Usuario.username == username).first()
-        if usuario is None:
-            raise HTTPException(status_code=401, detail="Usuario no encontrado")
-        return usuario
     except JWTError:
         raise HTTPException(status_code=401, detail="Token inválido o expirado")
 
+    usuario_id = payload.get("uid")
+    version = payload.get("ver")
+
+    if usuario_id is None or version is None:
+        raise HTTPException(status_code=401, detail="Token inválido o expirado")
+
+    principal = cache_principales.obtener(usuario_id, version)
+    if principal is not None:
+        return principal
+
+    usuario = await db.get(Usuario, usuario_id)
+    if usuario is None:
+        raise HTTPException(status_code=401, detail="Usuario no encontrado")
+    if version != usuario.token_version:
+        raise HTTPException(status_code=401, detail="Token inválido o expirado")
+
+    principal = UsuarioAutenticado(usuario.id, usuario.username, usuario.token_version)
+    cache_principales.guardar(principal.id, principal)
+    return principal
+
 # Modelos Pydantic para peticiones
 class UsuarioRegistro(BaseModel):
     """
@@ -292,6 +902,17 @@ class UsuarioLogin(BaseModel):
     username: str
     password: str
 
+class CambioPassword(BaseModel):
+    """
+    Modelo de solicitud para cambiar la contraseña del usuario autenticado.
+
+    Atributos:
+        password_actual (str): Contraseña actual en texto plano.
+        password_nueva (str): Nueva contraseña en texto plano.
+    """
+    password_actual: str
+    password_nueva: str
+
 class VehiculoRegistro(BaseModel):
     """
     Modelo de solicitud para registrar un nuevo vehículo.
@@ -343,6 +964,37 @@ class ErrorVehiculoRegistro(BaseModel):
     codigo_dtc: list[str]
     vehiculo_id: int
 
+class VehiculoLote(VehiculoRegistro):
+    """
+    Vehículo de un lote de ingesta, junto con los códigos DTC leídos en el escaneo.
+
+    Atributos:
+        errores (list[str]): Códigos DTC asociados al vehículo (puede estar vacía).
+    """
+    errores: list[str] = []
+
+class IngestaLote(BaseModel):
+    """
+    Modelo de solicitud para la ingesta por lotes de vehículos y errores.
+
+    Atributos:
+        vehiculos (list[VehiculoLote]): Vehículos escaneados con sus códigos DTC.
+    """
+    vehiculos: list[VehiculoLote]
+
+class TelemetriaLote(BaseModel):
+    """
+    Modelo de solicitud para un lote de muestras de telemetría.
+
+    Atributos:
+        vin (Optional[str]): VIN del vehículo (alternativa a ``vehiculo_id``).
+        vehiculo_id (Optional[int]): ID del vehículo.
+        muestras (list[tuple[float, str, float]]): Muestras ``[ts, pid, valor]`` con ``ts`` en segundos desde epoch.
+    """
+    vin: Optional[str] = None
+    vehiculo_id: Optional[int] = None
+    muestras: list[tuple[float, str, float]]
+
 class InformeRequest(BaseModel):
     """
     Modelo de solicitud para generar y enviar un informe por correo.
@@ -352,6 +1004,72 @@ class InformeRequest(BaseModel):
     """
     email: str
 
+class VehiculoOut(BaseModel):
+    """
+    Vehículo devuelto por la API.
+
+    Los endpoints lo construyen a partir de filas con solo las columnas necesarias (no de objetos
+    ORM) y FastAPI lo serializa directamente a JSON con Pydantic. Los campos no incluidos en la
+    proyección (parámetro ``fields``) se omiten de la respuesta.
+    """
+    id: int
+    marca: Optional[str] = None
+    modelo: Optional[str] = None
+    year: Optional[int] = None
+    rpm: Optional[int] = None
+    velocidad: Optional[int] = None
+    vin: Optional[str] = None
+    revision: Optional[dict] = None
+    usuario_id: Optional[int] = None
+    actualizado_en: Optional[datetime] = None
+
+class ListaVehiculosOut(BaseModel):
+    """
+    Página de vehículos de ``/mis-vehiculos/``.
+
+    Atributos:
+        mensaje (Optional[str]): Aviso cuando el usuario no tiene vehículos.
+        vehiculos (list[VehiculoOut]): Vehículos de la página.
+        siguiente_cursor (Optional[str]): Cursor de la página siguiente (``None`` si no hay más).
+    """
+    mensaje: Optional[str] = None
+    vehiculos: list[VehiculoOut]
+    siguiente_cursor: Optional[str] = None
+
+class ErrorOut(BaseModel):
+    """
+    Código DTC registrado para un vehículo.
+    """
+    id: int
+    vehiculo_id: int
+    codigo_dtc: str
+    primera_deteccion: Optional[datetime] = None
+    ultima_deteccion: Optional[datetime] = None
+    ocurrencias: int
+
+class InformeVehiculoOut(BaseModel):
+    """
+    Datos del vehículo incluidos en un informe compartido.
+    """
+    marca: Optional[str] = None
+    modelo: Optional[str] = None
+    year: Optional[int] = None
+    vin: str
+    rpm: Optional[int] = None
+    velocidad: Optional[int] = None
+    revision: Optional[dict] = None
+
+class InformeOut(BaseModel):
+    """
+    Contenido público de ``/informe/{token}``.
+
+    Atributos:
+        vehiculo (InformeVehiculoOut): Datos del vehículo.
+        errores (list[str]): Códigos DTC del vehículo.
+    """
+    vehiculo: InformeVehiculoOut
+    errores: list[str]
+
 # Endopoint de documentacin
 @app.get("/docs_html")
 async def redirect_docs_html():
@@ -373,7 +1091,7 @@ async def serve_docs_html(path: str):
 
 # Endpoint para registro de usuario
 @app.post("/register")
-def register(datos: UsuarioRegistro, db: Session = Depends(get_db)):
+async def register(datos: UsuarioRegistro, db: AsyncSession = Depends(get_db)):
     """
     **POST** ``/register``
 
@@ -381,38 +1099,39 @@ def register(datos: UsuarioRegistro, db: Session = Depends(get_db)):
 
     **Parámetros**:
     - ``datos`` (UsuarioRegistro): Objeto que contiene el nombre de usuario y la contraseña.
-    - ``db`` (Session): Sesión activa de la base de datos, proporcionada por FastAPI.
+    - ``db`` (AsyncSession): Sesión activa de la base de datos, proporcionada por FastAPI.
 
     **Retorna**:
     - ``dict``: Un mensaje indicando si el usuario fue registrado exitosamente.
 
     **Errores**:
     - ``400``: Si los campos son inválidos o el nombre de usuario ya existe.
+    - ``503``: Si el pool de hashing está saturado (incluye ``Retry-After``).
     """
     if not datos.username or len(datos.username.strip()) < 3:
         raise HTTPException(status_code=400, detail="El nombre de usuario es obligatorio y debe tener al menos 3 caracteres.")
     if not datos.password or len(datos.password) < 6:
         raise HTTPException(status_code=400, detail="La contraseña debe tener al menos 6 caracteres.")
 
-    hashed_password = pwd_context.hash(datos.password)
+    hashed_password = await hashear_password(datos.password)
     usuario = Usuario(username=datos.username.strip(), password_hash=hashed_password)
     db.add(usuario)
     try:
-        db.commit()
+        await db.commit()
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=400, detail="El nombre de usuario ya está registrado. Por favor elige otro.")
     return {"mensaje": "Usuario registrado correctamente"}
 
 # Endpoint para autenticación y obtención del token JWT
 @app.post("/login")
-def login(datos: UsuarioLogin, db: Session = Depends(get_db)):
+async def login(datos: UsuarioLogin, db: AsyncSession = Depends(get_db)):
     """
     Autentica al usuario y devuelve un token JWT válido.
 
     Args:
         datos (UsuarioLogin): Credenciales de usuario.
-        db (Session): Sesión activa de la base de datos.
+        db (AsyncSession): Sesión activa de la base de datos.
 
     Returns:
         dict: Token JWT si la autenticación fue exitosa.
@@ -421,6 +1140,7 @@ def login(datos: UsuarioLogin, db: Session = Depends(get_db)):
         HTTPException 400: Datos inválidos.
         HTTPException 401: Usuario no encontrado o contraseña incorrecta.
         HTTPException 500: Error al generar el token.
+        HTTPException 503: Si el pool de hashing está saturado.
     """
     if not datos.username or len(datos.username.strip()) < 3:
         raise HTTPException(status_code=400, detail="Debes ingresar un nombre de usuario válido.")
@@ -428,41 +1148,92 @@ def login(datos: UsuarioLogin, db: Session = Depends(get_db)):
     if not datos.password or len(datos.password) < 6:
         raise HTTPException(status_code=400, detail="Debes ingresar una contraseña válida de al menos 6 caracteres.")
 
-    usuario = db.query(Usuario).filter(Usuario.username == datos.username.strip()).first()
+    usuario = await db.scalar(select(Usuario).where(Usuario.username == datos.username.strip()))
 
     if not usuario:
         raise HTTPException(status_code=401, detail="El nombre de usuario no está registrado.")
 
-    if not verificar_password(datos.password, usuario.password_hash):
+    valida, nuevo_hash = await comprobar_password(datos.password, usuario.password_hash)
+    if not valida:
         raise HTTPException(status_code=401, detail="La contraseña es incorrecta.")
 
+    # Rehash transparente si han cambiado los parámetros de coste
+    if nuevo_hash:
+        usuario.password_hash = nuevo_hash
+        await db.commit()
+
     try:
-        token = crear_token({"sub": usuario.username})
+        token = crear_token({"sub": usuario.username, "uid": usuario.id, "ver": usuario.token_version or 0})
     except Exception as e:
         raise HTTPException(status_code=500, detail="Hubo un error al generar el token. Intenta nuevamente.")
 
     return {"access_token": token, "token_type": "bearer"}
 
-# Endpoint para que el cliente de Python envíe datos OBD-II
-@app.post("/guardar-vehiculo/")
-def guardar_vehiculo(datos: VehiculoRegistro, usuario: Usuario = Depends(obtener_usuario_desde_token), db: Session = Depends(get_db)):
+# Endpoint para cambiar la contraseña y revocar los tokens emitidos
+@app.post("/cambiar-password")
+async def cambiar_password(datos: CambioPassword, usuario: UsuarioAutenticado = Depends(obtener_usuario_desde_token), db: AsyncSession = Depends(get_db)):
     """
-    Guarda un nuevo vehículo en la base de datos asociado al usuario autenticado.
+    Cambia la contraseña del usuario autenticado y revoca todos sus tokens anteriores.
+
+    Se incrementa ``token_version`` del usuario, de modo que los tokens emitidos antes del cambio
+    dejan de ser válidos, y se invalida su entrada en la caché de principales.
 
     Args:
-        vehiculo (VehiculoBase): Datos del vehículo (marca, modelo, año, color, etc.).
-        db (Session): Sesión de base de datos.
-        usuario (Usuario): Usuario autenticado, extraído desde el token JWT.
+        datos (CambioPassword): Contraseña actual y nueva.
+        usuario (UsuarioAutenticado): Usuario autenticado mediante JWT.
+        db (AsyncSession): Sesión activa de la base de datos.
 
     Returns:
-        dict: Mensaje de confirmación.
+        dict: Mensaje de confirmación y un nuevo token JWT.
 
     Raises:
-        HTTPException 401: Si no se proporciona un token válido.
+        HTTPException 400: Si la nueva contraseña no cumple la longitud mínima.
+        HTTPException 401: Si la contraseña actual es incorrecta.
+        HTTPException 503: Si el pool de hashing está saturado.
+    """
+    if not datos.password_nueva or len(datos.password_nueva) < 6:
+        raise HTTPException(status_code=400, detail="La contraseña debe tener al menos 6 caracteres.")
+
+    registro = await db.get(Usuario, usuario.id)
+    if registro is None:
+        raise HTTPException(status_code=401, detail="Usuario no encontrado")
+    valida, _ = await comprobar_password(datos.password_actual, registro.password_hash)
+    if not valida:
+        raise HTTPException(status_code=401, detail="La contraseña es incorrecta.")
+
+    registro.password_hash = await hashear_password(datos.password_nueva)
+    registro.token_version = (registro.token_version or 0) + 1
+    await db.commit()
+
+    token = crear_token({"sub": registro.username, "uid": registro.id, "ver": registro.token_version})
+    return {"mensaje": "Contraseña actualizada correctamente", "access_token": token, "token_type": "bearer"}
+
+# Validaciones compartidas por los endpoints de vehículos y errores
+# VIN de ejemplo que las versiones anteriores del cliente enviaban cuando no podían leer el del vehículo:
+# aceptarlo haría que todos los escaneos fallidos sobrescribieran el mismo vehículo
+VINS_DE_EJEMPLO = frozenset({"1HGCM82633A123456"})
+
+def es_vin_de_ejemplo(vin: Optional[str]) -> bool:
+    """
+    Indica si `vin` es un VIN de ejemplo y no el de un vehículo real.
+    """
+    return bool(vin) and vin.strip().upper() in VINS_DE_EJEMPLO
+
+def validar_datos_vehiculo(datos: VehiculoRegistro):
+    """
+    Comprueba los campos obligatorios de un vehículo antes de guardarlo.
+
+    Args:
+        datos (VehiculoRegistro): Datos del vehículo recibidos.
+
+    Raises:
+        HTTPException 400: Si el VIN no tiene 17 caracteres o es un VIN de ejemplo, falta un campo o la
+            revisión no es un objeto JSON.
     """
-    # Validaciones básicas
     if not datos.vin or len(datos.vin.strip()) != 17:
         raise HTTPException(status_code=400, detail="El VIN debe contener exactamente 17 caracteres.")
+    if es_vin_de_ejemplo(datos.vin):
+        raise HTTPException(status_code=400, detail="El VIN es un valor de ejemplo: no se pudo leer el VIN real del vehículo.")
 
     campos_requeridos = {
         "marca": datos.marca,
@@ -478,197 +1249,1521 @@ def guardar_vehiculo(datos: VehiculoRegistro, usuario: Usuario = Depends(obtener
     if not isinstance(datos.revision, dict):
         raise HTTPException(status_code=400, detail="El campo 'revision' debe ser un objeto JSON.")
 
-    # Verificar si el VIN ya está registrado
-    if db.query(Vehiculo).filter(Vehiculo.vin == datos.vin.strip()).first():
-        raise HTTPException(status_code=400, detail="El número de VIN ya está registrado. Debe ser único por vehículo.")
-
-    try:
-        nuevo_vehiculo = Vehiculo(
-            marca=datos.marca.strip(),
-            modelo=datos.modelo.strip(),
-            year=datos.year,
-            rpm=datos.rpm,
-            velocidad=datos.velocidad,
-            vin=datos.vin.strip(),
-            revision=str(datos.revision),
-            usuario_id=usuario.id
-        )
-        db.add(nuevo_vehiculo)
-        db.commit()
-    except Exception as e:
-        db.rollback()
-        raise HTTPException(status_code=500, detail=f"Error al guardar el vehículo: {str(e)}")
-
-    return {"mensaje": "Vehículo guardado correctamente", "id": nuevo_vehiculo.id}
-
-# Endpoint para que el cliente de Python envíe errores OBD-II
-@app.post("/guardar-errores/")
-def guardar_errores(datos: ErrorVehiculoRegistro, usuario: Usuario = Depends(obtener_usuario_desde_token), db: Session = Depends(get_db)):
+def limpiar_codigos_dtc(codigos: list[str]) -> list[str]:
     """
-    Guarda una lista de códigos de error OBD-II (DTC) asociados a un vehículo del usuario autenticado.
-
-    Este endpoint es utilizado por el cliente Python que recibe errores del escáner OBD-II y los envía al backend para su almacenamiento.
+    Normaliza una lista de códigos DTC eliminando espacios y entradas vacías.
 
     Args:
-        datos (ErrorVehiculoRegistro): Objeto que contiene el ID del vehículo y una lista de códigos DTC.
-        usuario (Usuario): Usuario autenticado, obtenido desde el token JWT.
-        db (Session): Sesión activa de la base de datos.
+        codigos (list[str]): Códigos recibidos.
 
     Returns:
-        dict: Mensaje de confirmación si los errores fueron guardados correctamente.
+        list[str]: Códigos limpios.
 
     Raises:
-        HTTPException 400:
-            - Si el ID del vehículo no es válido (no entero o negativo).
-            - Si la lista de códigos está vacía o contiene valores vacíos.
-            - Si hay códigos DTC duplicados.
-        HTTPException 404: Si el vehículo no pertenece al usuario autenticado.
-        HTTPException 500: Si ocurre un error inesperado al guardar en la base de datos.
+        HTTPException 400: Si todos los códigos están vacíos o hay duplicados.
     """
-    # Validar el ID del vehículo
-    if not isinstance(datos.vehiculo_id, int) or datos.vehiculo_id <= 0:
-        raise HTTPException(status_code=400, detail="El ID del vehículo debe ser un número entero positivo.")
-
-    # Validar lista de códigos
-    if not isinstance(datos.codigo_dtc, list) or len(datos.codigo_dtc) == 0:
-        raise HTTPException(status_code=400, detail="Debe proporcionar al menos un código DTC.")
-    
-    codigos_limpios = [c.strip() for c in datos.codigo_dtc if c and c.strip()]
+    codigos_limpios = [c.strip() for c in codigos if c and c.strip()]
     if not codigos_limpios:
         raise HTTPException(status_code=400, detail="Todos los códigos DTC están vacíos o en blanco.")
-    
+
     if len(set(codigos_limpios)) != len(codigos_limpios):
         raise HTTPException(status_code=400, detail="Hay códigos DTC duplicados en la lista.")
+    return codigos_limpios
 
-    # Verificar propiedad del vehículo
-    vehiculo = db.query(Vehiculo).filter(
-        Vehiculo.id == datos.vehiculo_id, 
-        Vehiculo.usuario_id == usuario.id
-    ).first()
+def ejecutar_upsert(db: Session, tabla, filas: list[dict], claves: list[str], actualizar) -> bool:
+    """
+    Ejecuta un ``INSERT ... ON DUPLICATE KEY UPDATE`` (MySQL) u ``ON CONFLICT DO UPDATE``
+    (SQLite/PostgreSQL) en bloque.
 
-    if vehiculo is None:
-        raise HTTPException(status_code=404, detail="No se encontró un vehículo con ese ID para el usuario autenticado.")
+    Args:
+        db (Session): Sesión activa (no hace commit).
+        tabla (Table): Tabla destino.
+        filas (list[dict]): Filas a insertar.
+        claves (list[str]): Columnas de la restricción única en conflicto.
+        actualizar (Callable): Recibe la pseudo-tabla de valores entrantes (``inserted`` / ``excluded``)
+            y devuelve el diccionario de columnas a actualizar.
 
-    try:
-        for codigo in codigos_limpios:
-            error = ErrorVehiculo(vehiculo_id=vehiculo.id, codigo_dtc=codigo)
-            db.add(error)
-        db.commit()
+    Returns:
+        bool: ``False`` si el motor no admite upsert y no se ha ejecutado nada.
+    """
+    dialecto = db.get_bind().dialect.name
+    if dialecto == "mysql":
+        sentencia = mysql.insert(tabla)
+        sentencia = sentencia.on_duplicate_key_update(**actualizar(sentencia.inserted))
+    elif dialecto in ("sqlite", "postgresql"):
+        sentencia = (sqlite if dialecto == "sqlite" else postgresql).insert(tabla)
+        sentencia = sentencia.on_conflict_do_update(index_elements=claves, set_=actualizar(sentencia.excluded))
+    else:
+        return False
+    db.execute(sentencia, filas)
+    return True
+
+def sumar_contadores(db: Session, tabla, filas: list[dict], claves: list[str], columna: str = "detecciones"):
+    """
+    Suma ``columna`` de cada fila al contador existente con las mismas claves, o inserta la fila.
+
+    Usa `ejecutar_upsert` y, en motores sin upsert, un ``UPDATE`` por fila seguido de ``INSERT``
+    si no había contador.
+    """
+    if ejecutar_upsert(db, tabla, filas, claves, lambda nuevos: {columna: tabla.c[columna] + nuevos[columna]}):
+        return
+    for fila in filas:
+        condicion = [tabla.c[c] == fila[c] for c in claves]
+        resultado = db.execute(update(tabla).where(*condicion).values({columna: tabla.c[columna] + fila[columna]}))
+        if resultado.rowcount == 0:
+            db.execute(insert(tabla), fila)
+
+def acumular_estadisticas_dtc(db: Session, filas: list[dict], ahora: datetime):
+    """
+    Suma las detecciones de códigos DTC a los contadores de `estadisticas_dtc`.
+
+    Carga en una sola consulta el propietario, marca, modelo y año de los vehículos implicados y
+    agrega las filas en memoria antes del upsert, de modo que cada combinación se escribe una vez.
+    Después suma la aportación de cada vehículo en `detecciones_dtc`, que es lo que se resta al
+    eliminarlo.
+
+    Args:
+        db (Session): Sesión activa (no hace commit).
+        filas (list[dict]): Filas con ``vehiculo_id`` y ``codigo_dtc``.
+        ahora (datetime): Momento de la detección (determina el mes).
+    """
+    vehiculos = {
+        fila.id: fila for fila in db.execute(
+            select(Vehiculo.id, Vehiculo.usuario_id, Vehiculo.marca, Vehiculo.modelo, Vehiculo.year)
+            .where(Vehiculo.id.in_({f["vehiculo_id"] for f in filas}))
+        )
+    }
+    mes = ahora.strftime("%Y-%m")
+    contadores = {}
+    aportaciones = {}
+    for f in filas:
+        v = vehiculos.get(f["vehiculo_id"])
+        if v is None or v.usuario_id is None:
+            continue
+        clave = (v.usuario_id, mes, f["codigo_dtc"], v.marca or "", v.modelo or "", v.year or 0)
+        contadores[clave] = contadores.get(clave, 0) + 1
+        aportaciones[v.id, clave] = aportaciones.get((v.id, clave), 0) + 1
+    if not contadores:
+        return
+
+    tabla = EstadisticaDtc.__table__
+    claves = ["usuario_id", "mes", "codigo_dtc", "marca", "modelo", "year"]
+    sumar_contadores(db, tabla, [{**dict(zip(claves, clave)), "detecciones": n} for clave, n in contadores.items()], claves)
+
+    # Las colaciones de MySQL no distinguen mayúsculas ni espacios finales: si la fila existente
+    # no coincide exactamente con la clave se busca normalizada
+    def normalizar(clave):
+        return tuple(c.casefold().rstrip() if isinstance(c, str) else c for c in clave)
+
+    ids = {}
+    for fila in db.execute(
+        select(tabla.c.id, *[tabla.c[c] for c in claves])
+        .where(tabla.c.usuario_id.in_({c[0] for c in contadores}), tabla.c.mes == mes,
+               tabla.c.codigo_dtc.in_({c[2] for c in contadores}))
+    ):
+        ids[tuple(fila[1:])] = fila.id
+        ids.setdefault(normalizar(fila[1:]), fila.id)
+    sumar_contadores(db, DeteccionDtc.__table__, [
+        {"vehiculo_id": vehiculo_id, "estadistica_id": ids.get(clave) or ids[normalizar(clave)], "detecciones": n}
+        for (vehiculo_id, clave), n in aportaciones.items()
+    ], ["vehiculo_id", "estadistica_id"])
+
+def insertar_errores(db: Session, filas: list[dict]):
+    """
+    Registra códigos DTC en bloque con semántica de upsert idempotente.
+
+    Se ejecuta una única sentencia ``INSERT ... ON DUPLICATE KEY UPDATE`` (MySQL) u
+    ``ON CONFLICT DO UPDATE`` (SQLite/PostgreSQL) sobre la restricción única
+    ``(vehiculo_id, codigo_dtc)``: los códigos nuevos se insertan y los ya almacenados
+    actualizan `ultima_deteccion` e incrementan `ocurrencias`. En otros motores se detectan
+    los duplicados con una consulta por conjuntos antes de insertar.
+
+    En la misma transacción se actualizan los contadores de `estadisticas_dtc`.
+
+    Se ejecuta sobre la sesión síncrona (``await db.run_sync(insertar_errores, filas)``).
+
+    Args:
+        db (Session): Sesión activa (no hace commit).
+        filas (list[dict]): Filas con ``vehiculo_id`` y ``codigo_dtc``.
+    """
+    if not filas:
+        return
+
+    ahora = datetime.utcnow()
+    filas = [{**f, "primera_deteccion": ahora, "ultima_deteccion": ahora, "ocurrencias": 1} for f in filas]
+    tabla = ErrorVehiculo.__table__
+
+    def actualizar(nuevos):
+        return {"ultima_deteccion": nuevos.ultima_deteccion, "ocurrencias": tabla.c.ocurrencias + 1}
+
+    if not ejecutar_upsert(db, tabla, filas, ["vehiculo_id", "codigo_dtc"], actualizar):
+        vehiculo_ids = {f["vehiculo_id"] for f in filas}
+        almacenados = set(
+            db.query(ErrorVehiculo.vehiculo_id, ErrorVehiculo.codigo_dtc)
+            .filter(ErrorVehiculo.vehiculo_id.in_(vehiculo_ids))
+        )
+        nuevos = [f for f in filas if (f["vehiculo_id"], f["codigo_dtc"]) not in almacenados]
+        repetidos = [f for f in filas if (f["vehiculo_id"], f["codigo_dtc"]) in almacenados]
+        if nuevos:
+            db.execute(insert(tabla), nuevos)
+        for f in repetidos:
+            db.execute(
+                update(tabla)
+                .where(tabla.c.vehiculo_id == f["vehiculo_id"], tabla.c.codigo_dtc == f["codigo_dtc"])
+                .values(ultima_deteccion=ahora, ocurrencias=tabla.c.ocurrencias + 1)
+            )
+
+    acumular_estadisticas_dtc(db, filas, ahora)
+
+# Endpoint para que el cliente de Python envíe datos OBD-II
+@app.post("/guardar-vehiculo/")
+async def guardar_vehiculo(datos: VehiculoRegistro, usuario: UsuarioAutenticado = Depends(obtener_usuario_desde_token), db: AsyncSession = Depends(get_db)):
+    """
+    Guarda un nuevo vehículo en la base de datos asociado al usuario autenticado.
+
+    Args:
+        vehiculo (VehiculoBase): Datos del vehículo (marca, modelo, año, color, etc.).
+        db (AsyncSession): Sesión de base de datos.
+        usuario (UsuarioAutenticado): Usuario autenticado, extraído desde el token JWT.
+
+    Returns:
+        dict: Mensaje de confirmación.
+
+    Raises:
+        HTTPException 401: Si no se proporciona un token válido.
+    """
+    validar_datos_vehiculo(datos)
+
+    # Verificar si el VIN ya está registrado
+    if await db.scalar(select(Vehiculo.id).where(Vehiculo.vin == datos.vin.strip())):
+        raise HTTPException(status_code=400, detail="El número de VIN ya está registrado. Debe ser único por vehículo.")
+
+    try:
+        nuevo_vehiculo = Vehiculo(
+            marca=datos.marca.strip(),
+            modelo=datos.modelo.strip(),
+            year=datos.year,
+            rpm=datos.rpm,
+            velocidad=datos.velocidad,
+            vin=datos.vin.strip(),
+            revision=datos.revision,
+            usuario_id=usuario.id,
+            items_revision=[RevisionItem(**item) for item in items_de_revision(datos.revision)]
+        )
+        db.add(nuevo_vehiculo)
+        await db.commit()
     except Exception as e:
-        db.rollback()
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"Error al guardar el vehículo: {str(e)}")
+
+    return {"mensaje": "Vehículo guardado correctamente", "id": nuevo_vehiculo.id}
+
+# Endpoint para que el cliente de Python envíe errores OBD-II
+@app.post("/guardar-errores/")
+async def guardar_errores(datos: ErrorVehiculoRegistro, usuario: UsuarioAutenticado = Depends(obtener_usuario_desde_token), db: AsyncSession = Depends(get_db)):
+    """
+    Guarda una lista de códigos de error OBD-II (DTC) asociados a un vehículo del usuario autenticado.
+
+    Este endpoint es utilizado por el cliente Python que recibe errores del escáner OBD-II y los envía al backend para su almacenamiento.
+    Los códigos ya almacenados para el vehículo no se duplican: se actualiza su última detección y su contador de ocurrencias.
+
+    Args:
+        datos (ErrorVehiculoRegistro): Objeto que contiene el ID del vehículo y una lista de códigos DTC.
+        usuario (UsuarioAutenticado): Usuario autenticado, obtenido desde el token JWT.
+        db (AsyncSession): Sesión activa de la base de datos.
+
+    Returns:
+        dict: Mensaje de confirmación si los errores fueron guardados correctamente.
+
+    Raises:
+        HTTPException 400:
+            - Si el ID del vehículo no es válido (no entero o negativo).
+            - Si la lista de códigos está vacía o contiene valores vacíos.
+            - Si hay códigos DTC duplicados.
+        HTTPException 404: Si el vehículo no pertenece al usuario autenticado.
+        HTTPException 500: Si ocurre un error inesperado al guardar en la base de datos.
+    """
+    # Validar el ID del vehículo
+    if not isinstance(datos.vehiculo_id, int) or datos.vehiculo_id <= 0:
+        raise HTTPException(status_code=400, detail="El ID del vehículo debe ser un número entero positivo.")
+
+    # Validar lista de códigos
+    if not isinstance(datos.codigo_dtc, list) or len(datos.codigo_dtc) == 0:
+        raise HTTPException(status_code=400, detail="Debe proporcionar al menos un código DTC.")
+
+    codigos_limpios = limpiar_codigos_dtc(datos.codigo_dtc)
+
+    # Verificar propiedad del vehículo
+    vehiculo = await db.scalar(select(Vehiculo).where(
+        Vehiculo.id == datos.vehiculo_id,
+        Vehiculo.usuario_id == usuario.id
+    ))
+
+    if vehiculo is None:
+        raise HTTPException(status_code=404, detail="No se encontró un vehículo con ese ID para el usuario autenticado.")
+
+    try:
+        await db.run_sync(insertar_errores, [{"vehiculo_id": vehiculo.id, "codigo_dtc": codigo} for codigo in codigos_limpios])
+        await db.commit()
+        cache_informes.invalidar_vehiculo(vehiculo.id)
+    except Exception as e:
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"No se pudieron guardar los errores del vehículo: {str(e)}")
 
     return {"mensaje": "Errores del vehículo guardados correctamente"}
 
+# Ingesta por lotes desde el cliente OBD
+INGESTA_MAX_VEHICULOS = int(os.getenv("INGESTA_MAX_VEHICULOS", 1000))
+
+@app.post("/ingesta/lote")
+async def ingesta_lote(datos: IngestaLote, usuario: UsuarioAutenticado = Depends(obtener_usuario_desde_token), db: AsyncSession = Depends(get_db)):
+    """
+    Guarda en una sola transacción un lote de vehículos escaneados junto con sus códigos DTC.
+
+    Pensado para técnicos que trabajan sin conexión y sincronizan muchos escaneos a la vez
+    (el cliente OBD lo usa desde su diario local, con el cuerpo comprimido con ``gzip``).
+    Todos los elementos se validan antes de escribir; los VIN existentes se cargan con una sola
+    consulta y las inserciones/actualizaciones se hacen con ``executemany``, de modo que el número
+    de viajes a la base de datos no depende del tamaño del lote.
+
+    Si un VIN ya pertenece al usuario, el vehículo se actualiza con los datos del nuevo escaneo.
+
+    Args:
+        datos (IngestaLote): Lista de vehículos con sus códigos DTC.
+        usuario (UsuarioAutenticado): Usuario autenticado mediante JWT.
+        db (AsyncSession): Sesión activa de la base de datos.
+
+    Returns:
+        dict: Resultado por elemento (``creado``, ``actualizado`` o ``error``) y totales.
+
+    Raises:
+        HTTPException 400: Si el lote está vacío o supera `INGESTA_MAX_VEHICULOS`.
+        HTTPException 500: Si falla la escritura del lote (no se guarda ningún elemento).
+    """
+    if not datos.vehiculos:
+        raise HTTPException(status_code=400, detail="El lote no contiene vehículos.")
+    if len(datos.vehiculos) > INGESTA_MAX_VEHICULOS:
+        raise HTTPException(status_code=400, detail=f"El lote no puede superar {INGESTA_MAX_VEHICULOS} vehículos.")
+
+    resultados = [None] * len(datos.vehiculos)
+    validos = {}  # vin -> (indice, vehiculo, codigos)
+
+    # 1. Validación completa del lote antes de escribir
+    for indice, vehiculo in enumerate(datos.vehiculos):
+        try:
+            validar_datos_vehiculo(vehiculo)
+            codigos = limpiar_codigos_dtc(vehiculo.errores) if vehiculo.errores else []
+        except HTTPException as e:
+            resultados[indice] = {"indice": indice, "vin": vehiculo.vin, "estado": "error", "detalle": e.detail}
+            continue
+
+        vin = vehiculo.vin.strip()
+        if vin in validos:
+            resultados[indice] = {"indice": indice, "vin": vin, "estado": "error", "detalle": "VIN duplicado dentro del lote."}
+            continue
+        validos[vin] = (indice, vehiculo, codigos)
+
+    # 2. Una sola consulta para los VIN ya registrados
+    existentes = {}
+    if validos:
+        filas = await db.execute(
+            select(Vehiculo.vin, Vehiculo.id, Vehiculo.usuario_id).where(Vehiculo.vin.in_(list(validos)))
+        )
+        existentes = {vin: (vehiculo_id, propietario) for vin, vehiculo_id, propietario in filas}
+
+    nuevos, actualizados = [], []
+    for vin, (indice, vehiculo, codigos) in list(validos.items()):
+        fila = {
+            "marca": vehiculo.marca.strip(),
+            "modelo": vehiculo.modelo.strip(),
+            "year": vehiculo.year,
+            "rpm": vehiculo.rpm,
+            "velocidad": vehiculo.velocidad,
+            "revision": vehiculo.revision,
+        }
+        if vin not in existentes:
+            nuevos.append({**fila, "vin": vin, "usuario_id": usuario.id})
+        elif existentes[vin][1] == usuario.id:
+            actualizados.append({**fila, "id": existentes[vin][0]})
+        else:
+            resultados[indice] = {"indice": indice, "vin": vin, "estado": "error", "detalle": "El número de VIN ya está registrado por otro usuario."}
+            del validos[vin]
+
+    # 3. Escritura en bloque dentro de una única transacción
+    try:
+        if nuevos:
+            await db.execute(insert(Vehiculo), nuevos)
+        if actualizados:
+            await db.execute(update(Vehiculo), actualizados)
+
+        ids = {}
+        if nuevos:
+            ids = dict((await db.execute(
+                select(Vehiculo.vin, Vehiculo.id).where(Vehiculo.vin.in_([f["vin"] for f in nuevos]))
+            )).all())
+        ids.update({vin: existentes[vin][0] for vin in validos if vin in existentes})
+
+        # La revisión normalizada de los vehículos actualizados se sustituye por la del nuevo escaneo
+        if actualizados:
+            await db.execute(delete(RevisionItem).where(RevisionItem.vehiculo_id.in_([f["id"] for f in actualizados])))
+        items = [
+            {"vehiculo_id": ids[vin], **item}
+            for vin, (_, vehiculo, _) in validos.items()
+            for item in items_de_revision(vehiculo.revision)
+        ]
+        if items:
+            await db.execute(insert(RevisionItem), items)
+
+        await db.run_sync(insertar_errores, [
+            {"vehiculo_id": ids[vin], "codigo_dtc": codigo}
+            for vin, (_, _, codigos) in validos.items()
+            for codigo in codigos
+        ])
+        await db.commit()
+        for fila in actualizados:
+            cache_informes.invalidar_vehiculo(fila["id"])
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"Error al guardar el lote: {str(e)}")
+
+    for vin, (indice, _, codigos) in validos.items():
+        resultados[indice] = {
+            "indice": indice,
+            "vin": vin,
+            "estado": "actualizado" if vin in existentes else "creado",
+            "id": ids[vin],
+            "errores_guardados": len(codigos),
+        }
+
+    return {
+        "procesados": len(resultados),
+        "guardados": len(validos),
+        "fallidos": len(resultados) - len(validos),
+        "resultados": resultados,
+    }
+
+# Paginación por cursor del listado de vehículos
+"""
+Paginación del listado de vehículos:
+
+- `CAMPOS_VEHICULO` define las columnas que se pueden solicitar con ``fields=``.
+- El cursor es opaco para el cliente: codifica el último ``id`` devuelto en base64.
+- `LIMITE_VEHICULOS_DEFECTO` y `LIMITE_VEHICULOS_MAX` acotan el tamaño de página. Sin ``limite``
+  ni ``cursor`` ``/mis-vehiculos/`` devuelve la lista completa (compatibilidad con clientes que no paginan).
+"""
+CAMPOS_VEHICULO = ("id", "marca", "modelo", "year", "rpm", "velocidad", "vin", "revision", "usuario_id")
+LIMITE_VEHICULOS_DEFECTO = 100
+LIMITE_VEHICULOS_MAX = 500
+
+def codificar_cursor(ultimo_id: int) -> str:
+    """
+    Codifica el último ID de una página como cursor opaco.
+
+    Args:
+        ultimo_id (int): ID del último vehículo devuelto.
+
+    Returns:
+        str: Cursor en base64 URL-safe.
+    """
+    return base64.urlsafe_b64encode(str(ultimo_id).encode()).decode().rstrip("=")
+
+def decodificar_cursor(cursor: str) -> int:
+    """
+    Decodifica un cursor generado por `codificar_cursor`.
+
+    Args:
+        cursor (str): Cursor recibido del cliente.
+
+    Returns:
+        int: ID a partir del cual continuar el listado.
+
+    Raises:
+        HTTPException 400: Si el cursor no es válido.
+    """
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        ultimo_id = int(base64.urlsafe_b64decode(cursor + relleno).decode())
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="El cursor proporcionado no es válido.")
+    if ultimo_id < 0:
+        raise HTTPException(status_code=400, detail="El cursor proporcionado no es válido.")
+    return ultimo_id
+
+def parsear_campos_vehiculo(fields: Optional[str]) -> list[str]:
+    """
+    Convierte el parámetro ``fields`` en la lista de columnas a seleccionar.
+
+    El ``id`` se incluye siempre porque es la clave del cursor.
+
+    Args:
+        fields (Optional[str]): Lista de campos separada por comas.
+
+    Returns:
+        list[str]: Columnas de `Vehiculo` a proyectar.
+
+    Raises:
+        HTTPException 400: Si se solicita un campo desconocido.
+    """
+    if not fields:
+        return list(CAMPOS_VEHICULO)
+    campos = [c.strip() for c in fields.split(",") if c.strip()]
+    desconocidos = [c for c in campos if c not in CAMPOS_VEHICULO]
+    if desconocidos:
+        raise HTTPException(status_code=400, detail=f"Campos no válidos: {', '.join(desconocidos)}")
+    return ["id"] + [c for c in dict.fromkeys(campos) if c != "id"]
+
 # Endpoint para obtener vehículos del usuario autenticado
-@app.get("/mis-vehiculos/")
-def obtener_vehiculos(usuario: Usuario = Depends(obtener_usuario_desde_token), db: Session = Depends(get_db)):
+@app.get("/mis-vehiculos/", response_model=ListaVehiculosOut, response_model_exclude_unset=True)
+async def obtener_vehiculos(
+    limite: Optional[int] = Query(None, ge=1, le=LIMITE_VEHICULOS_MAX),
+    cursor: Optional[str] = None,
+    marca: Optional[str] = None,
+    modelo: Optional[str] = None,
+    year: Optional[int] = None,
+    vin: Optional[str] = None,
+    fields: Optional[str] = None,
+    usuario: UsuarioAutenticado = Depends(obtener_usuario_desde_token),
+    db: AsyncSession = Depends(get_db)
+):
     """
-    Obtiene todos los vehículos registrados por el usuario autenticado.
+    Obtiene los vehículos registrados por el usuario autenticado, paginados por cursor.
+
+    La consulta recorre el índice ``(usuario_id, id)`` a partir del último ID de la página
+    anterior, por lo que el coste de cada página no depende del tamaño de la flota.
+    Si no se indica ``limite`` ni ``cursor`` se devuelven todos los vehículos en una sola respuesta.
 
     Args:
-        db (Session): Sesión de base de datos.
-        usuario (Usuario): Usuario autenticado mediante JWT.
+        limite (Optional[int]): Número máximo de vehículos por página (por defecto `LIMITE_VEHICULOS_DEFECTO`
+            si se pagina con ``cursor``).
+        cursor (Optional[str]): Cursor devuelto en ``siguiente_cursor`` por la página anterior.
+        marca (Optional[str]): Filtra por marca exacta.
+        modelo (Optional[str]): Filtra por modelo exacto.
+        year (Optional[int]): Filtra por año de fabricación.
+        vin (Optional[str]): Filtra por prefijo del VIN.
+        fields (Optional[str]): Campos a devolver separados por comas (p. ej. ``marca,modelo``).
+        db (AsyncSession): Sesión de base de datos.
+        usuario (UsuarioAutenticado): Usuario autenticado mediante JWT.
 
     Returns:
-        List[VehiculoBase]: Lista de vehículos asociados al usuario.
+        ListaVehiculosOut: Lista de vehículos y ``siguiente_cursor`` (``None`` si no hay más páginas).
+
+    Raises:
+        HTTPException 400: Si el cursor o los campos solicitados no son válidos.
     """
+    campos = parsear_campos_vehiculo(fields)
+
+    consulta = select(*[getattr(Vehiculo, c) for c in campos]).where(Vehiculo.usuario_id == usuario.id)
+    if cursor:
+        consulta = consulta.where(Vehiculo.id > decodificar_cursor(cursor))
+    if marca:
+        consulta = consulta.where(Vehiculo.marca == marca.strip())
+    if modelo:
+        consulta = consulta.where(Vehiculo.modelo == modelo.strip())
+    if year is not None:
+        consulta = consulta.where(Vehiculo.year == year)
+    if vin:
+        consulta = consulta.where(Vehiculo.vin.startswith(vin.strip(), autoescape=True))
+
+    consulta = consulta.order_by(Vehiculo.id)
+    if limite is None and cursor:
+        limite = LIMITE_VEHICULOS_DEFECTO
+    if limite is not None:
+        consulta = consulta.limit(limite + 1)
     try:
-        vehiculos = db.query(Vehiculo).filter(Vehiculo.usuario_id == usuario.id).all()
-        if not vehiculos:
-            return {"mensaje": "No hay vehículos registrados para este usuario.", "vehiculos": []}
-        return {"vehiculos": vehiculos}
+        filas = (await db.execute(consulta)).all()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener los vehículos: {str(e)}")
 
+    hay_mas = limite is not None and len(filas) > limite
+    # model_construct: las filas ya vienen tipadas de la base de datos y solo marca como presentes los campos proyectados
+    vehiculos = [VehiculoOut.model_construct(**fila._mapping) for fila in filas[:limite]]
+    siguiente_cursor = codificar_cursor(vehiculos[-1].id) if hay_mas else None
+
+    if not vehiculos and not cursor:
+        return ListaVehiculosOut(mensaje="No hay vehículos registrados para este usuario.", vehiculos=[], siguiente_cursor=None)
+    return ListaVehiculosOut(vehiculos=vehiculos, siguiente_cursor=siguiente_cursor)
+
+# Exportación completa de vehículos y errores
+EXPORTAR_LOTE = int(os.getenv("EXPORTAR_LOTE", 1000))
+COLUMNAS_EXPORTACION = (
+    "vehiculo_id", "marca", "modelo", "year", "vin", "rpm", "velocidad", "revision",
+    "codigo_dtc", "primera_deteccion", "ultima_deteccion", "ocurrencias",
+)
+
+def valor_exportable(valor):
+    """
+    Convierte fechas a ISO 8601 para que CSV y NDJSON las representen igual.
+    """
+    return valor.isoformat() if isinstance(valor, datetime) else valor
+
+def celda_csv(valor):
+    """
+    Valor de una celda CSV: la revisión se escribe como JSON y el resto como en NDJSON.
+    """
+    if isinstance(valor, (dict, list)):
+        return json.dumps(valor, ensure_ascii=False)
+    return valor_exportable(valor)
+
+async def filas_exportacion(db: AsyncSession, usuario_id: int):
+    """
+    Recorre con un cursor de servidor los vehículos del usuario unidos a sus errores.
+
+    Las filas llegan en particiones de `EXPORTAR_LOTE`, de modo que la memoria usada no depende
+    del tamaño de la cuenta. Están ordenadas por vehículo, con una fila por error (o una sola fila
+    con los campos del error a ``None`` si el vehículo no tiene errores).
+    """
+    consulta = (
+        select(
+            Vehiculo.id.label("vehiculo_id"), Vehiculo.marca, Vehiculo.modelo, Vehiculo.year, Vehiculo.vin,
+            Vehiculo.rpm, Vehiculo.velocidad, Vehiculo.revision, ErrorVehiculo.codigo_dtc,
+            ErrorVehiculo.primera_deteccion, ErrorVehiculo.ultima_deteccion, ErrorVehiculo.ocurrencias,
+        )
+        .outerjoin(ErrorVehiculo, ErrorVehiculo.vehiculo_id == Vehiculo.id)
+        .where(Vehiculo.usuario_id == usuario_id)
+        .order_by(Vehiculo.id, ErrorVehiculo.id)
+        .execution_options(yield_per=EXPORTAR_LOTE)
+    )
+    resultado = await db.stream(consulta)
+    try:
+        async for particion in resultado.partitions():
+            yield particion
+    finally:
+        await resultado.close()
+
+async def exportar_csv(db: AsyncSession, usuario_id: int):
+    """
+    Genera el CSV por bloques: la cabecera se envía antes de la primera consulta.
+    """
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow(COLUMNAS_EXPORTACION)
+    yield buffer.getvalue()
+
+    async for particion in filas_exportacion(db, usuario_id):
+        buffer.seek(0)
+        buffer.truncate()
+        escritor.writerows([celda_csv(valor) for valor in fila] for fila in particion)
+        yield buffer.getvalue()
+
+async def exportar_ndjson(db: AsyncSession, usuario_id: int):
+    """
+    Genera una línea JSON por vehículo con sus errores anidados.
+
+    Como las filas llegan ordenadas por vehículo, solo se mantiene en memoria el vehículo en curso.
+    """
+    actual = None
+    async for particion in filas_exportacion(db, usuario_id):
+        lineas = []
+        for fila in particion:
+            if actual is None or actual["id"] != fila.vehiculo_id:
+                if actual is not None:
+                    lineas.append(json.dumps(actual, ensure_ascii=False))
+                actual = {
+                    "id": fila.vehiculo_id, "marca": fila.marca, "modelo": fila.modelo, "year": fila.year,
+                    "vin": fila.vin, "rpm": fila.rpm, "velocidad": fila.velocidad, "revision": fila.revision,
+                    "errores": [],
+                }
+            if fila.codigo_dtc is not None:
+                actual["errores"].append({
+                    "codigo_dtc": fila.codigo_dtc,
+                    "primera_deteccion": valor_exportable(fila.primera_deteccion),
+                    "ultima_deteccion": valor_exportable(fila.ultima_deteccion),
+                    "ocurrencias": fila.ocurrencias,
+                })
+        if lineas:
+            yield "\n".join(lineas) + "\n"
+    if actual is not None:
+        yield json.dumps(actual, ensure_ascii=False) + "\n"
+
+FORMATOS_EXPORTACION = {
+    "csv": (exportar_csv, "text/csv; charset=utf-8"),
+    "ndjson": (exportar_ndjson, "application/x-ndjson"),
+}
+
+@app.get("/exportar")
+async def exportar(
+    formato: str = "csv",
+    usuario: UsuarioAutenticado = Depends(obtener_usuario_desde_token),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Exporta todos los vehículos del usuario con sus errores en CSV o NDJSON.
+
+    La respuesta se envía en streaming a medida que se leen las filas con un cursor de servidor,
+    por lo que el primer byte llega de inmediato y la memoria no crece con el número de filas.
+
+    Args:
+        formato (str): ``csv`` (una fila por vehículo y error) o ``ndjson`` (una línea por vehículo).
+        usuario (UsuarioAutenticado): Usuario autenticado mediante JWT.
+        db (AsyncSession): Sesión de base de datos.
+
+    Returns:
+        StreamingResponse: Fichero descargable ``vehiculos.csv`` o ``vehiculos.ndjson``.
+
+    Raises:
+        HTTPException 400: Si el formato no es ``csv`` ni ``ndjson``.
+    """
+    if formato not in FORMATOS_EXPORTACION:
+        raise HTTPException(status_code=400, detail="El formato debe ser 'csv' o 'ndjson'.")
+
+    generador, tipo = FORMATOS_EXPORTACION[formato]
+    return StreamingResponse(
+        generador(db, usuario.id),
+        media_type=tipo,
+        headers={"Content-Disposition": f'attachment; filename="vehiculos.{formato}"'}
+    )
+
+# Telemetría: ingesta por lotes y series reducidas para gráficas
+TELEMETRIA_MAX_BYTES = int(os.getenv("TELEMETRIA_MAX_BYTES", 20 * 1024 * 1024))
+TELEMETRIA_MAX_MUESTRAS = int(os.getenv("TELEMETRIA_MAX_MUESTRAS", 200000))
+TELEMETRIA_LOTE_INSERCION = int(os.getenv("TELEMETRIA_LOTE_INSERCION", 5000))
+TELEMETRIA_PUNTOS_DEFECTO = 500
+TELEMETRIA_PUNTOS_MAX = 5000
+TELEMETRIA_LTTB_MAX_MUESTRAS = int(os.getenv("TELEMETRIA_LTTB_MAX_MUESTRAS", 200000))
+
+# Formato columnar de los lotes (little-endian):
+#   cabecera: "TLC1" | u16 longitud del VIN | VIN (UTF-8) | u16 número de series
+#   por serie: PID (4 bytes ASCII) | u32 n | i64 ts inicial (ms) | f64 escala
+#              | i32[n] deltas de ts (ms) | i32[n] deltas del valor cuantizado (valor = acumulado * escala)
+TELEMETRIA_COLUMNAR_TIPO = "application/vnd.taller.telemetria"
+TELEMETRIA_COLUMNAR_MAGIA = b"TLC1"
+TELEMETRIA_COLUMNAR_SERIE = struct.Struct("<4sIqd")
+
+def descomprimir_cuerpo(cuerpo: bytes, codificacion: Optional[str], limite: int) -> bytes:
+    """
+    Descomprime un cuerpo ``gzip``/``deflate``/``zstd`` sin superar `limite` bytes (protege frente a bombas de compresión).
+
+    Raises:
+        HTTPException 400: Si la codificación no se admite o los datos están corruptos.
+        HTTPException 413: Si el cuerpo descomprimido supera `limite`.
+    """
+    codificacion = (codificacion or "identity").strip().lower()
+    if codificacion == "identity":
+        datos = cuerpo
+    elif codificacion == "zstd" and zstandard is not None:
+        try:
+            with zstandard.ZstdDecompressor().stream_reader(io.BytesIO(cuerpo)) as lector:
+                datos = lector.read(limite + 1)
+        except zstandard.ZstdError:
+            raise HTTPException(status_code=400, detail="El cuerpo comprimido no es válido.")
+    elif codificacion in ("gzip", "deflate"):
+        descompresor = zlib.decompressobj(zlib.MAX_WBITS | (16 if codificacion == "gzip" else 0))
+        try:
+            datos = descompresor.decompress(cuerpo, limite + 1)
+        except zlib.error:
+            raise HTTPException(status_code=400, detail="El cuerpo comprimido no es válido.")
+    else:
+        raise HTTPException(status_code=400, detail=f"Content-Encoding no admitido: {codificacion}.")
+    if len(datos) > limite:
+        raise HTTPException(status_code=413, detail=f"El lote supera el máximo de {limite} bytes.")
+    return datos
+
+def codificar_telemetria_columnar(vin: str, muestras: list, escala: float = 0.01) -> bytes:
+    """
+    Codifica muestras ``[ts, pid, valor]`` (``ts`` en segundos) en el formato columnar sin comprimir.
+
+    Es la implementación de referencia del formato (la del cliente OBD usa solo la biblioteca estándar).
+    Los valores se cuantizan a múltiplos de `escala`.
+    """
+    por_pid = {}
+    for ts, pid, valor in muestras:
+        por_pid.setdefault(pid.upper(), []).append((round(ts * 1000), round(valor / escala)))
+
+    vin_bytes = vin.encode()
+    partes = [TELEMETRIA_COLUMNAR_MAGIA, struct.pack("<H", len(vin_bytes)), vin_bytes, struct.pack("<H", len(por_pid))]
+    for pid, puntos in por_pid.items():
+        columnas = np.array(puntos, dtype=np.int64).reshape(-1, 2)
+        deltas = np.diff(columnas, axis=0, prepend=[[columnas[0, 0], 0]]).astype("<i4")
+        partes.append(TELEMETRIA_COLUMNAR_SERIE.pack(pid.encode("ascii").ljust(4), len(puntos), int(columnas[0, 0]), escala))
+        partes.append(deltas[:, 0].tobytes())
+        partes.append(deltas[:, 1].tobytes())
+    return b"".join(partes)
+
+def decodificar_telemetria_columnar(datos: bytes) -> tuple[str, dict]:
+    """
+    Decodifica un lote en formato columnar con NumPy, sin crear un objeto Python por muestra.
+
+    Returns:
+        tuple[str, dict]: VIN y, por PID, los arrays ``(ts en ms, valor)``. Si un PID aparece en varias
+        series, sus muestras se concatenan en el orden del lote.
+
+    Raises:
+        HTTPException 400: Si el lote está truncado, tiene datos sobrantes o valores no válidos.
+        HTTPException 413: Si el lote supera `TELEMETRIA_MAX_MUESTRAS`.
+    """
+    try:
+        if datos[:4] != TELEMETRIA_COLUMNAR_MAGIA:
+            raise ValueError("cabecera desconocida")
+        (longitud_vin,) = struct.unpack_from("<H", datos, 4)
+        vin = datos[6:6 + longitud_vin].decode()
+        (num_series,) = struct.unpack_from("<H", datos, 6 + longitud_vin)
+        posicion = 8 + longitud_vin
+
+        series, total = {}, 0
+        for _ in range(num_series):
+            pid, n, ts_inicial, escala = TELEMETRIA_COLUMNAR_SERIE.unpack_from(datos, posicion)
+            posicion += TELEMETRIA_COLUMNAR_SERIE.size
+            total += n
+            if total > TELEMETRIA_MAX_MUESTRAS:
+                raise HTTPException(status_code=413, detail=f"El lote no puede superar {TELEMETRIA_MAX_MUESTRAS} muestras.")
+            if not (math.isfinite(escala) and escala > 0):
+                raise ValueError(f"escala no válida: {escala}")
+            deltas_ts = np.frombuffer(datos, dtype="<i4", count=n, offset=posicion)
+            deltas_valor = np.frombuffer(datos, dtype="<i4", count=n, offset=posicion + 4 * n)
+            posicion += 8 * n
+            pid = pid.decode("ascii").strip().upper()
+            if not pid:
+                raise ValueError("PID vacío")
+            ts, valores = ts_inicial + np.cumsum(deltas_ts, dtype=np.int64), np.cumsum(deltas_valor, dtype=np.int64) / (1 / escala)
+            if pid in series:
+                # Un PID repetido (p. ej. una grabación partida en varios tramos) se añade a su serie
+                ts, valores = np.concatenate((series[pid][0], ts)), np.concatenate((series[pid][1], valores))
+            series[pid] = (ts, valores)
+        if posicion != len(datos):
+            raise ValueError("datos sobrantes tras la última serie")
+    except (struct.error, ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=f"Lote de telemetría no válido: {e}")
+    return vin, series
+
+def filas_telemetria_columnar(vehiculo_id: int, series: dict) -> list[dict]:
+    """
+    Convierte las columnas decodificadas en filas para la inserción en bloque.
+    """
+    filas = []
+    for pid, (ts, valores) in series.items():
+        filas.extend(
+            {"vehiculo_id": vehiculo_id, "pid": pid, "ts": t, "valor": v}
+            for t, v in zip(ts.tolist(), valores.tolist())
+        )
+    return filas
+
+def insertar_telemetria(db: Session, filas: list[dict]):
+    """
+    Inserta muestras de telemetría en bloques de `TELEMETRIA_LOTE_INSERCION`, ignorando las que ya existen.
+
+    Se usa ``INSERT IGNORE`` (MySQL) u ``ON CONFLICT DO NOTHING`` (SQLite/PostgreSQL), de modo que
+    reenviar un lote tras un fallo de red es idempotente.
+
+    Args:
+        db (Session): Sesión activa (no hace commit).
+        filas (list[dict]): Filas con ``vehiculo_id``, ``pid``, ``ts`` y ``valor``.
+    """
+    tabla = Telemetria.__table__
+    dialecto = db.get_bind().dialect.name
+    if dialecto == "mysql":
+        sentencia = insert(tabla).prefix_with("IGNORE")
+    elif dialecto in ("sqlite", "postgresql"):
+        sentencia = (sqlite if dialecto == "sqlite" else postgresql).insert(tabla).on_conflict_do_nothing()
+    else:
+        sentencia = insert(tabla)
+    for inicio in range(0, len(filas), TELEMETRIA_LOTE_INSERCION):
+        db.execute(sentencia, filas[inicio:inicio + TELEMETRIA_LOTE_INSERCION])
+
+def lttb(puntos: list, umbral: int) -> list:
+    """
+    Reduce una serie ``[(ts, valor), ...]`` a `umbral` puntos con Largest-Triangle-Three-Buckets.
+
+    Conserva la forma visual de la serie (picos incluidos), a diferencia de un muestreo uniforme.
+    """
+    if umbral >= len(puntos) or umbral < 3:
+        return list(puntos)
+
+    resultado = [puntos[0]]
+    ancho = (len(puntos) - 2) / (umbral - 2)
+    a = 0
+    for i in range(umbral - 2):
+        # Media del cubo siguiente: tercer vértice del triángulo
+        inicio_sig = int((i + 1) * ancho) + 1
+        fin_sig = min(int((i + 2) * ancho) + 1, len(puntos))
+        siguiente = puntos[inicio_sig:fin_sig] or [puntos[-1]]
+        media_x = sum(p[0] for p in siguiente) / len(siguiente)
+        media_y = sum(p[1] for p in siguiente) / len(siguiente)
+
+        ax, ay = puntos[a]
+        mejor, area_max = None, -1.0
+        for j in range(int(i * ancho) + 1, int((i + 1) * ancho) + 1):
+            x, y = puntos[j]
+            area = abs((ax - media_x) * (y - ay) - (ax - x) * (media_y - ay))
+            if area > area_max:
+                area_max, mejor = area, j
+        resultado.append(puntos[mejor])
+        a = mejor
+    resultado.append(puntos[-1])
+    return resultado
+
+async def vehiculo_del_usuario(db: AsyncSession, usuario_id: int, vehiculo_id: Optional[int] = None, vin: Optional[str] = None) -> int:
+    """
+    Devuelve el ID de un vehículo del usuario identificado por ID o por VIN.
+
+    Raises:
+        HTTPException 400: Si no se indica ni ``vehiculo_id`` ni ``vin``, o el VIN es de ejemplo.
+        HTTPException 404: Si el vehículo no existe o pertenece a otro usuario.
+    """
+    if vehiculo_id is None and not vin:
+        raise HTTPException(status_code=400, detail="Debe indicar 'vehiculo_id' o 'vin'.")
+    if vehiculo_id is None and es_vin_de_ejemplo(vin):
+        raise HTTPException(status_code=400, detail="El VIN es un valor de ejemplo: no se pudo leer el VIN real del vehículo.")
+    condicion = Vehiculo.id == vehiculo_id if vehiculo_id is not None else Vehiculo.vin == vin.strip()
+    encontrado = await db.scalar(select(Vehiculo.id).where(condicion, Vehiculo.usuario_id == usuario_id))
+    if encontrado is None:
+        raise HTTPException(status_code=404, detail="No se encontró el vehículo para el usuario autenticado.")
+    return encontrado
+
+@app.post("/telemetria/lote")
+async def guardar_telemetria(request: Request, usuario: UsuarioAutenticado = Depends(obtener_usuario_desde_token), db: AsyncSession = Depends(get_db)):
+    """
+    Guarda un lote de muestras de telemetría enviado por el cliente OBD.
+
+    El cuerpo es un `TelemetriaLote` en JSON o, con ``Content-Type: application/vnd.taller.telemetria``,
+    el formato columnar binario (decodificado con NumPy), opcionalmente comprimido
+    (``Content-Encoding: gzip``, ``deflate`` o ``zstd``). Las muestras se insertan en bloque; las repetidas (mismo vehículo, PID e instante)
+    se ignoran, por lo que el cliente puede reintentar un lote sin duplicar datos.
+
+    Args:
+        request (Request): Petición con el lote.
+        usuario (UsuarioAutenticado): Usuario autenticado mediante JWT.
+        db (AsyncSession): Sesión de base de datos.
+
+    Returns:
+        dict: ID del vehículo y número de muestras recibidas.
+
+    Raises:
+        HTTPException 400: Si el cuerpo no es válido o contiene PIDs o valores no válidos.
+        HTTPException 404: Si el vehículo no pertenece al usuario.
+        HTTPException 413: Si el lote supera `TELEMETRIA_MAX_BYTES` o `TELEMETRIA_MAX_MUESTRAS`.
+    """
+    cuerpo = await request.body()
+    datos = await run_in_threadpool(descomprimir_cuerpo, cuerpo, request.headers.get("content-encoding"), TELEMETRIA_MAX_BYTES)
+
+    if request.headers.get("content-type", "").split(";")[0].strip() == TELEMETRIA_COLUMNAR_TIPO:
+        vin, series = await run_in_threadpool(decodificar_telemetria_columnar, datos)
+        vehiculo_id = await vehiculo_del_usuario(db, usuario.id, vin=vin)
+        filas = await run_in_threadpool(filas_telemetria_columnar, vehiculo_id, series)
+    else:
+        try:
+            lote = TelemetriaLote.model_validate_json(datos)
+        except ValidationError as e:
+            raise HTTPException(status_code=400, detail=f"Lote de telemetría no válido: {e.errors()[0]['msg']}")
+        if len(lote.muestras) > TELEMETRIA_MAX_MUESTRAS:
+            raise HTTPException(status_code=413, detail=f"El lote no puede superar {TELEMETRIA_MAX_MUESTRAS} muestras.")
+
+        vehiculo_id = await vehiculo_del_usuario(db, usuario.id, lote.vehiculo_id, lote.vin)
+
+        filas = []
+        for ts, pid, valor in lote.muestras:
+            pid = pid.strip().upper()
+            if not (1 <= len(pid) <= 4) or not math.isfinite(valor) or not math.isfinite(ts):
+                raise HTTPException(status_code=400, detail=f"Muestra no válida: {[ts, pid, valor]}.")
+            filas.append({"vehiculo_id": vehiculo_id, "pid": pid, "ts": round(ts * 1000), "valor": valor})
+
+    try:
+        await db.run_sync(insertar_telemetria, filas)
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"Error al guardar la telemetría: {str(e)}")
+
+    return {"vehiculo_id": vehiculo_id, "muestras": len(filas)}
+
+@app.get("/telemetria/{vehiculo_id}")
+async def consultar_telemetria(
+    vehiculo_id: int,
+    pid: str,
+    desde: Optional[float] = None,
+    hasta: Optional[float] = None,
+    puntos: int = Query(TELEMETRIA_PUNTOS_DEFECTO, ge=3, le=TELEMETRIA_PUNTOS_MAX),
+    metodo: str = "agregado",
+    usuario: UsuarioAutenticado = Depends(obtener_usuario_desde_token),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Devuelve series de telemetría reducidas en el servidor para poder graficarlas.
+
+    - ``agregado``: divide el rango en ``puntos`` cubos de igual duración y devuelve ``min``, ``max``,
+      ``avg`` y ``n`` de cada uno, calculados con ``GROUP BY`` en la base de datos.
+    - ``lttb``: devuelve como máximo ``puntos`` muestras reales elegidas con LTTB, que conserva la
+      forma de la curva. LTTB necesita la serie completa en memoria, así que solo se admite si el
+      rango tiene como mucho `TELEMETRIA_LTTB_MAX_MUESTRAS` muestras por PID (se cuentan en la misma
+      consulta que obtiene sus límites).
+
+    Args:
+        vehiculo_id (int): ID del vehículo.
+        pid (str): PID o lista de PIDs separados por comas (p. ej. ``0C,0D``).
+        desde (Optional[float]): Inicio del rango en segundos desde epoch (por defecto, la primera muestra).
+        hasta (Optional[float]): Fin del rango en segundos desde epoch (por defecto, la última muestra).
+        puntos (int): Número máximo de puntos por serie.
+        metodo (str): ``agregado`` o ``lttb``.
+        usuario (UsuarioAutenticado): Usuario autenticado mediante JWT.
+        db (AsyncSession): Sesión de base de datos.
+
+    Returns:
+        dict: Una serie por PID. En ``agregado`` cada punto es ``{ts, min, max, avg, n}``;
+        en ``lttb`` es ``[ts, valor]`` (``ts`` en segundos).
+
+    Raises:
+        HTTPException 400: Si el método no es válido, ``desde`` es posterior a ``hasta`` o el rango
+            supera `TELEMETRIA_LTTB_MAX_MUESTRAS` con ``lttb``.
+        HTTPException 404: Si el vehículo no pertenece al usuario.
+    """
+    if metodo not in ("agregado", "lttb"):
+        raise HTTPException(status_code=400, detail="El método debe ser 'agregado' o 'lttb'.")
+    if desde is not None and hasta is not None and desde > hasta:
+        raise HTTPException(status_code=400, detail="'desde' no puede ser posterior a 'hasta'.")
+    await vehiculo_del_usuario(db, usuario.id, vehiculo_id)
+    pids = [p.strip().upper() for p in pid.split(",") if p.strip()]
+
+    series = {}
+    for p in pids:
+        condiciones = [Telemetria.vehiculo_id == vehiculo_id, Telemetria.pid == p]
+        if desde is not None:
+            condiciones.append(Telemetria.ts >= round(desde * 1000))
+        if hasta is not None:
+            condiciones.append(Telemetria.ts <= round(hasta * 1000))
+
+        inicio, fin, total = (await db.execute(
+            select(func.min(Telemetria.ts), func.max(Telemetria.ts), func.count()).where(*condiciones)
+        )).one()
+        if inicio is None:
+            series[p] = []
+            continue
+        if metodo == "lttb" and total > TELEMETRIA_LTTB_MAX_MUESTRAS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"El rango tiene {total} muestras del PID {p} y 'lttb' admite como máximo "
+                       f"{TELEMETRIA_LTTB_MAX_MUESTRAS}: reduzca el rango o use el método 'agregado'."
+            )
+
+        if metodo == "agregado":
+            ancho = max((fin - inicio) // puntos + 1, 1)
+            cubo = ((Telemetria.ts - inicio) // ancho).label("cubo")
+            filas = await db.execute(
+                select(cubo, func.min(Telemetria.valor), func.max(Telemetria.valor), func.avg(Telemetria.valor), func.count())
+                .where(*condiciones).group_by(cubo).order_by(cubo)
+            )
+            series[p] = [
+                {"ts": (inicio + c * ancho) / 1000, "min": minimo, "max": maximo, "avg": float(media), "n": n}
+                for c, minimo, maximo, media, n in filas
+            ]
+        else:
+            resultado = await db.stream(
+                select(Telemetria.ts, Telemetria.valor).where(*condiciones).order_by(Telemetria.ts)
+                .execution_options(yield_per=TELEMETRIA_LOTE_INSERCION)
+            )
+            muestras = [(ts / 1000, valor) async for ts, valor in resultado]
+            series[p] = [list(punto) for punto in await run_in_threadpool(lttb, muestras, puntos)]
+
+    return {"vehiculo_id": vehiculo_id, "metodo": metodo, "series": series}
+
+# Importación masiva de vehículos desde CSV
+IMPORTACION_LOTE = int(os.getenv("IMPORTACION_LOTE", 500))
+IMPORTACION_MAX_BYTES = int(os.getenv("IMPORTACION_MAX_BYTES", 50 * 1024 * 1024))
+IMPORTACION_DIR = Path(os.getenv("IMPORTACION_DIR", Path(tempfile.gettempdir()) / "taller-importaciones"))
+COLUMNAS_IMPORTACION = ("marca", "modelo", "year", "vin")
+IMPORTACION_ERRORES_DEFECTO = 100
+
+def fila_a_vehiculo(fila: dict) -> tuple[VehiculoRegistro, list[str]]:
+    """
+    Convierte una fila del CSV en un `VehiculoRegistro` y su lista de códigos DTC.
+
+    Columnas obligatorias: ``marca``, ``modelo``, ``year`` y ``vin``. Opcionales: ``rpm`` y
+    ``velocidad`` (0 por defecto), ``revision`` (objeto JSON) y ``codigos_dtc`` (separados por
+    ``;`` o espacios).
+
+    Raises:
+        ValidationError: Si algún campo no tiene el tipo esperado.
+        ValueError: Si la revisión no es JSON válido.
+        HTTPException 400: Si los datos no superan las validaciones de vehículo o de códigos.
+    """
+    revision = (fila.get("revision") or "").strip()
+    datos = VehiculoRegistro(
+        marca=fila.get("marca") or "",
+        modelo=fila.get("modelo") or "",
+        year=fila.get("year") or 0,
+        rpm=fila.get("rpm") or 0,
+        velocidad=fila.get("velocidad") or 0,
+        vin=(fila.get("vin") or "").strip(),
+        revision=json.loads(revision) if revision else {}
+    )
+    validar_datos_vehiculo(datos)
+    codigos = (fila.get("codigos_dtc") or "").replace(";", " ").split()
+    return datos, limpiar_codigos_dtc(codigos) if codigos else []
+
+def guardar_archivo_importacion(origen, destino: Path):
+    """
+    Copia el archivo subido al directorio de importaciones y comprueba su tamaño y su cabecera.
+
+    Raises:
+        HTTPException 400: Si no es un CSV con las columnas obligatorias.
+        HTTPException 413: Si supera `IMPORTACION_MAX_BYTES`.
+    """
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    copiados = 0
+    try:
+        with open(destino, "wb") as salida:
+            while bloque := origen.read(1024 * 1024):
+                copiados += len(bloque)
+                if copiados > IMPORTACION_MAX_BYTES:
+                    raise HTTPException(status_code=413, detail=f"El archivo supera el máximo de {IMPORTACION_MAX_BYTES} bytes.")
+                salida.write(bloque)
+
+        try:
+            with open(destino, newline="", encoding="utf-8-sig") as archivo:
+                cabecera = next(csv.reader(archivo), [])
+        except UnicodeDecodeError:
+            raise HTTPException(status_code=400, detail="El archivo debe ser un CSV codificado en UTF-8.")
+        faltan = [c for c in COLUMNAS_IMPORTACION if c not in {col.strip() for col in cabecera}]
+        if faltan:
+            raise HTTPException(status_code=400, detail=f"Faltan columnas obligatorias en el CSV: {', '.join(faltan)}.")
+    except Exception:
+        destino.unlink(missing_ok=True)
+        raise
+
+class ImportadorCsv:
+    """
+    Procesa en segundo plano los CSV subidos a ``/importar``.
+
+    El archivo se lee por bloques de `lote` filas. En cada bloque las filas se validan igual que en
+    ``/guardar-vehiculo/``, los VIN se comprueban contra el conjunto de VIN ya leídos del archivo y
+    contra los VIN existentes del bloque (cargados con una sola consulta), y los vehículos, revisiones
+    y códigos DTC se insertan con ``executemany``. Cada bloque se confirma por separado, de modo que
+    el progreso puede consultarse mientras el trabajo avanza.
+
+    Atributos:
+        fabrica_sesiones (sessionmaker): Generador de sesiones síncronas.
+        lote (int): Filas por bloque.
+    """
+    def __init__(self, fabrica_sesiones, lote: int = IMPORTACION_LOTE):
+        self.fabrica_sesiones = fabrica_sesiones
+        self.lote = lote
+
+    def procesar(self, importacion_id: str, ruta: Path):
+        """
+        Procesa el archivo completo y marca el trabajo como ``completada`` o ``fallida``.
+        """
+        try:
+            with self.fabrica_sesiones() as db:
+                importacion = db.get(Importacion, importacion_id)
+                importacion.estado = "procesando"
+                db.commit()
+
+                vistos = set()
+                with open(ruta, newline="", encoding="utf-8-sig") as archivo:
+                    lector = csv.DictReader(archivo, skipinitialspace=True)
+                    bloque = []
+                    for fila in lector:
+                        bloque.append((lector.line_num, fila))
+                        if len(bloque) >= self.lote:
+                            self._procesar_bloque(db, importacion, bloque, vistos)
+                            bloque = []
+                    if bloque:
+                        self._procesar_bloque(db, importacion, bloque, vistos)
+
+                importacion.estado = "completada"
+                importacion.terminado_en = datetime.utcnow()
+                db.commit()
+        except Exception as e:
+            with self.fabrica_sesiones() as db:
+                db.execute(
+                    update(Importacion).where(Importacion.id == importacion_id)
+                    .values(estado="fallida", error=str(e)[:500], terminado_en=datetime.utcnow())
+                )
+                db.commit()
+        finally:
+            ruta.unlink(missing_ok=True)
+
+    def _procesar_bloque(self, db: Session, importacion: Importacion, bloque: list, vistos: set):
+        """
+        Valida e inserta un bloque de filas y actualiza el progreso del trabajo en la misma transacción.
+        """
+        errores, validos = [], []
+        for numero, fila in bloque:
+            vin = (fila.get("vin") or "").strip()
+            try:
+                datos, codigos = fila_a_vehiculo(fila)
+            except ValidationError as e:
+                detalle = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+            except ValueError:
+                detalle = "El campo 'revision' debe ser un objeto JSON."
+            except HTTPException as e:
+                detalle = e.detail
+            else:
+                detalle = "VIN duplicado dentro del archivo." if vin in vistos else None
+            if detalle:
+                errores.append({"importacion_id": importacion.id, "fila": numero, "vin": vin[:64], "detalle": detalle[:500]})
+                continue
+            vistos.add(vin)
+            validos.append((numero, datos, codigos))
+
+        existentes = set(db.scalars(select(Vehiculo.vin).where(Vehiculo.vin.in_([d.vin for _, d, _ in validos])))) if validos else set()
+        nuevos = []
+        for numero, datos, codigos in validos:
+            if datos.vin in existentes:
+                errores.append({"importacion_id": importacion.id, "fila": numero, "vin": datos.vin, "detalle": "El número de VIN ya está registrado."})
+            else:
+                nuevos.append((datos, codigos))
+
+        if nuevos:
+            db.execute(insert(Vehiculo), [{
+                "marca": d.marca.strip(), "modelo": d.modelo.strip(), "year": d.year, "rpm": d.rpm,
+                "velocidad": d.velocidad, "vin": d.vin, "revision": d.revision, "usuario_id": importacion.usuario_id,
+            } for d, _ in nuevos])
+            ids = dict(db.execute(select(Vehiculo.vin, Vehiculo.id).where(Vehiculo.vin.in_([d.vin for d, _ in nuevos]))).all())
+            items = [{"vehiculo_id": ids[d.vin], **item} for d, _ in nuevos for item in items_de_revision(d.revision)]
+            if items:
+                db.execute(insert(RevisionItem), items)
+            insertar_errores(db, [{"vehiculo_id": ids[d.vin], "codigo_dtc": c} for d, codigos in nuevos for c in codigos])
+        if errores:
+            db.execute(insert(ErrorImportacion), errores)
+
+        importacion.filas_procesadas += len(bloque)
+        importacion.filas_importadas += len(nuevos)
+        importacion.filas_con_error += len(errores)
+        db.commit()
+
+importador = ImportadorCsv(SessionLocal)
+
+@app.post("/importar", status_code=202)
+async def importar(
+    background_tasks: BackgroundTasks,
+    archivo: UploadFile = File(...),
+    usuario: UsuarioAutenticado = Depends(obtener_usuario_desde_token),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Recibe un CSV con el histórico de vehículos y lo importa en segundo plano.
+
+    El archivo se guarda en `IMPORTACION_DIR` y lo procesa `ImportadorCsv` por bloques tras enviar
+    la respuesta. El progreso y los errores por fila se consultan en ``/importar/{importacion_id}``.
+
+    Args:
+        archivo (UploadFile): CSV con las columnas ``marca``, ``modelo``, ``year``, ``vin`` y, opcionalmente,
+            ``rpm``, ``velocidad``, ``revision`` (JSON) y ``codigos_dtc`` (separados por ``;``).
+        usuario (UsuarioAutenticado): Usuario autenticado mediante JWT.
+        db (AsyncSession): Sesión de base de datos.
+
+    Returns:
+        dict: ID del trabajo y su estado inicial (``pendiente``).
+
+    Raises:
+        HTTPException 400: Si el archivo no es un CSV válido o le faltan columnas obligatorias.
+        HTTPException 413: Si supera `IMPORTACION_MAX_BYTES`.
+    """
+    importacion_id = str(uuid.uuid4())
+    ruta = IMPORTACION_DIR / f"{importacion_id}.csv"
+    await run_in_threadpool(guardar_archivo_importacion, archivo.file, ruta)
+
+    db.add(Importacion(id=importacion_id, usuario_id=usuario.id, nombre_archivo=archivo.filename))
+    try:
+        await db.commit()
+    except Exception as e:
+        ruta.unlink(missing_ok=True)
+        raise HTTPException(status_code=500, detail=f"No se pudo registrar la importación: {str(e)}")
+
+    background_tasks.add_task(importador.procesar, importacion_id, ruta)
+    return {"id": importacion_id, "estado": "pendiente"}
+
+@app.get("/importar/{importacion_id}")
+async def estado_importacion(
+    importacion_id: str,
+    limite_errores: int = Query(IMPORTACION_ERRORES_DEFECTO, ge=0, le=1000),
+    usuario: UsuarioAutenticado = Depends(obtener_usuario_desde_token),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Devuelve el progreso de una importación y el informe de errores por fila.
+
+    Args:
+        importacion_id (str): ID devuelto por ``/importar``.
+        limite_errores (int): Número máximo de errores incluidos en la respuesta (en orden de fila).
+        usuario (UsuarioAutenticado): Usuario autenticado mediante JWT.
+        db (AsyncSession): Sesión de base de datos.
+
+    Returns:
+        dict: Estado, contadores de filas y lista de errores (``fila``, ``vin``, ``detalle``).
+
+    Raises:
+        HTTPException 404: Si la importación no existe o pertenece a otro usuario.
+    """
+    importacion = await db.scalar(
+        select(Importacion).where(Importacion.id == importacion_id, Importacion.usuario_id == usuario.id)
+    )
+    if importacion is None:
+        raise HTTPException(status_code=404, detail="No se encontró la importación.")
+
+    errores = await db.execute(
+        select(ErrorImportacion.fila, ErrorImportacion.vin, ErrorImportacion.detalle)
+        .where(ErrorImportacion.importacion_id == importacion_id)
+        .order_by(ErrorImportacion.fila)
+        .limit(limite_errores)
+    )
+    return {
+        "id": importacion.id,
+        "archivo": importacion.nombre_archivo,
+        "estado": importacion.estado,
+        "filas_procesadas": importacion.filas_procesadas,
+        "filas_importadas": importacion.filas_importadas,
+        "filas_con_error": importacion.filas_con_error,
+        "error": importacion.error,
+        "creado_en": importacion.creado_en.isoformat() if importacion.creado_en else None,
+        "terminado_en": importacion.terminado_en.isoformat() if importacion.terminado_en else None,
+        "errores": [dict(fila._mapping) for fila in errores],
+    }
+
+# Endpoint para buscar vehículos por los elementos marcados en su revisión
+@app.get("/revisiones/buscar")
+async def buscar_revisiones(
+    parte: str,
+    detalle: Optional[str] = None,
+    limite: int = Query(LIMITE_VEHICULOS_DEFECTO, ge=1, le=LIMITE_VEHICULOS_MAX),
+    cursor: Optional[str] = None,
+    usuario: UsuarioAutenticado = Depends(obtener_usuario_desde_token),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Devuelve los vehículos del usuario cuya revisión tiene marcada una parte (y, opcionalmente, un detalle).
+
+    La búsqueda usa el índice ``(parte, detalle, vehiculo_id)`` de `revision_items`, por lo que no
+    recorre ni parsea las revisiones de toda la flota. Se pagina por cursor igual que ``/mis-vehiculos/``.
+
+    Args:
+        parte (str): Parte revisada (p. ej. ``frenos``).
+        detalle (Optional[str]): Detalle concreto dentro de la parte (p. ej. ``pastillas``).
+        limite (int): Número máximo de vehículos por página.
+        cursor (Optional[str]): Cursor devuelto en ``siguiente_cursor`` por la página anterior.
+        usuario (UsuarioAutenticado): Usuario autenticado mediante JWT.
+        db (AsyncSession): Sesión de base de datos.
+
+    Returns:
+        dict: Vehículos (``id``, ``marca``, ``modelo``, ``vin``) con los detalles coincidentes y ``siguiente_cursor``.
+
+    Raises:
+        HTTPException 400: Si la parte está vacía o el cursor no es válido.
+    """
+    if not parte.strip():
+        raise HTTPException(status_code=400, detail="Debe indicar la parte de la revisión.")
+
+    coincidencias = select(RevisionItem.vehiculo_id).where(RevisionItem.parte == parte.strip())
+    if detalle:
+        coincidencias = coincidencias.where(RevisionItem.detalle == detalle.strip())
+
+    consulta = (
+        select(Vehiculo.id, Vehiculo.marca, Vehiculo.modelo, Vehiculo.vin)
+        .where(Vehiculo.usuario_id == usuario.id, Vehiculo.id.in_(coincidencias))
+    )
+    if cursor:
+        consulta = consulta.where(Vehiculo.id > decodificar_cursor(cursor))
+    filas = (await db.execute(consulta.order_by(Vehiculo.id).limit(limite + 1))).all()
+
+    hay_mas = len(filas) > limite
+    vehiculos = [dict(fila._mapping) for fila in filas[:limite]]
+
+    if vehiculos:
+        detalles = await db.execute(
+            select(RevisionItem.vehiculo_id, RevisionItem.detalle)
+            .where(RevisionItem.parte == parte.strip(), RevisionItem.vehiculo_id.in_([v["id"] for v in vehiculos]))
+            .order_by(RevisionItem.id)
+        )
+        por_vehiculo = {}
+        for vehiculo_id, valor in detalles:
+            por_vehiculo.setdefault(vehiculo_id, []).append(valor)
+        for vehiculo in vehiculos:
+            vehiculo["detalles"] = por_vehiculo.get(vehiculo["id"], [])
+
+    return {
+        "vehiculos": vehiculos,
+        "siguiente_cursor": codificar_cursor(vehiculos[-1]["id"]) if hay_mas else None
+    }
+
 # Endpoint para obtener un vehiculo especifico del usuario autenticado
-@app.get("/mis-vehiculos/{vehiculo_id}")
-def obtener_vehiculo(vehiculo_id: int, usuario: Usuario = Depends(obtener_usuario_desde_token), db: Session = Depends(get_db)):
+@app.get("/mis-vehiculos/{vehiculo_id}", response_model=VehiculoOut)
+async def obtener_vehiculo(vehiculo_id: int, usuario: UsuarioAutenticado = Depends(obtener_usuario_desde_token), db: AsyncSession = Depends(get_db)):
     """
     Recupera la información de un vehículo específico registrado por el usuario autenticado.
 
     Args:
         vehiculo_id (int): ID del vehículo a consultar.
-        usuario (Usuario): Usuario autenticado mediante JWT.
-        db (Session): Sesión activa de la base de datos.
+        usuario (UsuarioAutenticado): Usuario autenticado mediante JWT.
+        db (AsyncSession): Sesión activa de la base de datos.
 
     Returns:
-        Vehiculo: Objeto del vehículo solicitado.
+        VehiculoOut: Datos del vehículo solicitado.
 
     Raises:
         HTTPException 404: Si el vehículo no pertenece al usuario o no existe.
     """
-    vehiculo = db.query(Vehiculo).filter(Vehiculo.id == vehiculo_id, Vehiculo.usuario_id == usuario.id).first()
-    if vehiculo is None:
+    fila = (await db.execute(
+        select(*[getattr(Vehiculo, c) for c in VehiculoOut.model_fields])
+        .where(Vehiculo.id == vehiculo_id, Vehiculo.usuario_id == usuario.id)
+    )).first()
+    if fila is None:
         raise HTTPException(status_code=404, detail="Vehículo no encontrado")
-    return vehiculo
+    return VehiculoOut.model_construct(**fila._mapping)
 
 # Endpoint para obtener los errores de un vehículo específico del usuario autenticado
-@app.get("/mis-errores/{vehiculo_id}")
-def obtener_errores(vehiculo_id: int, usuario: Usuario = Depends(obtener_usuario_desde_token), db: Session = Depends(get_db)):
+LIMITE_ERRORES_DEFECTO = 200
+LIMITE_ERRORES_MAX = 1000
+
+@app.get("/mis-errores/{vehiculo_id}", response_model=list[ErrorOut])
+async def obtener_errores(
+    vehiculo_id: int,
+    response: Response,
+    limite: int = Query(LIMITE_ERRORES_DEFECTO, ge=1, le=LIMITE_ERRORES_MAX),
+    cursor: Optional[str] = None,
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    codigo: Optional[str] = None,
+    usuario: UsuarioAutenticado = Depends(obtener_usuario_desde_token),
+    db: AsyncSession = Depends(get_db)
+):
     """
-    Devuelve todos los errores DTC (códigos OBD-II) asociados a un vehículo del usuario autenticado.
+    Devuelve los errores DTC (códigos OBD-II) asociados a un vehículo del usuario autenticado.
+
+    Una única consulta parte del vehículo filtrado por ``usuario_id`` y une sus errores con
+    ``LEFT JOIN`` recorriendo el índice ``(vehiculo_id, id)``: así se comprueba la propiedad y se
+    obtiene la página a la vez. Si hay más resultados, el cursor de la siguiente página se devuelve
+    en la cabecera ``X-Siguiente-Cursor``, manteniendo la respuesta como lista.
 
     Args:
         vehiculo_id (int): ID del vehículo para el que se desean consultar los errores.
-        usuario (Usuario): Usuario autenticado mediante JWT.
-        db (Session): Sesión activa de la base de datos.
+        limite (int): Número máximo de errores por página.
+        cursor (Optional[str]): Cursor devuelto en ``X-Siguiente-Cursor`` por la página anterior.
+        desde (Optional[datetime]): Solo códigos detectados por última vez en esta fecha o después.
+        hasta (Optional[datetime]): Solo códigos detectados por primera vez en esta fecha o antes.
+        codigo (Optional[str]): Filtra por prefijo del código DTC (p. ej. ``P03``).
+        usuario (UsuarioAutenticado): Usuario autenticado mediante JWT.
+        db (AsyncSession): Sesión activa de la base de datos.
 
     Returns:
-        List[ErrorVehiculo]: Lista de errores registrados.
+        list[ErrorOut]: Lista de errores registrados.
 
     Raises:
-        HTTPException 404: Si no existen errores para ese vehículo.
+        HTTPException 400: Si el cursor no es válido o ``desde`` es posterior a ``hasta``.
+        HTTPException 404: Si el vehículo no pertenece al usuario o no tiene errores registrados.
     """
-    errores = db.query(ErrorVehiculo).filter(ErrorVehiculo.vehiculo_id == vehiculo_id).all()
-    if not errores:
+    if desde and hasta and desde > hasta:
+        raise HTTPException(status_code=400, detail="El parámetro 'desde' no puede ser posterior a 'hasta'.")
+
+    # Los filtros van en la condición del JOIN para que el vehículo aparezca aunque no haya errores
+    condiciones = [ErrorVehiculo.vehiculo_id == Vehiculo.id]
+    if cursor:
+        condiciones.append(ErrorVehiculo.id > decodificar_cursor(cursor))
+    if desde:
+        condiciones.append(ErrorVehiculo.ultima_deteccion >= desde)
+    if hasta:
+        condiciones.append(ErrorVehiculo.primera_deteccion <= hasta)
+    if codigo:
+        condiciones.append(ErrorVehiculo.codigo_dtc.startswith(codigo.strip().upper(), autoescape=True))
+
+    filas = (await db.execute(
+        select(*[getattr(ErrorVehiculo, c) for c in ErrorOut.model_fields])
+        .select_from(Vehiculo)
+        .outerjoin(ErrorVehiculo, and_(*condiciones))
+        .where(Vehiculo.id == vehiculo_id, Vehiculo.usuario_id == usuario.id)
+        .order_by(ErrorVehiculo.id)
+        .limit(limite + 1)
+    )).all()
+    if not filas:
+        raise HTTPException(status_code=404, detail="Vehículo no encontrado")
+
+    errores = [ErrorOut.model_construct(**fila._mapping) for fila in filas[:limite] if fila.id is not None]
+    if not errores and not (cursor or desde or hasta or codigo):
         raise HTTPException(status_code=404, detail="No se encontraron errores para este vehículo.")
+    if len(filas) > limite:
+        response.headers["X-Siguiente-Cursor"] = codificar_cursor(errores[-1].id)
     return errores
 
-@app.post("/crear-informe/{vehiculo_id}")
-async def crear_informe(vehiculo_id: int, request: InformeRequest, usuario: Usuario = Depends(obtener_usuario_desde_token), db: Session = Depends(get_db)):
+# Estadísticas de códigos DTC de la flota del usuario
+ESTADISTICAS_LIMITE_DEFECTO = 20
+
+def parsear_mes(valor: Optional[str], nombre: str) -> str:
     """
-    Crea un informe de errores del vehículo y lo envía al email del cliente.
+    Valida un mes en formato ``YYYY-MM`` (por defecto, el mes actual).
 
-    Este endpoint genera un enlace único que da acceso a una vista del informe de diagnóstico del vehículo. Se envía un correo al cliente con dicho enlace.
+    Raises:
+        HTTPException 400: Si el formato no es válido.
+    """
+    if not valor:
+        return datetime.utcnow().strftime("%Y-%m")
+    try:
+        return datetime.strptime(valor, "%Y-%m").strftime("%Y-%m")
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"El parámetro '{nombre}' debe tener el formato YYYY-MM.")
+
+@app.get("/estadisticas/dtc")
+async def estadisticas_dtc(
+    desde: Optional[str] = None,
+    hasta: Optional[str] = None,
+    codigo: Optional[str] = None,
+    limite: int = Query(ESTADISTICAS_LIMITE_DEFECTO, ge=1, le=100),
+    usuario: UsuarioAutenticado = Depends(obtener_usuario_desde_token),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Devuelve la frecuencia de los códigos DTC en los vehículos del usuario, su evolución mensual
+    y el desglose por marca, modelo y año.
+
+    Se sirve desde los contadores de `estadisticas_dtc`, que se actualizan al guardar los errores,
+    por lo que el coste no depende del número de filas de `errores_vehiculos`.
 
     Args:
-        vehiculo_id (int): ID del vehículo del que se desea generar el informe.
-        request (InformeRequest): Objeto que contiene el email del cliente.
-        usuario (Usuario): Usuario autenticado mediante JWT.
-        db (Session): Sesión activa de la base de datos.
+        desde (Optional[str]): Primer mes incluido (``YYYY-MM``, por defecto el mes actual).
+        hasta (Optional[str]): Último mes incluido (``YYYY-MM``, por defecto el mes actual).
+        codigo (Optional[str]): Limita todas las cifras a un código concreto.
+        limite (int): Número de códigos del ranking (y de la tendencia).
+        usuario (UsuarioAutenticado): Usuario autenticado mediante JWT.
+        db (AsyncSession): Sesión de base de datos.
 
     Returns:
-        dict: Mensaje de éxito, token generado y enlace de acceso.
+        dict: ``codigos`` (ranking), ``tendencia`` (detecciones por mes de esos códigos),
+        ``por_marca``, ``por_modelo`` y ``por_year``.
 
     Raises:
-        HTTPException 400: Si el email no es válido.
-        HTTPException 404: Si el vehículo no pertenece al usuario.
-        HTTPException 500: Si ocurre un error al guardar el informe o enviar el correo.
+        HTTPException 400: Si los meses no son válidos o ``desde`` es posterior a ``hasta``.
     """
-    if not request.email or "@" not in request.email:
-        raise HTTPException(status_code=400, detail="Debe proporcionar un email válido para enviar el informe.")
-
-    try:
-        vehiculo = db.query(Vehiculo).filter_by(id=vehiculo_id, usuario_id=usuario.id).first()
-        if not vehiculo:
-            raise HTTPException(status_code=404, detail="No se encontró un vehículo con ese ID para el usuario autenticado.")
+    desde, hasta = parsear_mes(desde, "desde"), parsear_mes(hasta, "hasta")
+    if desde > hasta:
+        raise HTTPException(status_code=400, detail="El mes 'desde' no puede ser posterior a 'hasta'.")
+
+    condiciones = [EstadisticaDtc.usuario_id == usuario.id, EstadisticaDtc.mes >= desde, EstadisticaDtc.mes <= hasta]
+    if codigo:
+        condiciones.append(EstadisticaDtc.codigo_dtc == codigo.strip())
+    total = func.sum(EstadisticaDtc.detecciones).label("detecciones")
+
+    async def agrupar(*columnas, orden=None, filtro=(), maximo=None):
+        consulta = select(*columnas, total).where(*condiciones, *filtro).group_by(*columnas)
+        consulta = consulta.order_by(*(orden if orden is not None else (total.desc(), *columnas))).limit(maximo)
+        filas = await db.execute(consulta)
+        return [{**fila._mapping, "detecciones": int(fila.detecciones)} for fila in filas]
+
+    codigos = await agrupar(EstadisticaDtc.codigo_dtc, maximo=limite)
+    ranking = [c["codigo_dtc"] for c in codigos]
+
+    return {
+        "desde": desde,
+        "hasta": hasta,
+        "codigos": codigos,
+        "tendencia": await agrupar(
+            EstadisticaDtc.mes, EstadisticaDtc.codigo_dtc,
+            orden=(EstadisticaDtc.mes, EstadisticaDtc.codigo_dtc),
+            filtro=(EstadisticaDtc.codigo_dtc.in_(ranking),)
+        ) if ranking else [],
+        "por_marca": await agrupar(EstadisticaDtc.marca),
+        "por_modelo": await agrupar(EstadisticaDtc.marca, EstadisticaDtc.modelo),
+        "por_year": await agrupar(EstadisticaDtc.year, orden=(EstadisticaDtc.year,)),
+    }
 
-        token = str(uuid.uuid4())
-        informe = InformeCompartido(
-            token=token,
-            vehiculo_id=vehiculo.id,
-            email_cliente=request.email
-        )
-        db.add(informe)
-        db.commit()
+# Bandeja de salida de correos
+def generar_cuerpo_informe(enlace: str) -> str:
+    """
+    Genera el cuerpo HTML del correo con el enlace al informe.
 
-        enlace = f"https://taller.front.web82.es/taller-front/informe/{token}"
+    Args:
+        enlace (str): URL pública del informe.
 
-        mensaje = MessageSchema(
-        subject="Tu informe del vehículo",
-        recipients=[request.email],
-        body=f"""
+    Returns:
+        str: Cuerpo HTML del mensaje.
+    """
+    return f"""
         <html>
         <head>
           <style>
@@ -724,78 +2819,572 @@ async def crear_informe(vehiculo_id: int, request: InformeRequest, usuario: Usua
           </div>
         </body>
         </html>
-        """,
-        subtype="html"
+        """
+
+class EnviadorCorreos:
+    """
+    Tarea en segundo plano que entrega los correos de `correos_salientes`.
+
+    En cada ciclo reclama un lote de correos pendientes (de forma atómica, para que varios
+    workers no envíen el mismo correo), abre una única conexión SMTP para todo el lote y
+    registra el resultado de cada envío. Los fallos se reintentan con espera exponencial
+    (`CORREO_REINTENTO_BASE` * 2^intentos) hasta `CORREO_MAX_INTENTOS`.
+
+    Atributos:
+        fabrica_sesiones (sessionmaker): Generador de sesiones de base de datos.
+        servidor (str): Host SMTP.
+        puerto (int): Puerto SMTP.
+        remitente (str): Dirección ``From``.
+        lote (int): Correos procesados como máximo por conexión.
+    """
+    def __init__(self, fabrica_sesiones, servidor: str, puerto: int, remitente: str,
+                 usuario: Optional[str] = None, password: Optional[str] = None,
+                 use_tls: bool = False, start_tls: bool = False, validar_certificados: bool = True,
+                 lote: int = CORREO_LOTE, max_intentos: int = CORREO_MAX_INTENTOS,
+                 reintento_base: float = CORREO_REINTENTO_BASE, intervalo: float = CORREO_INTERVALO):
+        self.fabrica_sesiones = fabrica_sesiones
+        self.servidor = servidor
+        self.puerto = puerto
+        self.remitente = remitente
+        self.usuario = usuario
+        self.password = password
+        self.use_tls = use_tls
+        self.start_tls = start_tls
+        self.validar_certificados = validar_certificados
+        self.lote = lote
+        self.max_intentos = max_intentos
+        self.reintento_base = reintento_base
+        self.intervalo = intervalo
+        self._tarea = None
+        self._despertar = None
+        self._loop = None
+
+    def _reclamar_lote(self) -> list[dict]:
+        """
+        Marca como ``enviando`` un lote de correos vencidos y lo devuelve.
+
+        Los correos que quedaron en ``enviando`` tras una caída vuelven a ser reclamables
+        cuando vence su ``proximo_intento``.
+        """
+        ahora = datetime.utcnow()
+        lote = str(uuid.uuid4())
+        db = self.fabrica_sesiones()
+        try:
+            ids = [
+                fila.id for fila in db.query(CorreoSaliente.id)
+                .filter(
+                    CorreoSaliente.estado.in_(("pendiente", "enviando")),
+                    CorreoSaliente.proximo_intento <= ahora
+                )
+                .order_by(CorreoSaliente.proximo_intento)
+                .limit(self.lote)
+            ]
+            if not ids:
+                return []
+            db.query(CorreoSaliente).filter(
+                CorreoSaliente.id.in_(ids),
+                CorreoSaliente.estado.in_(("pendiente", "enviando")),
+                CorreoSaliente.proximo_intento <= ahora
+            ).update({
+                CorreoSaliente.estado: "enviando",
+                CorreoSaliente.lote: lote,
+                CorreoSaliente.proximo_intento: ahora + timedelta(minutes=5)
+            }, synchronize_session=False)
+            db.commit()
+            return [
+                {"id": c.id, "destinatario": c.destinatario, "asunto": c.asunto, "cuerpo": c.cuerpo, "intentos": c.intentos}
+                for c in db.query(CorreoSaliente).filter(CorreoSaliente.lote == lote)
+            ]
+        finally:
+            db.close()
+
+    def _registrar_resultados(self, resultados: list[tuple[dict, Optional[str]]]):
+        """
+        Guarda el resultado de cada envío: ``enviado`` o reintento/``fallido`` con el error.
+        """
+        ahora = datetime.utcnow()
+        db = self.fabrica_sesiones()
+        try:
+            for correo, error in resultados:
+                intentos = correo["intentos"] + 1
+                if error is None:
+                    valores = {"estado": "enviado", "intentos": intentos, "enviado_en": ahora, "ultimo_error": None}
+                elif intentos >= self.max_intentos:
+                    valores = {"estado": "fallido", "intentos": intentos, "ultimo_error": error[:500]}
+                else:
+                    espera = self.reintento_base * (2 ** (intentos - 1))
+                    valores = {
+                        "estado": "pendiente",
+                        "intentos": intentos,
+                        "ultimo_error": error[:500],
+                        "proximo_intento": ahora + timedelta(seconds=espera)
+                    }
+                db.query(CorreoSaliente).filter(CorreoSaliente.id == correo["id"]).update(valores, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def _construir_mensaje(self, correo: dict) -> email.message.EmailMessage:
+        mensaje = email.message.EmailMessage()
+        mensaje["From"] = self.remitente
+        mensaje["To"] = correo["destinatario"]
+        mensaje["Subject"] = correo["asunto"]
+        mensaje.set_content(correo["cuerpo"], subtype="html")
+        return mensaje
+
+    async def procesar_lote(self) -> int:
+        """
+        Envía un lote de correos pendientes reutilizando una sola conexión SMTP.
+
+        Returns:
+            int: Número de correos reclamados en este ciclo.
+        """
+        correos = await asyncio.to_thread(self._reclamar_lote)
+        if not correos:
+            return 0
+
+        resultados = []
+        smtp = aiosmtplib.SMTP(
+            hostname=self.servidor, port=self.puerto, username=self.usuario, password=self.password,
+            use_tls=self.use_tls, start_tls=self.start_tls, validate_certs=self.validar_certificados
         )
-        
-        # Enviar correo solo si el sistema está configurado
-        await fm.send_message(mensaje)
+        try:
+            await smtp.connect()
+        except Exception as e:
+            resultados = [(correo, f"No se pudo conectar al servidor SMTP: {e}") for correo in correos]
+        else:
+            try:
+                for correo in correos:
+                    try:
+                        if not smtp.is_connected:
+                            await smtp.connect()
+                        await smtp.send_message(self._construir_mensaje(correo))
+                        resultados.append((correo, None))
+                    except Exception as e:
+                        resultados.append((correo, str(e) or e.__class__.__name__))
+            finally:
+                try:
+                    await smtp.quit()
+                except Exception:
+                    pass
+
+        await asyncio.to_thread(self._registrar_resultados, resultados)
+        return len(correos)
+
+    async def _bucle(self):
+        while True:
+            try:
+                procesados = await self.procesar_lote()
+            except Exception:
+                logger.exception("Error en el envío de correos")
+                procesados = 0
+            if procesados >= self.lote:
+                continue  # Quedan más correos vencidos: siguiente lote sin esperar
+            try:
+                await asyncio.wait_for(self._despertar.wait(), timeout=self.intervalo)
+            except asyncio.TimeoutError:
+                pass
+            self._despertar.clear()
+
+    def iniciar(self):
+        """
+        Arranca la tarea de envío en el bucle de eventos actual.
+        """
+        if self._tarea is None:
+            self._loop = asyncio.get_running_loop()
+            self._despertar = asyncio.Event()
+            self._tarea = self._loop.create_task(self._bucle())
+
+    def notificar(self):
+        """
+        Despierta la tarea de envío (p. ej. tras encolar un correo nuevo).
+
+        Puede llamarse desde los hilos del threadpool en que se ejecutan los endpoints síncronos.
+        """
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._despertar.set)
+
+    async def detener(self):
+        """
+        Detiene la tarea de envío; los correos no enviados siguen en la tabla.
+        """
+        if self._tarea is not None:
+            self._tarea.cancel()
+            try:
+                await self._tarea
+            except asyncio.CancelledError:
+                pass
+            self._tarea = None
+
+enviador_correos = EnviadorCorreos(
+    SessionLocal,
+    servidor=conf.MAIL_SERVER,
+    puerto=conf.MAIL_PORT,
+    remitente=conf.MAIL_FROM,
+    usuario=conf.MAIL_USERNAME if conf.USE_CREDENTIALS else None,
+    password=conf.MAIL_PASSWORD.get_secret_value() if conf.USE_CREDENTIALS else None,
+    use_tls=conf.MAIL_SSL_TLS,
+    start_tls=conf.MAIL_STARTTLS,
+    validar_certificados=conf.VALIDATE_CERTS
+)
+
+@app.post("/crear-informe/{vehiculo_id}")
+async def crear_informe(vehiculo_id: int, request: InformeRequest, usuario: UsuarioAutenticado = Depends(obtener_usuario_desde_token), db: AsyncSession = Depends(get_db)):
+    """
+    Crea un informe de errores del vehículo y encola su envío al email del cliente.
+
+    Este endpoint genera un enlace único que da acceso a una vista del informe de diagnóstico del vehículo.
+    El informe y el correo con el enlace se guardan en la misma transacción; el envío lo realiza en segundo
+    plano `EnviadorCorreos`, por lo que la respuesta no espera al servidor SMTP. El estado de la entrega
+    puede consultarse en ``/estado-envio/{token}``.
+
+    Args:
+        vehiculo_id (int): ID del vehículo del que se desea generar el informe.
+        request (InformeRequest): Objeto que contiene el email del cliente.
+        usuario (UsuarioAutenticado): Usuario autenticado mediante JWT.
+        db (AsyncSession): Sesión activa de la base de datos.
 
-        return {"mensaje": "Informe creado y enviado al email", "token": token, "enlace": enlace}
+    Returns:
+        dict: Mensaje de éxito, token generado y enlace de acceso.
+
+    Raises:
+        HTTPException 400: Si el email no es válido.
+        HTTPException 404: Si el vehículo no pertenece al usuario.
+        HTTPException 500: Si ocurre un error al guardar el informe.
+    """
+    if not request.email or "@" not in request.email:
+        raise HTTPException(status_code=400, detail="Debe proporcionar un email válido para enviar el informe.")
+
+    try:
+        vehiculo = await db.scalar(select(Vehiculo).filter_by(id=vehiculo_id, usuario_id=usuario.id))
+        if not vehiculo:
+            raise HTTPException(status_code=404, detail="No se encontró un vehículo con ese ID para el usuario autenticado.")
+
+        token = str(uuid.uuid4())
+        enlace = f"https://taller.front.web82.es/taller-front/informe/{token}"
+
+        informe = InformeCompartido(
+            token=token,
+            vehiculo_id=vehiculo.id,
+            email_cliente=request.email
+        )
+        informe.correos.append(CorreoSaliente(
+            destinatario=request.email,
+            asunto="Tu informe del vehículo",
+            cuerpo=generar_cuerpo_informe(enlace)
+        ))
+        db.add(informe)
+        await db.commit()
+
+        enviador_correos.notificar()
+
+        return {"mensaje": "Informe creado; el email se enviará en breve", "token": token, "enlace": enlace}
 
     except HTTPException:
         raise  # Relevantar tal cual si ya se lanzó arriba
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Error al crear el informe: {str(e)}")
 
+@app.get("/estado-envio/{token}")
+async def estado_envio(token: str, usuario: UsuarioAutenticado = Depends(obtener_usuario_desde_token), db: AsyncSession = Depends(get_db)):
+    """
+    Devuelve el estado de entrega del correo de un informe del usuario autenticado.
+
+    Args:
+        token (str): Token del informe devuelto por ``/crear-informe``.
+        usuario (UsuarioAutenticado): Usuario autenticado mediante JWT.
+        db (AsyncSession): Sesión activa de la base de datos.
+
+    Returns:
+        dict: Estado (``pendiente``, ``enviando``, ``enviado`` o ``fallido``), intentos, último error y fecha de envío.
+
+    Raises:
+        HTTPException 404: Si el informe no existe o no pertenece al usuario.
+    """
+    correo = await db.scalar(
+        select(CorreoSaliente)
+        .join(InformeCompartido, InformeCompartido.id == CorreoSaliente.informe_id)
+        .join(Vehiculo, Vehiculo.id == InformeCompartido.vehiculo_id)
+        .where(InformeCompartido.token == token, Vehiculo.usuario_id == usuario.id)
+        .order_by(CorreoSaliente.id.desc())
+        .limit(1)
+    )
+    if correo is None:
+        raise HTTPException(status_code=404, detail="No se encontró un informe con el token proporcionado.")
+
+    return {
+        "estado": correo.estado,
+        "intentos": correo.intentos,
+        "ultimo_error": correo.ultimo_error,
+        "enviado_en": correo.enviado_en.isoformat() if correo.enviado_en else None
+    }
+
 # Acceso al informe generado
-@app.get("/informe/{token}")
-def ver_informe(token: str, db: Session = Depends(get_db)):
+def construir_informe(db: Session, token: str) -> Optional[dict]:
+    """
+    Carga un informe con una única consulta (informe + vehículo + errores) y lo serializa.
+
+    Args:
+        db (Session): Sesión síncrona (se ejecuta con ``run_sync``).
+        token (str): Token público del informe.
+
+    Returns:
+        Optional[dict]: Entrada para `cache_informes` (``vehiculo_id``, ``contenido``, ``etag``,
+        ``last_modified``) o ``None`` si el informe o su vehículo no existen.
+    """
+    filas = (
+        db.query(
+            InformeCompartido.creado_en,
+            Vehiculo.id, Vehiculo.marca, Vehiculo.modelo, Vehiculo.year, Vehiculo.vin,
+            Vehiculo.rpm, Vehiculo.velocidad, Vehiculo.revision, Vehiculo.actualizado_en,
+            ErrorVehiculo.codigo_dtc, ErrorVehiculo.ultima_deteccion,
+        )
+        .join(Vehiculo, Vehiculo.id == InformeCompartido.vehiculo_id)
+        .outerjoin(ErrorVehiculo, ErrorVehiculo.vehiculo_id == Vehiculo.id)
+        .filter(InformeCompartido.token == token)
+        .order_by(ErrorVehiculo.id)
+        .all()
+    )
+    if not filas:
+        return None
+
+    primera = filas[0]
+    datos = InformeOut(
+        vehiculo=InformeVehiculoOut(
+            marca=primera.marca,
+            modelo=primera.modelo,
+            year=primera.year,
+            vin=primera.vin,
+            rpm=primera.rpm,
+            velocidad=primera.velocidad,
+            revision=primera.revision
+        ),
+        errores=[f.codigo_dtc for f in filas if f.codigo_dtc is not None]
+    )
+    contenido = datos.model_dump_json().encode("utf-8")
+
+    fechas = [datetime.fromisoformat(primera.creado_en)] if primera.creado_en else []
+    fechas += [f.ultima_deteccion for f in filas if f.ultima_deteccion is not None]
+    if primera.actualizado_en is not None:
+        fechas.append(primera.actualizado_en)
+    ultima = max(fechas) if fechas else datetime.utcnow()
+
+    return {
+        "vehiculo_id": primera.id,
+        "contenido": contenido,
+        "etag": '"' + hashlib.sha1(contenido).hexdigest() + '"',
+        "last_modified": ultima.replace(microsecond=0, tzinfo=timezone.utc),
+    }
+
+def informe_no_modificado(request: Request, informe: dict) -> bool:
+    """
+    Evalúa las cabeceras condicionales ``If-None-Match`` / ``If-Modified-Since``.
+
+    ``If-None-Match`` tiene prioridad; ``If-Modified-Since`` solo se usa si no se envía.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        etags = [e.strip().removeprefix("W/") for e in if_none_match.split(",")]
+        return "*" in etags or informe["etag"] in etags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return informe["last_modified"] <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+@app.get("/informe/{token}", responses={200: {"model": InformeOut}, 304: {"description": "El informe no ha cambiado"}})
+async def ver_informe(token: str, request: Request, db: AsyncSession = Depends(get_db)):
     """
     Devuelve los datos del informe generado a partir de un token único.
 
     Este endpoint permite el acceso público a un informe de diagnóstico de vehículo mediante un enlace con token generado previamente. No requiere autenticación, pero valida que el token sea legítimo.
 
+    El informe se obtiene con una sola consulta y se guarda serializado en `cache_informes`.
+    Las respuestas incluyen ``ETag`` y ``Last-Modified``, de modo que las peticiones condicionales
+    del navegador o del proxy se responden con ``304`` sin tocar la base de datos.
+
     Args:
         token (str): Token único del informe generado.
+        request (Request): Petición entrante (cabeceras condicionales).
 
     Returns:
-        dict: Información del vehículo (marca, modelo, año, etc.) y lista de errores DTC.
+        Response: JSON con la información del vehículo (marca, modelo, año, etc.) y la lista de errores DTC, o ``304``.
 
     Raises:
         HTTPException 400: Si el token no es válido o demasiado corto.
-        HTTPException 404: Si no se encuentra el informe, el vehículo o los errores asociados.
+        HTTPException 404: Si no se encuentra el informe o el vehículo asociado.
         HTTPException 500: Si ocurre un error inesperado al procesar la solicitud.
     """
-    try:
-        if not token or len(token) < 10:
-            raise HTTPException(status_code=400, detail="El token proporcionado no es válido.")
-
-        informe = db.query(InformeCompartido).filter_by(token=token).first()
-        if not informe:
+    if not token or len(token) < 10:
+        raise HTTPException(status_code=400, detail="El token proporcionado no es válido.")
+
+    informe = cache_informes.obtener(token)
+    if informe is None:
+        try:
+            informe = await db.run_sync(construir_informe, token)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error interno al obtener el informe: {str(e)}")
+        if informe is None:
             raise HTTPException(status_code=404, detail="No se encontró un informe con el token proporcionado.")
+        cache_informes.guardar(token, informe)
 
-        vehiculo = db.query(Vehiculo).filter_by(id=informe.vehiculo_id).first()
-        if not vehiculo:
-            raise HTTPException(status_code=404, detail="El vehículo relacionado con este informe ya no existe.")
+    cabeceras = {
+        "ETag": informe["etag"],
+        "Last-Modified": format_datetime(informe["last_modified"], usegmt=True),
+        "Cache-Control": "public, no-cache",
+    }
+    if informe_no_modificado(request, informe):
+        return Response(status_code=304, headers=cabeceras)
+    return Response(content=informe["contenido"], media_type="application/json", headers=cabeceras)
 
-        errores = db.query(ErrorVehiculo).filter_by(vehiculo_id=vehiculo.id).all()
+# Caché y cliente HTTP para carimagery.com
+"""
+Consulta de imágenes de vehículos (carimagery.com):
 
-        return {
-            "vehiculo": {
-                "marca": vehiculo.marca,
-                "modelo": vehiculo.modelo,
-                "year": vehiculo.year,
-                "vin": vehiculo.vin,
-                "rpm": vehiculo.rpm,
-                "velocidad": vehiculo.velocidad,
-                "revision": vehiculo.revision
-            },
-            "errores": [e.codigo_dtc for e in errores] if errores else []
-        }
+- Se usa un único `httpx.AsyncClient` con pool de conexiones y timeout `CAR_IMAGERY_TIMEOUT`.
+- Los términos de búsqueda se normalizan (minúsculas y espacios colapsados) antes de cachearlos.
+- Primer nivel de caché en memoria (`CacheLRU`); si se define `CAR_IMAGERY_CACHE_DB`, un segundo
+  nivel en SQLite conserva las respuestas entre reinicios.
+- Las peticiones simultáneas del mismo término comparten una única llamada externa.
+"""
+CAR_IMAGERY_URL = "https://www.carimagery.com/api.asmx/GetImageUrl"
+CAR_IMAGERY_TIMEOUT = float(os.getenv("CAR_IMAGERY_TIMEOUT", 5))
+CAR_IMAGERY_CACHE_TTL = float(os.getenv("CAR_IMAGERY_CACHE_TTL", 7 * 24 * 3600))
+CAR_IMAGERY_CACHE_MAX = int(os.getenv("CAR_IMAGERY_CACHE_MAX", 2000))
+CAR_IMAGERY_CACHE_DB = os.getenv("CAR_IMAGERY_CACHE_DB")
 
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error interno al obtener el informe: {str(e)}")
+class CacheImagenes:
+    """
+    Caché de respuestas de carimagery.com en dos niveles: memoria y, opcionalmente, SQLite en disco.
+
+    Atributos:
+        memoria (CacheLRU): Primer nivel, por proceso.
+        ruta_db (Optional[str]): Fichero SQLite del segundo nivel (``None`` para desactivarlo).
+    """
+    def __init__(self, max_entradas: int, ttl: float, ruta_db: Optional[str] = None):
+        self.memoria = CacheLRU(max_entradas, ttl)
+        self.ttl = ttl
+        self.ruta_db = ruta_db
+        if ruta_db:
+            with sqlite3.connect(ruta_db) as conexion:
+                conexion.execute(
+                    "CREATE TABLE IF NOT EXISTS imagenes (termino TEXT PRIMARY KEY, respuesta TEXT NOT NULL, guardado REAL NOT NULL)"
+                )
+
+    def _leer_disco(self, termino: str) -> Optional[str]:
+        with sqlite3.connect(self.ruta_db) as conexion:
+            fila = conexion.execute(
+                "SELECT respuesta FROM imagenes WHERE termino = ? AND guardado > ?",
+                (termino, time.time() - self.ttl)
+            ).fetchone()
+        return fila[0] if fila else None
+
+    def _escribir_disco(self, termino: str, respuesta: str):
+        with sqlite3.connect(self.ruta_db) as conexion:
+            conexion.execute(
+                "INSERT OR REPLACE INTO imagenes (termino, respuesta, guardado) VALUES (?, ?, ?)",
+                (termino, respuesta, time.time())
+            )
+
+    async def obtener(self, termino: str) -> Optional[str]:
+        """
+        Busca el término en memoria y, si no está, en el nivel de disco.
+        """
+        respuesta = self.memoria.obtener(termino)
+        if respuesta is None and self.ruta_db:
+            respuesta = await asyncio.to_thread(self._leer_disco, termino)
+            if respuesta is not None:
+                self.memoria.guardar(termino, respuesta)
+        return respuesta
+
+    async def guardar(self, termino: str, respuesta: str):
+        """
+        Guarda la respuesta en ambos niveles.
+        """
+        self.memoria.guardar(termino, respuesta)
+        if self.ruta_db:
+            await asyncio.to_thread(self._escribir_disco, termino, respuesta)
+
+cache_imagenes = CacheImagenes(CAR_IMAGERY_CACHE_MAX, CAR_IMAGERY_CACHE_TTL, CAR_IMAGERY_CACHE_DB)
+_cliente_http = None
+_imagenes_en_vuelo = {}
+
+def normalizar_termino(termino: str) -> str:
+    """
+    Normaliza un término de búsqueda para usarlo como clave de caché.
+    """
+    return " ".join(termino.lower().split())
+
+def obtener_cliente_http() -> httpx.AsyncClient:
+    """
+    Devuelve el cliente HTTP compartido, creándolo en el bucle de eventos actual si hace falta.
+    """
+    global _cliente_http
+    loop = asyncio.get_running_loop()
+    if _cliente_http is None or _cliente_http[1] is not loop:
+        cliente = httpx.AsyncClient(
+            timeout=httpx.Timeout(CAR_IMAGERY_TIMEOUT),
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10)
+        )
+        _cliente_http = (cliente, loop)
+    return _cliente_http[0]
+
+async def cerrar_cliente_http():
+    """
+    Cierra el cliente HTTP compartido (al apagar la aplicación).
+    """
+    global _cliente_http
+    if _cliente_http is not None:
+        cliente, _ = _cliente_http
+        _cliente_http = None
+        await cliente.aclose()
+
+async def consultar_carimagery(termino: str) -> str:
+    """
+    Realiza la llamada externa a carimagery.com.
+
+    Raises:
+        httpx.HTTPError: Si la petición falla o supera el timeout.
+    """
+    respuesta = await obtener_cliente_http().get(CAR_IMAGERY_URL, params={"searchTerm": termino})
+    respuesta.raise_for_status()
+    return respuesta.text
+
+async def buscar_imagen(termino: str) -> str:
+    """
+    Resuelve un término desde la caché o, si no está, con una única llamada externa compartida
+    por todas las peticiones simultáneas del mismo término.
+    """
+    clave = normalizar_termino(termino)
+    respuesta = await cache_imagenes.obtener(clave)
+    if respuesta is not None:
+        return respuesta
+
+    en_vuelo = _imagenes_en_vuelo.get(clave)
+    if en_vuelo is None:
+        async def descargar():
+            try:
+                texto = await consultar_carimagery(clave)
+                await cache_imagenes.guardar(clave, texto)
+                return texto
+            finally:
+                _imagenes_en_vuelo.pop(clave, None)
+
+        en_vuelo = asyncio.ensure_future(descargar())
+        _imagenes_en_vuelo[clave] = en_vuelo
+    return await asyncio.shield(en_vuelo)
 
 @app.get("/car-imagery/")
-def get_car_image(searchTerm: str):
+async def get_car_image(searchTerm: str):
     """
     Obtiene una URL de imagen representativa de un vehículo usando el término de búsqueda proporcionado.
 
     Este endpoint consulta la API externa de carimagery.com para devolver la URL de una imagen que coincida con el término (por ejemplo, "Toyota Corolla 2020").
+    Las respuestas se cachean por término normalizado y las peticiones simultáneas del mismo término se agrupan en una sola llamada.
 
     Args:
         searchTerm (str): Término de búsqueda del vehículo (marca, modelo, año, etc.).
@@ -806,25 +3395,22 @@ def get_car_image(searchTerm: str):
     Raises:
         HTTPException 500: Si hay un error al consultar la API externa.
     """
-    url = f"https://www.carimagery.com/api.asmx/GetImageUrl?searchTerm={searchTerm}"
     try:
-        response = requests.get(url)
-        response.raise_for_status()
-        return response.text
-    except requests.RequestException as e:
+        return await buscar_imagen(searchTerm)
+    except httpx.HTTPError as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener imagen: {e}")
 
 # Endpoint para editar vehículo
 @app.put("/editar-vehiculo/{vehiculo_id}")
-def editar_vehiculo(vehiculo_id: int, datos: VehiculoEdicion, usuario: Usuario = Depends(obtener_usuario_desde_token), db: Session = Depends(get_db)):
+async def editar_vehiculo(vehiculo_id: int, datos: VehiculoEdicion, usuario: UsuarioAutenticado = Depends(obtener_usuario_desde_token), db: AsyncSession = Depends(get_db)):
     """
     Actualiza los datos de un vehículo existente del usuario autenticado.
 
     Args:
         vehiculo_id (int): ID del vehículo a modificar.
         datos_actualizados (VehiculoBase): Nuevos datos del vehículo.
-        db (Session): Sesión de base de datos.
-        usuario (Usuario): Usuario autenticado.
+        db (AsyncSession): Sesión de base de datos.
+        usuario (UsuarioAutenticado): Usuario autenticado.
 
     Returns:
         dict: Mensaje de éxito.
@@ -837,45 +3423,52 @@ def editar_vehiculo(vehiculo_id: int, datos: VehiculoEdicion, usuario: Usuario =
         if not datos.vin or len(datos.vin) != 17:
             raise HTTPException(status_code=400, detail="El VIN debe tener exactamente 17 caracteres.")
 
-        vehiculo = db.query(Vehiculo).filter(
-            Vehiculo.id == vehiculo_id,
-            Vehiculo.usuario_id == usuario.id
-        ).first()
-
-        if vehiculo is None:
+        # Comprobación de propiedad y actualización en una sola sentencia; el VIN repetido lo detecta la restricción única
+        resultado = await db.execute(
+            update(Vehiculo)
+            .where(Vehiculo.id == vehiculo_id, Vehiculo.usuario_id == usuario.id)
+            .values(
+                marca=datos.marca,
+                modelo=datos.modelo,
+                year=datos.year,
+                rpm=datos.rpm,
+                velocidad=datos.velocidad,
+                vin=datos.vin
+            )
+        )
+        if resultado.rowcount == 0:
+            await db.rollback()
             raise HTTPException(status_code=404, detail="No se encontró un vehículo con ese ID asociado al usuario.")
 
-        if vehiculo.vin != datos.vin:
-            vin_existente = db.query(Vehiculo).filter(Vehiculo.vin == datos.vin).first()
-            if vin_existente:
-                raise HTTPException(status_code=400, detail="El VIN proporcionado ya está registrado en otro vehículo.")
-
-        # Actualizar campos
-        vehiculo.marca = datos.marca
-        vehiculo.modelo = datos.modelo
-        vehiculo.year = datos.year
-        vehiculo.rpm = datos.rpm
-        vehiculo.velocidad = datos.velocidad
-        vehiculo.vin = datos.vin
-
-        db.commit()
+        await db.commit()
+        cache_informes.invalidar_vehiculo(vehiculo_id)
         return {"mensaje": "Vehículo actualizado correctamente"}
 
     except HTTPException:
         raise
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="El VIN proporcionado ya está registrado en otro vehículo.")
     except Exception as e:
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Ocurrió un error al editar el vehículo: {str(e)}")
 
 # Endpoint para eliminar vehículo
 @app.delete("/eliminar-vehiculo/{vehiculo_id}")
-def eliminar_vehiculo(vehiculo_id: int, usuario: Usuario = Depends(obtener_usuario_desde_token), db: Session = Depends(get_db)):
+async def eliminar_vehiculo(vehiculo_id: int, usuario: UsuarioAutenticado = Depends(obtener_usuario_desde_token), db: AsyncSession = Depends(get_db)):
     """
     Elimina un vehículo registrado por el usuario autenticado.
 
+    El borrado son sentencias ``DELETE`` filtradas por propietario: primero los errores, cuyo
+    ``rowcount`` da `errores_eliminados` sin un ``COUNT`` previo, y después el vehículo; informes
+    (y sus correos), revisión normalizada, telemetría y aportaciones a las estadísticas los elimina
+    la base de datos con ``ON DELETE CASCADE``, sin cargarlos en memoria. Antes se restan de
+    `estadisticas_dtc` las detecciones del vehículo guardadas en `detecciones_dtc`.
+
     Args:
         vehiculo_id (int): ID del vehículo a eliminar.
-        db (Session): Sesión de base de datos.
-        usuario (Usuario): Usuario autenticado mediante JWT.
+        db (AsyncSession): Sesión de base de datos.
+        usuario (UsuarioAutenticado): Usuario autenticado mediante JWT.
 
     Returns:
         dict: Mensaje de éxito.
@@ -884,33 +3477,49 @@ def eliminar_vehiculo(vehiculo_id: int, usuario: Usuario = Depends(obtener_usuar
         HTTPException 404: Si el vehículo no existe o no pertenece al usuario.
     """
     try:
-        vehiculo = db.query(Vehiculo).filter(
-            Vehiculo.id == vehiculo_id,
-            Vehiculo.usuario_id == usuario.id
-        ).first()
+        propio = select(Vehiculo.id).where(Vehiculo.id == vehiculo_id, Vehiculo.usuario_id == usuario.id)
+
+        # Se resta a las estadísticas lo que aportó el vehículo y se borran los contadores que quedan a cero
+        afectadas = select(DeteccionDtc.estadistica_id).where(DeteccionDtc.vehiculo_id.in_(propio))
+        aportado = (
+            select(DeteccionDtc.detecciones)
+            .where(DeteccionDtc.vehiculo_id == vehiculo_id, DeteccionDtc.estadistica_id == EstadisticaDtc.id)
+            .scalar_subquery()
+        )
+        await db.execute(
+            update(EstadisticaDtc).where(EstadisticaDtc.id.in_(afectadas))
+            .values(detecciones=EstadisticaDtc.detecciones - aportado)
+            .execution_options(synchronize_session=False)
+        )
+        await db.execute(
+            delete(EstadisticaDtc).where(EstadisticaDtc.id.in_(afectadas), EstadisticaDtc.detecciones <= 0)
+            .execution_options(synchronize_session=False)
+        )
+
+        errores = await db.execute(delete(ErrorVehiculo).where(ErrorVehiculo.vehiculo_id.in_(propio)))
+        resultado = await db.execute(
+            delete(Vehiculo).where(Vehiculo.id == vehiculo_id, Vehiculo.usuario_id == usuario.id)
+        )
 
-        if vehiculo is None:
+        if resultado.rowcount == 0:
+            await db.rollback()
             raise HTTPException(
                 status_code=404,
                 detail="No se encontró un vehículo con ese ID asociado al usuario."
             )
 
-        # Eliminar errores asociados primero
-        errores_eliminados = db.query(ErrorVehiculo).filter(
-            ErrorVehiculo.vehiculo_id == vehiculo.id
-        ).delete()
-
-        db.delete(vehiculo)
-        db.commit()
+        await db.commit()
+        cache_informes.invalidar_vehiculo(vehiculo_id)
 
         return {
             "mensaje": "Vehículo eliminado correctamente",
-            "errores_eliminados": errores_eliminados
+            "errores_eliminados": errores.rowcount
         }
 
     except HTTPException:
         raise
     except Exception as e:
+        await db.rollback()
         raise HTTPException(
             status_code=500,
             detail=f"Ocurrió un error al eliminar el vehículo: {str(e)}"
@@ -928,3 +3537,73 @@ async def saludo():
         dict: Mensaje de saludo indicando que la API funciona.
     """
     return {"mensaje": "¡La API está funcionando correctamente!"}
+
+# Endpoint de métricas de la caché de autenticación
+@app.get("/metricas/cache-auth")
+async def metricas_cache_auth():
+    """
+    Devuelve los contadores de la caché de principales usada al verificar tokens.
+
+    Cada acierto corresponde a una consulta a la base de datos que se ha evitado.
+
+    Returns:
+        dict: Aciertos, fallos, número de entradas y configuración de la caché.
+    """
+    return cache_principales.estadisticas()
+
+# Estado del pool de conexiones y de la base de datos
+def estado_pool(pool) -> dict:
+    """
+    Resume el estado de un pool de SQLAlchemy (los pools sin cola devuelven solo su tipo).
+    """
+    estado = {"tipo": pool.__class__.__name__}
+    if isinstance(pool, QueuePool):
+        estado.update({
+            "tamano": pool.size(),
+            "libres": pool.checkedin(),
+            "en_uso": pool.checkedout(),
+            "overflow": pool.overflow(),
+            "timeout": pool.timeout(),
+        })
+    return estado
+
+@app.get("/health/db")
+async def salud_db(db: AsyncSession = Depends(get_db)):
+    """
+    Comprueba la conexión con la base de datos y devuelve el estado del pool.
+
+    Returns:
+        dict: Latencia de ``SELECT 1``, conexiones libres/en uso/overflow del pool y
+        el resumen de los tiempos de espera al obtener conexión.
+
+    Raises:
+        HTTPException 503: Si la base de datos no responde.
+    """
+    inicio = time.perf_counter()
+    try:
+        await db.execute(text("SELECT 1"))
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"La base de datos no responde: {str(e)}")
+    latencia = time.perf_counter() - inicio
+
+    return {
+        "estado": "ok",
+        "latencia_ms": round(latencia * 1000, 3),
+        "pool": estado_pool(db.get_bind().pool),
+        "espera_pool": metricas_pool.resumen(),
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metricas_prometheus():
+    """
+    Exporta en formato Prometheus el estado del pool y el histograma de espera al obtener conexión.
+
+    Returns:
+        str: Métricas en formato de texto de Prometheus.
+    """
+    lineas = []
+    pool = estado_pool(async_engine.sync_engine.pool if DB_ASYNC else engine.pool)
+    for clave, nombre in (("tamano", "size"), ("libres", "checked_in"), ("en_uso", "checked_out"), ("overflow", "overflow")):
+        if clave in pool:
+            lineas += [f"# TYPE taller_db_pool_{nombre} gauge", f"taller_db_pool_{nombre} {pool[clave]}"]
+    return "\n".join(lineas) + "\n" + metricas_pool.prometheus("taller_db_pool_checkout_wait_seconds")
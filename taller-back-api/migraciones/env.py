@@ -0,0 +1,54 @@
+"""
+Entorno de Alembic.
+
+La URL se lee de ``DATABASE_URL`` (entorno o ``.env``, igual que la API) y los modelos de `modelos`,
+de modo que migrar no construye la aplicación y ``alembic revision --autogenerate`` compara contra
+los modelos actuales. Los tests pueden pasar una conexión ya abierta en ``config.attributes["conexion"]``.
+"""
+import os
+from logging.config import fileConfig
+
+from alembic import context
+from dotenv import load_dotenv
+from sqlalchemy import create_engine
+from sqlalchemy.pool import NullPool
+
+from modelos import Base
+
+load_dotenv()
+DATABASE_URL = os.getenv("DATABASE_URL", "mysql+pymysql://user:password@db/talleres")
+
+config = context.config
+target_metadata = Base.metadata
+
+if config.config_file_name is not None and "conexion" not in config.attributes:
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
+
+def run_migrations_offline():
+    """
+    Genera el SQL de las migraciones sin conectarse (``alembic upgrade head --sql``).
+    """
+    context.configure(url=DATABASE_URL, target_metadata=target_metadata, literal_binds=True)
+    with context.begin_transaction():
+        context.run_migrations()
+
+def ejecutar(conexion):
+    context.configure(connection=conexion, target_metadata=target_metadata, render_as_batch=conexion.dialect.name == "sqlite")
+    with context.begin_transaction():
+        context.run_migrations()
+
+def run_migrations_online():
+    """
+    Aplica las migraciones sobre la base de datos con una conexión propia (sin el pool de la API).
+    """
+    conexion = config.attributes.get("conexion")
+    if conexion is not None:
+        ejecutar(conexion)
+        return
+    with create_engine(DATABASE_URL, poolclass=NullPool).connect() as conexion:
+        ejecutar(conexion)
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,368 @@
+"""Esquema base: tablas, índices y claves foráneas de los modelos actuales
+
+Sustituye a ``create_all`` en el arranque. En una base de datos vacía crea todo el esquema.
+En una base de datos creada con ``create_all`` por versiones anteriores de la API la adopta:
+crea las tablas y columnas que falten, fusiona los códigos DTC duplicados antes de crear su
+restricción única, crea los índices que falten (en línea en MySQL), recrea con ``ON DELETE CASCADE``
+las claves foráneas que se crearon sin esa opción y ejecuta las migraciones de datos de las tablas
+nuevas (revisión normalizada y estadísticas de códigos DTC).
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 00:00:00
+"""
+import ast
+import json
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.schema import AddConstraint
+
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+# Copia fija del esquema en esta revisión: los cambios posteriores de los modelos van en migraciones nuevas
+metadata = sa.MetaData()
+
+sa.Table(
+    "usuarios", metadata,
+    sa.Column("id", sa.Integer, primary_key=True, index=True),
+    sa.Column("username", sa.String(255), unique=True, index=True),
+    sa.Column("password_hash", sa.String(255)),
+    sa.Column("token_version", sa.Integer, nullable=False, server_default="0"),
+)
+
+sa.Table(
+    "vehiculos", metadata,
+    sa.Column("id", sa.Integer, primary_key=True, index=True),
+    sa.Column("marca", sa.String(255), index=True),
+    sa.Column("modelo", sa.String(255)),
+    sa.Column("year", sa.Integer),
+    sa.Column("rpm", sa.Integer),
+    sa.Column("velocidad", sa.Integer),
+    sa.Column("vin", sa.String(17), unique=True, nullable=False),
+    sa.Column("revision", sa.JSON),
+    sa.Column("usuario_id", sa.Integer, sa.ForeignKey("usuarios.id")),
+    sa.Column("actualizado_en", sa.DateTime),
+    sa.Index("ix_vehiculos_usuario_id_id", "usuario_id", "id"),
+)
+
+sa.Table(
+    "revision_items", metadata,
+    sa.Column("id", sa.Integer, primary_key=True),
+    sa.Column("vehiculo_id", sa.Integer, sa.ForeignKey("vehiculos.id", ondelete="CASCADE"), nullable=False, index=True),
+    sa.Column("parte", sa.String(100), nullable=False),
+    sa.Column("detalle", sa.String(255), nullable=False),
+    sa.Index("ix_revision_items_parte_detalle", "parte", "detalle", "vehiculo_id"),
+)
+
+sa.Table(
+    "errores_vehiculos", metadata,
+    sa.Column("id", sa.Integer, primary_key=True, index=True),
+    sa.Column("vehiculo_id", sa.Integer, sa.ForeignKey("vehiculos.id", ondelete="CASCADE")),
+    sa.Column("codigo_dtc", sa.String(255)),
+    sa.Column("primera_deteccion", sa.DateTime),
+    sa.Column("ultima_deteccion", sa.DateTime),
+    sa.Column("ocurrencias", sa.Integer, nullable=False, server_default="1"),
+    sa.UniqueConstraint("vehiculo_id", "codigo_dtc", name="uq_errores_vehiculo_codigo"),
+    sa.Index("ix_errores_vehiculos_vehiculo_id_id", "vehiculo_id", "id"),
+)
+
+sa.Table(
+    "informes_compartidos", metadata,
+    sa.Column("id", sa.Integer, primary_key=True),
+    sa.Column("token", sa.String(100), unique=True, index=True),
+    sa.Column("vehiculo_id", sa.Integer, sa.ForeignKey("vehiculos.id", ondelete="CASCADE"), index=True),
+    sa.Column("email_cliente", sa.String(255)),
+    sa.Column("creado_en", sa.String(255)),
+)
+
+sa.Table(
+    "estadisticas_dtc", metadata,
+    sa.Column("id", sa.Integer, primary_key=True),
+    sa.Column("usuario_id", sa.Integer, sa.ForeignKey("usuarios.id"), nullable=False),
+    sa.Column("mes", sa.String(7), nullable=False),
+    sa.Column("codigo_dtc", sa.String(255), nullable=False),
+    sa.Column("marca", sa.String(255), nullable=False, server_default=""),
+    sa.Column("modelo", sa.String(255), nullable=False, server_default=""),
+    sa.Column("year", sa.Integer, nullable=False, server_default="0"),
+    sa.Column("detecciones", sa.Integer, nullable=False, server_default="0"),
+    sa.UniqueConstraint("usuario_id", "mes", "codigo_dtc", "marca", "modelo", "year", name="uq_estadisticas_dtc"),
+)
+
+sa.Table(
+    "telemetria", metadata,
+    sa.Column("vehiculo_id", sa.Integer, sa.ForeignKey("vehiculos.id", ondelete="CASCADE"), primary_key=True, autoincrement=False),
+    sa.Column("pid", sa.String(4), primary_key=True),
+    sa.Column("ts", sa.BigInteger, primary_key=True, autoincrement=False),
+    sa.Column("valor", sa.Float, nullable=False),
+)
+
+sa.Table(
+    "importaciones", metadata,
+    sa.Column("id", sa.String(36), primary_key=True),
+    sa.Column("usuario_id", sa.Integer, sa.ForeignKey("usuarios.id"), nullable=False, index=True),
+    sa.Column("nombre_archivo", sa.String(255)),
+    sa.Column("estado", sa.String(20), nullable=False),
+    sa.Column("filas_procesadas", sa.Integer, nullable=False),
+    sa.Column("filas_importadas", sa.Integer, nullable=False),
+    sa.Column("filas_con_error", sa.Integer, nullable=False),
+    sa.Column("error", sa.String(500)),
+    sa.Column("creado_en", sa.DateTime),
+    sa.Column("terminado_en", sa.DateTime),
+)
+
+sa.Table(
+    "errores_importacion", metadata,
+    sa.Column("id", sa.Integer, primary_key=True),
+    sa.Column("importacion_id", sa.String(36), sa.ForeignKey("importaciones.id"), nullable=False),
+    sa.Column("fila", sa.Integer, nullable=False),
+    sa.Column("vin", sa.String(64)),
+    sa.Column("detalle", sa.String(500), nullable=False),
+    sa.Index("ix_errores_importacion_importacion_fila", "importacion_id", "fila"),
+)
+
+sa.Table(
+    "correos_salientes", metadata,
+    sa.Column("id", sa.Integer, primary_key=True),
+    sa.Column("informe_id", sa.Integer, sa.ForeignKey("informes_compartidos.id", ondelete="CASCADE"), index=True),
+    sa.Column("destinatario", sa.String(255), nullable=False),
+    sa.Column("asunto", sa.String(255), nullable=False),
+    sa.Column("cuerpo", sa.Text, nullable=False),
+    sa.Column("estado", sa.String(20), nullable=False),
+    sa.Column("intentos", sa.Integer, nullable=False),
+    sa.Column("proximo_intento", sa.DateTime, nullable=False),
+    sa.Column("lote", sa.String(36), index=True),
+    sa.Column("ultimo_error", sa.String(500)),
+    sa.Column("creado_en", sa.DateTime),
+    sa.Column("enviado_en", sa.DateTime),
+    sa.Index("ix_correos_salientes_estado_proximo", "estado", "proximo_intento"),
+)
+
+
+def agregar_columnas(conexion, tablas):
+    """
+    Añade a las tablas existentes las columnas que se incorporaron después de crearlas.
+    """
+    inspector = sa.inspect(conexion)
+    for tabla in tablas:
+        columnas = {c["name"] for c in inspector.get_columns(tabla.name)}
+        for columna in tabla.columns:
+            if columna.name in columnas:
+                continue
+            servidor = columna.server_default.arg if columna.server_default is not None else None
+            op.add_column(tabla.name, sa.Column(columna.name, columna.type, nullable=columna.nullable, server_default=servidor))
+
+def fusionar_errores_duplicados(conexion):
+    """
+    Deja una sola fila por ``(vehiculo_id, codigo_dtc)`` antes de crear la restricción única,
+    acumulando las ocurrencias y el rango de detección en la fila más antigua.
+    """
+    duplicados = conexion.execute(sa.text(
+        "SELECT vehiculo_id, codigo_dtc, MIN(id), SUM(ocurrencias), MIN(primera_deteccion), MAX(ultima_deteccion) "
+        "FROM errores_vehiculos WHERE codigo_dtc IS NOT NULL "
+        "GROUP BY vehiculo_id, codigo_dtc HAVING COUNT(*) > 1"
+    )).all()
+    if not duplicados:
+        return
+    conexion.execute(
+        sa.text("UPDATE errores_vehiculos SET ocurrencias = :n, primera_deteccion = :primera, ultima_deteccion = :ultima WHERE id = :id"),
+        [{"id": i, "n": n, "primera": primera, "ultima": ultima} for _, _, i, n, primera, ultima in duplicados]
+    )
+    conexion.execute(
+        sa.text("DELETE FROM errores_vehiculos WHERE vehiculo_id = :vehiculo_id AND codigo_dtc = :codigo AND id <> :id"),
+        [{"vehiculo_id": v, "codigo": c, "id": i} for v, c, i, _, _, _ in duplicados]
+    )
+
+def crear_restricciones_unicas(conexion, tablas):
+    inspector = sa.inspect(conexion)
+    for tabla in tablas:
+        existentes = {r["name"] for r in inspector.get_unique_constraints(tabla.name)}
+        existentes |= {i["name"] for i in inspector.get_indexes(tabla.name)}
+        for restriccion in tabla.constraints:
+            if not isinstance(restriccion, sa.UniqueConstraint) or not restriccion.name or restriccion.name in existentes:
+                continue
+            if tabla.name == "errores_vehiculos":
+                fusionar_errores_duplicados(conexion)
+            # batch_alter_table recrea la tabla en SQLite, que no admite ALTER TABLE ... ADD CONSTRAINT
+            with op.batch_alter_table(tabla.name) as lote:
+                lote.create_unique_constraint(restriccion.name, [c.name for c in restriccion.columns])
+
+def crear_indices(conexion, tablas):
+    """
+    Crea los índices que falten. En MySQL se crean en línea (``ALGORITHM=INPLACE, LOCK=NONE``)
+    para no bloquear las escrituras mientras se construyen.
+    """
+    inspector = sa.inspect(conexion)
+    citar = conexion.dialect.identifier_preparer.quote
+    for tabla in tablas:
+        existentes = {i["name"] for i in inspector.get_indexes(tabla.name)}
+        for indice in tabla.indexes:
+            if indice.name in existentes:
+                continue
+            columnas = [c.name for c in indice.columns]
+            if conexion.dialect.name == "mysql":
+                tipo = "UNIQUE INDEX" if indice.unique else "INDEX"
+                op.execute(
+                    f"ALTER TABLE {citar(tabla.name)} ADD {tipo} {citar(indice.name)} "
+                    f"({', '.join(citar(c) for c in columnas)}), ALGORITHM=INPLACE, LOCK=NONE"
+                )
+            else:
+                op.create_index(indice.name, tabla.name, columnas, unique=indice.unique)
+
+def recrear_en_sqlite(tabla):
+    """
+    Reconstruye una tabla de SQLite con la definición de esta revisión conservando sus filas.
+    """
+    with op.batch_alter_table(tabla.name, copy_from=tabla, recreate="always"):
+        pass
+
+def asegurar_borrado_en_cascada(conexion, tablas):
+    """
+    Recrea con ``ON DELETE CASCADE`` las claves foráneas que se crearon sin esa opción.
+
+    SQLite no permite modificar claves foráneas existentes: allí se reconstruye la tabla.
+    """
+    inspector = sa.inspect(conexion)
+    citar = conexion.dialect.identifier_preparer.quote
+    borrar = "DROP FOREIGN KEY" if conexion.dialect.name == "mysql" else "DROP CONSTRAINT"
+    for tabla in tablas:
+        en_cascada = {tuple(r.column_keys): r for r in tabla.foreign_key_constraints if (r.ondelete or "").upper() == "CASCADE"}
+        if not en_cascada:
+            continue
+        for existente in inspector.get_foreign_keys(tabla.name):
+            restriccion = en_cascada.get(tuple(existente["constrained_columns"]))
+            if restriccion is None or (existente.get("options") or {}).get("ondelete", "").upper() == "CASCADE":
+                continue
+            if conexion.dialect.name == "sqlite":
+                recrear_en_sqlite(tabla)
+                break
+            op.execute(f"ALTER TABLE {citar(tabla.name)} {borrar} {citar(existente['name'])}")
+            op.execute(AddConstraint(restriccion))
+
+
+def parsear_revision(valor) -> dict:
+    """
+    Convierte una revisión almacenada en formato antiguo (``str(dict)``) o JSON en un diccionario.
+
+    Las revisiones truncadas por la antigua columna ``String(255)`` no pueden recuperarse;
+    su texto se conserva en la parte ``sin_clasificar``.
+    """
+    if isinstance(valor, dict):
+        return valor
+    if not valor:
+        return {}
+    for parsear in (json.loads, ast.literal_eval):
+        try:
+            resultado = parsear(valor)
+        except (ValueError, SyntaxError, TypeError):
+            continue
+        if isinstance(resultado, dict):
+            return resultado
+    return {"sin_clasificar": [valor]}
+
+def items_de_revision(revision: dict) -> list[dict]:
+    """
+    Aplana una revisión ``{parte: [detalles]}`` en filas de `revision_items` (sin duplicados).
+    """
+    filas, vistos = [], set()
+    for parte, detalles in (revision or {}).items():
+        if not isinstance(detalles, (list, tuple)):
+            detalles = [detalles] if detalles not in (None, "") else []
+        for detalle in detalles:
+            clave = (str(parte).strip()[:100], str(detalle).strip()[:255])
+            if clave[0] and clave[1] and clave not in vistos:
+                vistos.add(clave)
+                filas.append({"parte": clave[0], "detalle": clave[1]})
+    return filas
+
+def migrar_revisiones(conexion):
+    """
+    Migra las revisiones guardadas como ``str(dict)`` a JSON y rellena `revision_items`.
+
+    Reescribe cada fila como JSON válido antes de cambiar el tipo de columna (MySQL y PostgreSQL
+    validan el contenido al convertir) y genera los elementos normalizados de todas las revisiones.
+    """
+    filas = conexion.execute(sa.text("SELECT id, revision FROM vehiculos")).all()
+    revisiones = {vehiculo_id: parsear_revision(valor) for vehiculo_id, valor in filas}
+    if revisiones:
+        conexion.execute(
+            sa.text("UPDATE vehiculos SET revision = :revision WHERE id = :id"),
+            [{"id": i, "revision": json.dumps(r, ensure_ascii=False)} for i, r in revisiones.items()]
+        )
+
+    dialecto = conexion.dialect.name
+    if dialecto == "mysql":
+        op.execute("ALTER TABLE vehiculos MODIFY revision JSON")
+    elif dialecto == "postgresql":
+        op.execute("ALTER TABLE vehiculos ALTER COLUMN revision TYPE JSON USING revision::json")
+    elif dialecto == "sqlite":
+        recrear_en_sqlite(metadata.tables["vehiculos"])
+
+    items = [
+        {"vehiculo_id": vehiculo_id, **item}
+        for vehiculo_id, revision in revisiones.items()
+        for item in items_de_revision(revision)
+    ]
+    if items:
+        conexion.execute(sa.insert(metadata.tables["revision_items"]), items)
+
+def poblar_estadisticas_dtc(conexion):
+    """
+    Rellena `estadisticas_dtc` a partir de los errores ya almacenados.
+
+    Como el histórico no guarda la fecha de cada detección, todas las ocurrencias de un código
+    se imputan al mes de su `ultima_deteccion`.
+    """
+    vehiculos = metadata.tables["vehiculos"]
+    errores = metadata.tables["errores_vehiculos"]
+    contadores = {}
+    filas = conexion.execute(
+        sa.select(
+            vehiculos.c.usuario_id, vehiculos.c.marca, vehiculos.c.modelo, vehiculos.c.year,
+            errores.c.codigo_dtc, errores.c.ultima_deteccion, errores.c.ocurrencias,
+        )
+        .join(vehiculos, vehiculos.c.id == errores.c.vehiculo_id)
+        .where(vehiculos.c.usuario_id.is_not(None), errores.c.codigo_dtc.is_not(None))
+        .execution_options(yield_per=1000)
+    )
+    for usuario_id, marca, modelo, year, codigo, ultima, ocurrencias in filas:
+        clave = (usuario_id, (ultima or datetime.utcnow()).strftime("%Y-%m"), codigo, marca or "", modelo or "", year or 0)
+        contadores[clave] = contadores.get(clave, 0) + (ocurrencias or 1)
+
+    if contadores:
+        conexion.execute(sa.insert(metadata.tables["estadisticas_dtc"]), [
+            {"usuario_id": u, "mes": m, "codigo_dtc": c, "marca": ma, "modelo": mo, "year": y, "detecciones": n}
+            for (u, m, c, ma, mo, y), n in contadores.items()
+        ])
+
+
+def upgrade():
+    conexion = op.get_bind()
+    existentes = set(sa.inspect(conexion).get_table_names())
+    previas = [tabla for tabla in metadata.sorted_tables if tabla.name in existentes]
+
+    metadata.create_all(bind=conexion, checkfirst=True)
+    if not previas:
+        return
+
+    agregar_columnas(conexion, previas)
+    crear_restricciones_unicas(conexion, previas)
+    asegurar_borrado_en_cascada(conexion, previas)
+
+    # Solo si la base de datos ya tenía vehículos (no es una instalación nueva)
+    if "vehiculos" in existentes:
+        if "revision_items" not in existentes:
+            migrar_revisiones(conexion)
+        if "estadisticas_dtc" not in existentes:
+            poblar_estadisticas_dtc(conexion)
+
+    # Al final: las tablas reconstruidas en SQLite también recuperan aquí sus índices
+    crear_indices(conexion, previas)
+
+def downgrade():
+    metadata.drop_all(bind=op.get_bind())
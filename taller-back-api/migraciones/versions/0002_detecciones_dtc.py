@@ -0,0 +1,154 @@
+"""Aportación de cada vehículo a las estadísticas de códigos DTC
+
+Crea `detecciones_dtc`, recrea con ``ON DELETE CASCADE`` la clave foránea de
+`estadisticas_dtc.usuario_id` y recalcula los contadores desde `errores_vehiculos` para que
+coincidan con la suma de las aportaciones. Como el histórico no guarda la fecha de cada
+detección, todas las ocurrencias de un código se imputan al mes de su `ultima_deteccion`.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 00:00:00
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+# Copia fija de las tablas que usa esta revisión
+metadata = sa.MetaData()
+
+sa.Table(
+    "usuarios", metadata,
+    sa.Column("id", sa.Integer, primary_key=True),
+)
+
+sa.Table(
+    "vehiculos", metadata,
+    sa.Column("id", sa.Integer, primary_key=True),
+    sa.Column("marca", sa.String(255)),
+    sa.Column("modelo", sa.String(255)),
+    sa.Column("year", sa.Integer),
+    sa.Column("usuario_id", sa.Integer, sa.ForeignKey("usuarios.id")),
+)
+
+sa.Table(
+    "errores_vehiculos", metadata,
+    sa.Column("id", sa.Integer, primary_key=True),
+    sa.Column("vehiculo_id", sa.Integer, sa.ForeignKey("vehiculos.id", ondelete="CASCADE")),
+    sa.Column("codigo_dtc", sa.String(255)),
+    sa.Column("ultima_deteccion", sa.DateTime),
+    sa.Column("ocurrencias", sa.Integer),
+)
+
+sa.Table(
+    "detecciones_dtc", metadata,
+    sa.Column("vehiculo_id", sa.Integer, sa.ForeignKey("vehiculos.id", ondelete="CASCADE"), primary_key=True, autoincrement=False),
+    sa.Column("estadistica_id", sa.Integer, sa.ForeignKey("estadisticas_dtc.id", ondelete="CASCADE"),
+              primary_key=True, autoincrement=False, index=True),
+    sa.Column("detecciones", sa.Integer, nullable=False, server_default="0"),
+)
+
+
+def tabla_estadisticas(destino, ondelete):
+    """
+    Definición de `estadisticas_dtc` con la clave foránea de `usuario_id` indicada.
+    """
+    return sa.Table(
+        "estadisticas_dtc", destino,
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("usuario_id", sa.Integer, sa.ForeignKey(metadata.tables["usuarios"].c.id, ondelete=ondelete), nullable=False),
+        sa.Column("mes", sa.String(7), nullable=False),
+        sa.Column("codigo_dtc", sa.String(255), nullable=False),
+        sa.Column("marca", sa.String(255), nullable=False, server_default=""),
+        sa.Column("modelo", sa.String(255), nullable=False, server_default=""),
+        sa.Column("year", sa.Integer, nullable=False, server_default="0"),
+        sa.Column("detecciones", sa.Integer, nullable=False, server_default="0"),
+        sa.UniqueConstraint("usuario_id", "mes", "codigo_dtc", "marca", "modelo", "year", name="uq_estadisticas_dtc"),
+    )
+
+tabla_estadisticas(metadata, "CASCADE")
+
+
+def recrear_clave_usuario(conexion, ondelete):
+    """
+    Recrea la clave foránea de `estadisticas_dtc.usuario_id` con la opción ``ondelete`` indicada.
+
+    SQLite no permite modificar claves foráneas existentes: allí se reconstruye la tabla.
+    """
+    if conexion.dialect.name == "sqlite":
+        with op.batch_alter_table("estadisticas_dtc", copy_from=tabla_estadisticas(sa.MetaData(), ondelete), recreate="always"):
+            pass
+        return
+    for existente in sa.inspect(conexion).get_foreign_keys("estadisticas_dtc"):
+        if existente["constrained_columns"] == ["usuario_id"]:
+            op.drop_constraint(existente["name"], "estadisticas_dtc", type_="foreignkey")
+            op.create_foreign_key(existente["name"], "estadisticas_dtc", "usuarios", ["usuario_id"], ["id"], ondelete=ondelete)
+
+
+def recalcular_estadisticas_dtc(conexion):
+    """
+    Vuelve a calcular `estadisticas_dtc` y `detecciones_dtc` a partir de los errores almacenados.
+
+    Las claves se agrupan sin distinguir mayúsculas ni espacios finales, igual que la restricción
+    única en las colaciones de MySQL.
+    """
+    vehiculos = metadata.tables["vehiculos"]
+    errores = metadata.tables["errores_vehiculos"]
+    estadisticas = metadata.tables["estadisticas_dtc"]
+
+    def normalizar(clave):
+        return tuple(c.casefold().rstrip() if isinstance(c, str) else c for c in clave)
+
+    contadores = {}
+    aportaciones = {}
+    filas = conexion.execute(
+        sa.select(
+            vehiculos.c.id, vehiculos.c.usuario_id, vehiculos.c.marca, vehiculos.c.modelo, vehiculos.c.year,
+            errores.c.codigo_dtc, errores.c.ultima_deteccion, errores.c.ocurrencias,
+        )
+        .join(vehiculos, vehiculos.c.id == errores.c.vehiculo_id)
+        .where(vehiculos.c.usuario_id.is_not(None), errores.c.codigo_dtc.is_not(None))
+        .execution_options(yield_per=1000)
+    )
+    for vehiculo_id, usuario_id, marca, modelo, year, codigo, ultima, ocurrencias in filas:
+        clave = (usuario_id, (ultima or datetime.utcnow()).strftime("%Y-%m"), codigo, marca or "", modelo or "", year or 0)
+        normalizada = normalizar(clave)
+        contadores.setdefault(normalizada, [clave, 0])[1] += ocurrencias or 1
+        aportaciones[vehiculo_id, normalizada] = aportaciones.get((vehiculo_id, normalizada), 0) + (ocurrencias or 1)
+
+    conexion.execute(sa.delete(estadisticas))
+    if not contadores:
+        return
+    conexion.execute(sa.insert(estadisticas), [
+        {"usuario_id": u, "mes": m, "codigo_dtc": c, "marca": ma, "modelo": mo, "year": y, "detecciones": n}
+        for (u, m, c, ma, mo, y), n in contadores.values()
+    ])
+    ids = {
+        normalizar(tuple(fila[1:])): fila.id for fila in conexion.execute(sa.select(
+            estadisticas.c.id, estadisticas.c.usuario_id, estadisticas.c.mes, estadisticas.c.codigo_dtc,
+            estadisticas.c.marca, estadisticas.c.modelo, estadisticas.c.year,
+        ))
+    }
+    conexion.execute(sa.insert(metadata.tables["detecciones_dtc"]), [
+        {"vehiculo_id": vehiculo_id, "estadistica_id": ids[clave], "detecciones": n}
+        for (vehiculo_id, clave), n in aportaciones.items()
+    ])
+
+
+def upgrade():
+    conexion = op.get_bind()
+    recrear_clave_usuario(conexion, "CASCADE")
+    metadata.tables["detecciones_dtc"].create(bind=conexion, checkfirst=True)
+    recalcular_estadisticas_dtc(conexion)
+
+
+def downgrade():
+    conexion = op.get_bind()
+    metadata.tables["detecciones_dtc"].drop(bind=conexion)
+    recrear_clave_usuario(conexion, None)
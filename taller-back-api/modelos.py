@@ -0,0 +1,374 @@
+"""
+Modelos ORM (SQLAlchemy) de la base de datos del taller.
+
+Están separados de `main` para que las migraciones de Alembic (``migraciones/env.py``) puedan
+usar ``Base.metadata`` sin construir la aplicación (motores, pools, cachés, correo).
+`main` los reexporta, por lo que ``from main import Vehiculo`` sigue funcionando.
+"""
+import uuid
+from datetime import datetime
+
+from sqlalchemy import (
+    Column, BigInteger, Float, Integer, String, Text, DateTime, ForeignKey, Index, JSON, UniqueConstraint
+)
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import relationship
+
+Base = declarative_base()
+
+# Modelos de la base de datos
+class Usuario(Base):
+    """
+    Modelo ORM que representa a los usuarios del sistema.
+
+    Atributos:
+        id (int): ID autoincremental (clave primaria).
+        username (str): Nombre de usuario, único.
+        password_hash (str): Contraseña hasheada con bcrypt.
+        token_version (int): Versión de los tokens emitidos; al incrementarla se revocan los anteriores.
+
+    Relaciones:
+        vehiculos (List[Vehiculo]): Lista de vehículos registrados por el usuario.
+    """
+    __tablename__ = "usuarios"
+    id = Column(Integer, primary_key=True, index=True)
+    username = Column(String(255), unique=True, index=True)
+    password_hash = Column(String(255))
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")
+
+    # Relación con Vehículo (uno a muchos)
+    vehiculos = relationship("Vehiculo", back_populates="usuario")
+
+class Vehiculo(Base):
+    """
+    Modelo ORM que representa un vehículo registrado.
+
+    Atributos:
+        id (int): ID del vehículo.
+        marca (str): Marca del vehículo.
+        modelo (str): Modelo del vehículo.
+        year (int): Año de fabricación.
+        rpm (int): Revoluciones por minuto.
+        velocidad (int): Velocidad actual.
+        vin (str): Número VIN único del vehículo.
+        revision (dict): Revisión técnica en JSON (``{parte: [detalles]}``).
+        usuario_id (int): ID del usuario al que pertenece el vehículo.
+        actualizado_en (datetime): Fecha de la última modificación (se usa como ``Last-Modified`` del informe).
+
+    Relaciones:
+        usuario (Usuario): Usuario propietario.
+        errores (List[ErrorVehiculo]): Lista de errores asociados.
+        informes_compartidos (List[InformeCompartido]): Informes generados con token público.
+        items_revision (List[RevisionItem]): Revisión normalizada, una fila por parte y detalle.
+    """
+    __tablename__ = "vehiculos"
+    id = Column(Integer, primary_key=True, index=True)
+    marca = Column(String(255), index=True)
+    modelo = Column(String(255))
+    year = Column(Integer)
+    rpm = Column(Integer)
+    velocidad = Column(Integer)
+    vin = Column(String(17), unique=True, nullable=False)
+    revision = Column(JSON)
+    usuario_id = Column(Integer, ForeignKey('usuarios.id'))  # FK hacia Usuario
+    actualizado_en = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Índice compuesto que respalda la paginación por cursor de /mis-vehiculos/
+    __table_args__ = (
+        Index("ix_vehiculos_usuario_id_id", "usuario_id", "id"),
+    )
+
+    # Relación con Usuario (muchos a uno)
+    usuario = relationship("Usuario", back_populates="vehiculos")
+
+    # Las filas hijas las borra la base de datos (ON DELETE CASCADE): passive_deletes evita cargarlas
+    # Relación con ErrorVehiculo (uno a muchos)
+    errores = relationship("ErrorVehiculo", back_populates="vehiculo", cascade="all, delete-orphan", passive_deletes=True)
+
+    # Relación con InformeCompartido (uno a muchos)
+    informes_compartidos = relationship("InformeCompartido", back_populates="vehiculo", cascade="all, delete-orphan", passive_deletes=True)
+
+    # Relación con RevisionItem (uno a muchos)
+    items_revision = relationship("RevisionItem", back_populates="vehiculo", cascade="all, delete-orphan", passive_deletes=True)
+
+class RevisionItem(Base):
+    """
+    Modelo ORM con la revisión técnica normalizada: una fila por cada detalle marcado en una parte.
+
+    Se mantiene junto a `Vehiculo.revision` para responder consultas sobre toda la flota
+    (p. ej. qué vehículos tienen marcadas las pastillas de freno) con el índice ``(parte, detalle)``
+    en lugar de recorrer y parsear todas las revisiones.
+
+    Atributos:
+        id (int): ID del elemento.
+        vehiculo_id (int): ID del vehículo revisado.
+        parte (str): Parte revisada (p. ej. ``frenos``).
+        detalle (str): Detalle marcado en esa parte (p. ej. ``pastillas``).
+
+    Relaciones:
+        vehiculo (Vehiculo): Vehículo asociado.
+    """
+    __tablename__ = "revision_items"
+    id = Column(Integer, primary_key=True)
+    vehiculo_id = Column(Integer, ForeignKey("vehiculos.id", ondelete="CASCADE"), nullable=False, index=True)
+    parte = Column(String(100), nullable=False)
+    detalle = Column(String(255), nullable=False)
+
+    # Búsquedas por parte (y detalle) que devuelven directamente los vehículos afectados
+    __table_args__ = (
+        Index("ix_revision_items_parte_detalle", "parte", "detalle", "vehiculo_id"),
+    )
+
+    # Relación con Vehiculo (muchos a uno)
+    vehiculo = relationship("Vehiculo", back_populates="items_revision")
+
+
+class ErrorVehiculo(Base):
+    """
+    Modelo ORM que almacena los errores OBD-II (códigos DTC) de un vehículo.
+
+    Cada código se guarda una sola vez por vehículo; los escaneos repetidos actualizan
+    `ultima_deteccion` e incrementan `ocurrencias` en lugar de añadir filas.
+
+    Atributos:
+        id (int): ID del error.
+        vehiculo_id (int): ID del vehículo asociado.
+        codigo_dtc (str): Código de diagnóstico (ej. P0301).
+        primera_deteccion (datetime): Fecha del primer escaneo en que apareció el código.
+        ultima_deteccion (datetime): Fecha del último escaneo en que apareció el código.
+        ocurrencias (int): Número de escaneos en los que se ha detectado.
+
+    Relaciones:
+        vehiculo (Vehiculo): Vehículo asociado.
+    """
+    __tablename__ = "errores_vehiculos"
+    id = Column(Integer, primary_key=True, index=True)
+    vehiculo_id = Column(Integer, ForeignKey('vehiculos.id', ondelete="CASCADE"))  # FK hacia Vehiculo
+    codigo_dtc = Column(String(255))
+    primera_deteccion = Column(DateTime, default=datetime.utcnow)
+    ultima_deteccion = Column(DateTime, default=datetime.utcnow)
+    ocurrencias = Column(Integer, nullable=False, default=1, server_default="1")
+
+    # Un código por vehículo: permite el upsert idempotente de guardar_errores.
+    # (vehiculo_id, id) sirve la paginación por cursor de /mis-errores sin ordenar en memoria
+    __table_args__ = (
+        UniqueConstraint("vehiculo_id", "codigo_dtc", name="uq_errores_vehiculo_codigo"),
+        Index("ix_errores_vehiculos_vehiculo_id_id", "vehiculo_id", "id"),
+    )
+
+    # Relación con Vehículo (muchos a uno)
+    vehiculo = relationship("Vehiculo", back_populates="errores")
+
+class InformeCompartido(Base):
+    """
+    Modelo ORM que representa un informe compartido con un cliente por email.
+
+    Atributos:
+        id (int): ID del informe.
+        token (str): Token único para acceder al informe.
+        vehiculo_id (int): ID del vehículo relacionado.
+        email_cliente (str): Email al que se envía el informe.
+        creado_en (str): Fecha y hora de creación del informe (ISO format).
+
+    Relaciones:
+        vehiculo (Vehiculo): Vehículo asociado.
+    """
+    __tablename__ = "informes_compartidos"
+    id = Column(Integer, primary_key=True)
+    token = Column(String(100), unique=True, index=True, default=lambda: str(uuid.uuid4()))
+    vehiculo_id = Column(Integer, ForeignKey("vehiculos.id", ondelete="CASCADE"), index=True)
+    email_cliente = Column(String(255))
+    creado_en = Column(String(255), default=lambda: datetime.utcnow().isoformat())
+
+    # Relación con Vehiculo (muchos a uno)
+    vehiculo = relationship("Vehiculo", back_populates="informes_compartidos")
+
+    # Relación con CorreoSaliente (uno a muchos)
+    correos = relationship("CorreoSaliente", back_populates="informe", cascade="all, delete-orphan", passive_deletes=True)
+
+class EstadisticaDtc(Base):
+    """
+    Modelo ORM con los contadores agregados de códigos DTC por usuario, mes y tipo de vehículo.
+
+    Se actualiza de forma incremental en la misma transacción que guarda los errores
+    (ver `acumular_estadisticas_dtc`), de modo que ``/estadisticas/dtc`` lee un número de filas
+    proporcional a los códigos distintos y no al histórico de `errores_vehiculos`.
+    Los valores desconocidos de marca/modelo/año se guardan como ``""`` / ``0`` para que la
+    restricción única funcione también con ellos.
+
+    Lo que aporta cada vehículo a cada fila se guarda en `detecciones_dtc`, para poder restarlo
+    al eliminar el vehículo.
+
+    Atributos:
+        id (int): ID de la fila.
+        usuario_id (int): Usuario propietario de los vehículos.
+        mes (str): Mes de la detección (``YYYY-MM``).
+        codigo_dtc (str): Código de diagnóstico.
+        marca (str): Marca del vehículo en el momento de la detección.
+        modelo (str): Modelo del vehículo en el momento de la detección.
+        year (int): Año de fabricación del vehículo.
+        detecciones (int): Número de veces que se ha detectado el código.
+    """
+    __tablename__ = "estadisticas_dtc"
+    id = Column(Integer, primary_key=True)
+    usuario_id = Column(Integer, ForeignKey("usuarios.id", ondelete="CASCADE"), nullable=False)
+    mes = Column(String(7), nullable=False)
+    codigo_dtc = Column(String(255), nullable=False)
+    marca = Column(String(255), nullable=False, default="", server_default="")
+    modelo = Column(String(255), nullable=False, default="", server_default="")
+    year = Column(Integer, nullable=False, default=0, server_default="0")
+    detecciones = Column(Integer, nullable=False, default=0, server_default="0")
+
+    # La restricción única es la clave del upsert; empieza por (usuario_id, mes) para las lecturas por rango
+    __table_args__ = (
+        UniqueConstraint("usuario_id", "mes", "codigo_dtc", "marca", "modelo", "year", name="uq_estadisticas_dtc"),
+    )
+
+class DeteccionDtc(Base):
+    """
+    Modelo ORM con las detecciones que cada vehículo ha sumado a cada fila de `estadisticas_dtc`.
+
+    Se acumula junto a los contadores (ver `acumular_estadisticas_dtc`) y permite que
+    `eliminar_vehiculo` reste exactamente su aportación con una sola sentencia ``UPDATE``.
+    Al borrar el vehículo o la fila de estadísticas, la base de datos elimina estas filas en cascada.
+
+    Atributos:
+        vehiculo_id (int): Vehículo que aportó las detecciones.
+        estadistica_id (int): Fila de `estadisticas_dtc` a la que se sumaron.
+        detecciones (int): Número de detecciones aportadas.
+    """
+    __tablename__ = "detecciones_dtc"
+    vehiculo_id = Column(Integer, ForeignKey("vehiculos.id", ondelete="CASCADE"), primary_key=True, autoincrement=False)
+    estadistica_id = Column(Integer, ForeignKey("estadisticas_dtc.id", ondelete="CASCADE"), primary_key=True, autoincrement=False, index=True)
+    detecciones = Column(Integer, nullable=False, default=0, server_default="0")
+
+class Telemetria(Base):
+    """
+    Modelo ORM con las muestras de telemetría OBD-II (una fila por vehículo, PID e instante).
+
+    La clave primaria ``(vehiculo_id, pid, ts)`` agrupa físicamente cada serie en orden temporal
+    (índice agrupado en InnoDB): las inserciones de una grabación se añaden al final de su serie
+    y las consultas por rango de tiempo leen páginas contiguas. Reenviar un lote no duplica muestras.
+    La tabla no está particionada ni tiene retención: las muestras se conservan hasta que se
+    elimina el vehículo.
+
+    Atributos:
+        vehiculo_id (int): Vehículo al que pertenece la muestra.
+        pid (str): PID del modo 01 en hexadecimal (p. ej. ``0C``).
+        ts (int): Instante de la muestra en milisegundos desde epoch (UTC).
+        valor (float): Valor en unidades físicas.
+    """
+    __tablename__ = "telemetria"
+    vehiculo_id = Column(Integer, ForeignKey("vehiculos.id", ondelete="CASCADE"), primary_key=True, autoincrement=False)
+    pid = Column(String(4), primary_key=True)
+    ts = Column(BigInteger, primary_key=True, autoincrement=False)
+    valor = Column(Float, nullable=False)
+
+class Importacion(Base):
+    """
+    Modelo ORM de un trabajo de importación CSV procesado en segundo plano.
+
+    Atributos:
+        id (str): Identificador (UUID) del trabajo.
+        usuario_id (int): Usuario que subió el archivo.
+        nombre_archivo (str): Nombre original del archivo subido.
+        estado (str): ``pendiente``, ``procesando``, ``completada`` o ``fallida``.
+        filas_procesadas (int): Filas leídas hasta el momento.
+        filas_importadas (int): Vehículos creados.
+        filas_con_error (int): Filas rechazadas (detalle en `errores`).
+        error (str): Motivo si el trabajo completo ha fallado.
+        creado_en (datetime): Fecha de subida.
+        terminado_en (datetime): Fecha de finalización.
+
+    Relaciones:
+        errores (List[ErrorImportacion]): Errores por fila.
+    """
+    __tablename__ = "importaciones"
+    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    usuario_id = Column(Integer, ForeignKey("usuarios.id"), nullable=False, index=True)
+    nombre_archivo = Column(String(255))
+    estado = Column(String(20), nullable=False, default="pendiente")
+    filas_procesadas = Column(Integer, nullable=False, default=0)
+    filas_importadas = Column(Integer, nullable=False, default=0)
+    filas_con_error = Column(Integer, nullable=False, default=0)
+    error = Column(String(500))
+    creado_en = Column(DateTime, default=datetime.utcnow)
+    terminado_en = Column(DateTime)
+
+    # Relación con ErrorImportacion (uno a muchos)
+    errores = relationship("ErrorImportacion", back_populates="importacion", cascade="all, delete-orphan")
+
+class ErrorImportacion(Base):
+    """
+    Modelo ORM con el motivo por el que se rechazó una fila de una importación.
+
+    Atributos:
+        id (int): ID del error.
+        importacion_id (str): Trabajo de importación.
+        fila (int): Número de fila en el CSV (la cabecera es la fila 1).
+        vin (str): VIN de la fila, si se pudo leer.
+        detalle (str): Motivo del rechazo.
+
+    Relaciones:
+        importacion (Importacion): Trabajo asociado.
+    """
+    __tablename__ = "errores_importacion"
+    id = Column(Integer, primary_key=True)
+    importacion_id = Column(String(36), ForeignKey("importaciones.id"), nullable=False)
+    fila = Column(Integer, nullable=False)
+    vin = Column(String(64))
+    detalle = Column(String(500), nullable=False)
+
+    # Errores de un trabajo en orden de fila
+    __table_args__ = (
+        Index("ix_errores_importacion_importacion_fila", "importacion_id", "fila"),
+    )
+
+    # Relación con Importacion (muchos a uno)
+    importacion = relationship("Importacion", back_populates="errores")
+
+class CorreoSaliente(Base):
+    """
+    Modelo ORM de la bandeja de salida (outbox) de correos.
+
+    Cada fila se crea en la misma transacción que el informe y la envía en segundo plano
+    `EnviadorCorreos`, que reintenta con espera exponencial hasta `CORREO_MAX_INTENTOS`.
+
+    Atributos:
+        id (int): ID del correo.
+        informe_id (int): ID del informe al que pertenece.
+        destinatario (str): Email del cliente.
+        asunto (str): Asunto del mensaje.
+        cuerpo (str): Cuerpo HTML del mensaje.
+        estado (str): ``pendiente``, ``enviando``, ``enviado`` o ``fallido``.
+        intentos (int): Número de intentos de envío realizados.
+        proximo_intento (datetime): Momento a partir del cual puede (re)intentarse el envío.
+        lote (str): Identificador del lote que ha reclamado el correo.
+        ultimo_error (str): Último error devuelto por el servidor SMTP.
+        creado_en (datetime): Fecha de creación.
+        enviado_en (datetime): Fecha de entrega al servidor SMTP.
+
+    Relaciones:
+        informe (InformeCompartido): Informe asociado.
+    """
+    __tablename__ = "correos_salientes"
+    id = Column(Integer, primary_key=True)
+    informe_id = Column(Integer, ForeignKey("informes_compartidos.id", ondelete="CASCADE"), index=True)
+    destinatario = Column(String(255), nullable=False)
+    asunto = Column(String(255), nullable=False)
+    cuerpo = Column(Text, nullable=False)
+    estado = Column(String(20), nullable=False, default="pendiente")
+    intentos = Column(Integer, nullable=False, default=0)
+    proximo_intento = Column(DateTime, nullable=False, default=datetime.utcnow)
+    lote = Column(String(36), index=True)
+    ultimo_error = Column(String(500))
+    creado_en = Column(DateTime, default=datetime.utcnow)
+    enviado_en = Column(DateTime)
+
+    # Índice para reclamar rápidamente los correos pendientes
+    __table_args__ = (
+        Index("ix_correos_salientes_estado_proximo", "estado", "proximo_intento"),
+    )
+
+    # Relación con InformeCompartido (muchos a uno)
+    informe = relationship("InformeCompartido", back_populates="correos")
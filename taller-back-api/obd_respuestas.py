@@ -0,0 +1,124 @@
+"""
+Interpretación de las respuestas del adaptador ELM327 que usa el cliente de escritorio (`client.py`).
+
+Son funciones puras sobre las líneas de texto que devuelve el adaptador, sin puerto serie ni Tk,
+para poder probarlas por separado. Las tramas incompletas o con texto del adaptador
+(``NO DATA``, ``SEARCHING...``, ``CAN ERROR``...) se ignoran en lugar de lanzar excepciones.
+"""
+import string
+
+# PIDs del modo 01 -> (nombre, bytes de datos, conversión a unidades físicas)
+PIDS_MODO_01 = {
+    "04": ("carga_motor", 1, lambda d: d[0] * 100 / 255),
+    "05": ("temp_refrigerante", 1, lambda d: d[0] - 40),
+    "0B": ("presion_admision", 1, lambda d: d[0]),
+    "0C": ("rpm", 2, lambda d: (d[0] * 256 + d[1]) / 4),
+    "0D": ("velocidad", 1, lambda d: d[0]),
+    "0F": ("temp_admision", 1, lambda d: d[0] - 40),
+    "10": ("caudal_aire", 2, lambda d: (d[0] * 256 + d[1]) / 100),
+    "11": ("acelerador", 1, lambda d: d[0] * 100 / 255),
+}
+# Lectura de DTC: modo -> (byte de respuesta, tipo de código)
+MODOS_DTC = {
+    "03": (0x43, "almacenados"),
+    "07": (0x47, "pendientes"),
+    "0A": (0x4A, "permanentes"),
+}
+SISTEMAS_DTC = "PCBU"                   # Letra del código según los dos bits altos del primer byte
+PROTOCOLOS_CAN = {"6", "7", "8", "9"}   # ATDPN; en CAN la respuesta incluye el número de códigos
+LONGITUD_VIN = 17
+
+def bytes_respuesta(lineas):
+    # Une las tramas de la respuesta (con o sin espacios) en una lista de bytes
+    datos = []
+    for linea in lineas:
+        if ":" in linea:
+            linea = linea.split(":", 1)[1]  # Trama de una respuesta CAN multi-trama ("0: 41 0C ...")
+        elif len(linea.replace(" ", "")) <= 3:
+            continue  # Longitud total de una respuesta multi-trama ("00A")
+        hexa = linea.replace(" ", "")
+        try:
+            datos += [int(hexa[i:i + 2], 16) for i in range(0, len(hexa) - 1, 2)]
+        except ValueError:
+            continue  # SEARCHING..., NO DATA, etc.
+    return datos
+
+def mensajes_respuesta(lineas):
+    # Separa la respuesta por mensaje: cada ECU responde con una línea (trama única) o con
+    # la longitud total ("00E") seguida de tramas numeradas ("0: ...", "1: ..."), con relleno al final
+    grupos = []
+    for linea in lineas:
+        compacta = linea.replace(" ", "")
+        if len(compacta) == 3 and all(c in string.hexdigits for c in compacta):
+            grupos.append((int(compacta, 16), []))
+        elif ":" in linea and grupos and grupos[-1][0] is not None:
+            grupos[-1][1].append(linea)
+        else:
+            grupos.append((None, [linea]))
+    mensajes = []
+    for longitud, grupo in grupos:
+        datos = bytes_respuesta(grupo)
+        if datos:
+            mensajes.append(datos[:longitud] if longitud else datos)
+    return mensajes
+
+def decodificar_dtc(a, b):
+    return f"{SISTEMAS_DTC[a >> 6]}{(a >> 4) & 0x3}{a & 0xF:X}{b:02X}"
+
+def interpretar_dtc(lineas, modo, can):
+    respuesta, _ = MODOS_DTC[modo]
+    codigos = []
+    for mensaje in mensajes_respuesta(lineas):
+        if mensaje[0] != respuesta:
+            continue
+        if can:
+            datos = mensaje[2:2 + 2 * mensaje[1]] if len(mensaje) > 1 else []
+        else:
+            datos = mensaje[1:]  # Sin byte de número de códigos; 3 códigos por línea, rellenos con 00 00
+        for i in range(0, len(datos) - 1, 2):
+            if datos[i] or datos[i + 1]:
+                codigo = decodificar_dtc(datos[i], datos[i + 1])
+                if codigo not in codigos:
+                    codigos.append(codigo)
+    return codigos
+
+def interpretar_multi_pid(lineas):
+    # Cada ECU que responde envía su propio mensaje "41 PID datos [PID datos...]"; un PID desconocido
+    # o sin todos sus bytes termina el mensaje
+    valores = {}
+    for mensaje in mensajes_respuesta(lineas):
+        if mensaje[0] != 0x41:
+            continue
+        i = 1
+        while i < len(mensaje):
+            pid = f"{mensaje[i]:02X}"
+            if pid not in PIDS_MODO_01:
+                break
+            _, longitud, convertir = PIDS_MODO_01[pid]
+            if i + 1 + longitud > len(mensaje):
+                break
+            valores.setdefault(pid, convertir(mensaje[i + 1:i + 1 + longitud]))
+            i += 1 + longitud
+    return valores
+
+def interpretar_respuesta_vin(respuesta):
+    # "49 02" + número de mensaje/tramas + caracteres ASCII; en ISO/KWP llega en 5 líneas de 4 bytes
+    # y la primera va rellena con 00
+    vin = ""
+    for mensaje in mensajes_respuesta(respuesta):
+        if mensaje[:2] == [0x49, 0x02]:
+            vin += "".join(chr(b) for b in mensaje[3:] if 0x20 < b < 0x7F)
+    return vin if vin else "DESCONOCIDO"
+
+def leer_vin(respuesta):
+    # Sin un VIN real el escaneo no se puede asociar a ningún vehículo: no se guarda ni se envía
+    vin = interpretar_respuesta_vin(respuesta)
+    if len(vin) != LONGITUD_VIN:
+        raise RuntimeError("No se pudo leer el VIN del vehículo.")
+    return vin
+
+def interpretar_respuesta_rpm(respuesta):
+    return interpretar_multi_pid(respuesta).get("0C", 0)
+
+def interpretar_respuesta_velocidad(respuesta):
+    return interpretar_multi_pid(respuesta).get("0D", 0)
@@ -1,11 +1,13 @@
 import pytest
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from main import Base, get_db, app
-from fastapi_mail import FastMail
-from unittest.mock import AsyncMock
+from main import Base, get_db, app, cache_principales, cache_informes, activar_claves_foraneas
 from httpx import AsyncClient, ASGITransport
+from pathlib import Path
+import importlib.util
 import os
+import main
 
 # Configura la URL para usar una base SQLite en disco, así todas las conexiones
 # comparten la misma base de datos durante los tests.
@@ -13,26 +15,36 @@ SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
 
 # Crea el motor de base de datos con conexión para múltiples threads (check_same_thread=False)
 engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+activar_claves_foraneas(engine)
 
 # Crea la sesión local para SQLAlchemy usando el engine creado.
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Motor asíncrono (aiosqlite) sobre el mismo archivo, usado por los endpoints.
+async_engine = create_async_engine("sqlite+aiosqlite:///./test.db")
+activar_claves_foraneas(async_engine.sync_engine)
+TestingAsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 # Sobrescribe la dependencia get_db en FastAPI para que use esta sesión de test.
-def override_get_db():
-    db = TestingSessionLocal()
-    try:
+async def override_get_db():
+    async with TestingAsyncSessionLocal() as db:
         yield db
-        db.commit()  # Hace commit explícito para guardar los cambios realizados durante el test.
-    finally:
-        db.close()  # Cierra la sesión siempre para liberar recursos.
+        await db.commit()  # Hace commit explícito para guardar los cambios realizados durante el test.
 
 app.dependency_overrides[get_db] = override_get_db
 
-# Fixture automático que parchea FastMail para evitar envíos reales de correos en tests.
+# Fixture automático que evita que los endpoints despierten al enviador de correos real.
+# Los correos quedan en la bandeja de salida y los tests que lo necesiten los envían
+# con su propio EnviadorCorreos contra un servidor SMTP local.
 @pytest.fixture(autouse=True)
 def mock_mail(monkeypatch):
-    mock_fm = AsyncMock(spec=FastMail)  # Creamos un mock asíncrono de FastMail.
-    monkeypatch.setattr("main.fm", mock_fm)  # Reemplazamos la instancia original con el mock.
+    monkeypatch.setattr("main.enviador_correos.notificar", lambda: None)
+
+# Fixture automático para que las importaciones en segundo plano usen la base de datos de test.
+@pytest.fixture(autouse=True)
+def importador_test(monkeypatch, tmp_path):
+    monkeypatch.setattr("main.importador.fabrica_sesiones", TestingSessionLocal)
+    monkeypatch.setattr("main.IMPORTACION_DIR", tmp_path)
 
 # Fixture automático para limpiar la base de datos antes de cada test,
 # eliminando todas las tablas y creándolas desde cero.
@@ -40,6 +52,8 @@ def mock_mail(monkeypatch):
 def clear_db():
     Base.metadata.drop_all(bind=engine)  # Borra todas las tablas.
     Base.metadata.create_all(bind=engine)  # Crea las tablas nuevas limpias.
+    cache_principales.limpiar()  # Evita reutilizar usuarios cacheados de tests anteriores.
+    cache_informes.limpiar()
 
 # Configuración para usar el backend asyncio con pytest-anyio para tests asíncronos.
 @pytest.fixture
@@ -53,6 +67,38 @@ async def client():
     async with AsyncClient(transport=transport, base_url="http://test") as ac:
         yield ac  # Provee el cliente para usar en los tests.
 
+# Segunda copia de la aplicación, con sus propias cachés, sobre la misma base de datos de test.
+# Simula otro worker de gunicorn; se carga una sola vez porque importar main registra eventos ORM.
+# En un mismo proceso los eventos ORM de main invalidarían también su caché cuando el cambio lo
+# hace la segunda copia, así que mientras se usa se desactivan: los cambios se hacen en `otro_worker`
+# y `client` solo comparte con él la base de datos.
+segundo_worker = None
+EVENTOS_USUARIO = ("after_update", "after_delete")
+
+@pytest.fixture
+async def otro_worker():
+    global segundo_worker
+    if segundo_worker is None:
+        spec = importlib.util.spec_from_file_location("main_otro_worker", Path(__file__).parent.parent / "main.py")
+        segundo_worker = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(segundo_worker)
+        # Los procesos de bcrypt no pueden importar esta copia: se usan las funciones y el pool de main
+        segundo_worker._hashear_en_worker = main._hashear_en_worker
+        segundo_worker._verificar_en_worker = main._verificar_en_worker
+        segundo_worker.pool_passwords = main.pool_passwords
+        segundo_worker.app.dependency_overrides[segundo_worker.get_db] = override_get_db
+    segundo_worker.cache_principales.limpiar()
+    segundo_worker.cache_informes.limpiar()
+    for evento in EVENTOS_USUARIO:
+        event.remove(main.Usuario, evento, main.invalidar_principal)
+    transport = ASGITransport(app=segundo_worker.app)
+    try:
+        async with AsyncClient(transport=transport, base_url="http://test") as ac:
+            yield ac
+    finally:
+        for evento in EVENTOS_USUARIO:
+            event.listen(main.Usuario, evento, main.invalidar_principal)
+
 # Fixture para limpiar el archivo de base de datos SQLite al final de toda la sesión de tests.
 # Evita acumular archivos de test viejos en el sistema.
 @pytest.fixture(scope="session", autouse=True)
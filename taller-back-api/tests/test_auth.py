@@ -1,3 +1,4 @@
+import anyio
 import pytest
 
 @pytest.mark.anyio
@@ -14,3 +15,85 @@ async def test_login_usuario(client):
     resp = await client.post("/login", json={"username": "usuario2", "password": "clave123"})
     assert resp.status_code == 200
     assert "access_token" in resp.json()
+
+@pytest.mark.anyio
+async def test_cache_de_usuario_y_revocacion(client):
+    await client.post("/register", json={"username": "usuario3", "password": "clave123"})
+    login = await client.post("/login", json={"username": "usuario3", "password": "clave123"})
+    headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+    await client.get("/mis-vehiculos/", headers=headers)
+    await client.get("/mis-vehiculos/", headers=headers)
+    metricas = (await client.get("/metricas/cache-auth")).json()
+    assert metricas["fallos"] == 1 and metricas["aciertos"] == 1
+
+    # Cambiar la contraseña revoca el token anterior
+    resp = await client.post("/cambiar-password", headers=headers, json={
+        "password_actual": "clave123", "password_nueva": "nueva123"
+    })
+    assert resp.status_code == 200
+    assert (await client.get("/mis-vehiculos/", headers=headers)).status_code == 401
+
+    nuevo = {"Authorization": f"Bearer {resp.json()['access_token']}"}
+    assert (await client.get("/mis-vehiculos/", headers=nuevo)).status_code == 200
+
+@pytest.mark.anyio
+async def test_revocacion_entre_workers(client, otro_worker, monkeypatch):
+    monkeypatch.setattr("main.cache_principales.ttl", 3)
+    await client.post("/register", json={"username": "usuario6", "password": "clave123"})
+    login = await client.post("/login", json={"username": "usuario6", "password": "clave123"})
+    headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+    # Ambos workers tienen el usuario en su caché
+    assert (await client.get("/mis-vehiculos/", headers=headers)).status_code == 200
+    assert (await otro_worker.get("/mis-vehiculos/", headers=headers)).status_code == 200
+
+    # El cambio de contraseña revoca el token de inmediato en el worker que lo atiende...
+    resp = await otro_worker.post("/cambiar-password", headers=headers, json={
+        "password_actual": "clave123", "password_nueva": "nueva123"
+    })
+    assert resp.status_code == 200
+    assert (await otro_worker.get("/mis-vehiculos/", headers=headers)).status_code == 401
+
+    # ...y en el otro, sin consultar la base de datos, en cuanto caduca su entrada (AUTH_CACHE_TTL)
+    assert (await client.get("/mis-vehiculos/", headers=headers)).status_code == 200
+    await anyio.sleep(3.1)
+    assert (await client.get("/mis-vehiculos/", headers=headers)).status_code == 401
+
+    nuevo = {"Authorization": f"Bearer {resp.json()['access_token']}"}
+    assert (await client.get("/mis-vehiculos/", headers=nuevo)).status_code == 200
+
+@pytest.mark.anyio
+async def test_token_sin_version_rechazado(client):
+    from main import crear_token
+    await client.post("/register", json={"username": "usuario7", "password": "clave123"})
+    antiguo = crear_token({"sub": "usuario7"})
+    assert (await client.get("/mis-vehiculos/", headers={"Authorization": f"Bearer {antiguo}"})).status_code == 401
+
+@pytest.mark.anyio
+async def test_pool_passwords_saturado(client, monkeypatch):
+    monkeypatch.setattr("main.pool_passwords.max_pendientes", 0)
+    resp = await client.post("/register", json={"username": "usuario4", "password": "clave123"})
+    assert resp.status_code == 503
+    assert resp.headers["Retry-After"]
+
+@pytest.mark.anyio
+async def test_login_rehash_transparente(client, monkeypatch):
+    from passlib.context import CryptContext
+    from main import Usuario
+    from conftest import TestingSessionLocal
+
+    # Usuario con un hash de coste antiguo
+    antiguo = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash("clave123")
+    db = TestingSessionLocal()
+    db.add(Usuario(username="usuario5", password_hash=antiguo))
+    db.commit()
+
+    monkeypatch.setattr("main.PASSWORD_REHASH", True)
+    resp = await client.post("/login", json={"username": "usuario5", "password": "clave123"})
+    assert resp.status_code == 200
+
+    db.expire_all()
+    nuevo = db.query(Usuario).filter_by(username="usuario5").first().password_hash
+    db.close()
+    assert nuevo != antiguo and nuevo.startswith("$2b$12$")
@@ -21,3 +21,121 @@ async def test_guardar_errores(client):
     consult = await client.get(f"/mis-errores/{id_vehiculo}", headers=headers)
     assert consult.status_code == 200
     assert len(consult.json()) == 2
+
+@pytest.mark.anyio
+async def test_guardar_errores_repetidos_no_duplica(client):
+    await client.post("/register", json={"username": "erroruser2", "password": "clave123"})
+    login = await client.post("/login", json={"username": "erroruser2", "password": "clave123"})
+    headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+    vehiculo = await client.post("/guardar-vehiculo/", headers=headers, json={
+        "marca": "Mazda", "modelo": "6", "year": 2017, "rpm": 900, "velocidad": 0,
+        "vin": "JM1GJ1W50H0000000", "revision": {}
+    })
+    id_vehiculo = vehiculo.json()["id"]
+
+    for codigos in (["P0300", "P0420"], ["P0300"]):
+        resp = await client.post("/guardar-errores/", headers=headers, json={"vehiculo_id": id_vehiculo, "codigo_dtc": codigos})
+        assert resp.status_code == 200
+
+    errores = {e["codigo_dtc"]: e for e in (await client.get(f"/mis-errores/{id_vehiculo}", headers=headers)).json()}
+    assert len(errores) == 2
+    assert errores["P0300"]["ocurrencias"] == 2
+    assert errores["P0420"]["ocurrencias"] == 1
+
+@pytest.mark.anyio
+async def test_estadisticas_dtc(client):
+    await client.post("/register", json={"username": "statsuser", "password": "clave123"})
+    login = await client.post("/login", json={"username": "statsuser", "password": "clave123"})
+    headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+    vehiculos = [("Mazda", "3", 2020, "JM1BPAAL000000001"), ("Mazda", "3", 2020, "JM1BPAAL000000002"), ("Seat", "Leon", 2015, "VSSZZZ5FZFR000003")]
+    ids = []
+    for marca, modelo, year, vin in vehiculos:
+        resp = await client.post("/guardar-vehiculo/", headers=headers, json={
+            "marca": marca, "modelo": modelo, "year": year, "rpm": 800, "velocidad": 0, "vin": vin, "revision": {}
+        })
+        ids.append(resp.json()["id"])
+
+    for vehiculo_id, codigos in ((ids[0], ["P0300", "P0420"]), (ids[1], ["P0300"]), (ids[2], ["P0300", "P0171"]), (ids[0], ["P0300"])):
+        await client.post("/guardar-errores/", headers=headers, json={"vehiculo_id": vehiculo_id, "codigo_dtc": codigos})
+
+    resp = await client.get("/estadisticas/dtc", headers=headers, params={"limite": 2})
+    assert resp.status_code == 200
+    datos = resp.json()
+    assert datos["codigos"][0] == {"codigo_dtc": "P0300", "detecciones": 4}
+    assert len(datos["codigos"]) == 2
+    assert {t["codigo_dtc"] for t in datos["tendencia"]} == {c["codigo_dtc"] for c in datos["codigos"]}
+    assert {m["marca"]: m["detecciones"] for m in datos["por_marca"]} == {"Mazda": 4, "Seat": 2}
+    assert [y["year"] for y in datos["por_year"]] == [2015, 2020]
+
+    filtrado = await client.get("/estadisticas/dtc", headers=headers, params={"codigo": "P0171"})
+    assert filtrado.json()["por_marca"] == [{"marca": "Seat", "detecciones": 1}]
+
+    invalido = await client.get("/estadisticas/dtc", headers=headers, params={"desde": "2024-13"})
+    assert invalido.status_code == 400
+
+@pytest.mark.anyio
+async def test_eliminar_vehiculo_resta_estadisticas_dtc(client):
+    await client.post("/register", json={"username": "statsborrado", "password": "clave123"})
+    login = await client.post("/login", json={"username": "statsborrado", "password": "clave123"})
+    headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+    ids = []
+    for vin in ("WVWZZZ1KZAW000001", "WVWZZZ1KZAW000002"):
+        resp = await client.post("/guardar-vehiculo/", headers=headers, json={
+            "marca": "Volkswagen", "modelo": "Golf", "year": 2010, "rpm": 800, "velocidad": 0, "vin": vin, "revision": {}
+        })
+        ids.append(resp.json()["id"])
+    for vehiculo_id, codigos in ((ids[0], ["P0300", "P0171"]), (ids[1], ["P0300"]), (ids[0], ["P0300"])):
+        await client.post("/guardar-errores/", headers=headers, json={"vehiculo_id": vehiculo_id, "codigo_dtc": codigos})
+
+    async def detecciones():
+        datos = (await client.get("/estadisticas/dtc", headers=headers)).json()
+        return {c["codigo_dtc"]: c["detecciones"] for c in datos["codigos"]}
+
+    assert await detecciones() == {"P0300": 3, "P0171": 1}
+    assert (await client.delete(f"/eliminar-vehiculo/{ids[0]}", headers=headers)).status_code == 200
+    assert await detecciones() == {"P0300": 1}
+    assert (await client.delete(f"/eliminar-vehiculo/{ids[1]}", headers=headers)).status_code == 200
+    assert await detecciones() == {}
+
+@pytest.mark.anyio
+async def test_mis_errores_paginado_y_filtrado(client):
+    cabeceras = {}
+    for nombre in ("pagerror1", "pagerror2"):
+        await client.post("/register", json={"username": nombre, "password": "clave123"})
+        login = await client.post("/login", json={"username": nombre, "password": "clave123"})
+        cabeceras[nombre] = {"Authorization": f"Bearer {login.json()['access_token']}"}
+    headers = cabeceras["pagerror1"]
+
+    vehiculo = await client.post("/guardar-vehiculo/", headers=headers, json={
+        "marca": "Kia", "modelo": "Ceed", "year": 2019, "rpm": 800, "velocidad": 0,
+        "vin": "U5YHN000000000001", "revision": {}
+    })
+    id_vehiculo = vehiculo.json()["id"]
+    codigos = ["P0300", "P0301", "P0302", "P0420", "U0100"]
+    await client.post("/guardar-errores/", headers=headers, json={"vehiculo_id": id_vehiculo, "codigo_dtc": codigos})
+
+    # Otro usuario no puede leer los errores del vehículo
+    ajeno = await client.get(f"/mis-errores/{id_vehiculo}", headers=cabeceras["pagerror2"])
+    assert ajeno.status_code == 404
+
+    vistos, cursor = [], None
+    while True:
+        resp = await client.get(f"/mis-errores/{id_vehiculo}", headers=headers, params={"limite": 2, **({"cursor": cursor} if cursor else {})})
+        assert resp.status_code == 200
+        vistos += [e["codigo_dtc"] for e in resp.json()]
+        cursor = resp.headers.get("X-Siguiente-Cursor")
+        if not cursor:
+            break
+    assert vistos == codigos
+
+    filtrado = await client.get(f"/mis-errores/{id_vehiculo}", headers=headers, params={"codigo": "p03"})
+    assert [e["codigo_dtc"] for e in filtrado.json()] == ["P0300", "P0301", "P0302"]
+
+    futuro = await client.get(f"/mis-errores/{id_vehiculo}", headers=headers, params={"desde": "2999-01-01T00:00:00"})
+    assert futuro.status_code == 200 and futuro.json() == []
+
+    invertido = await client.get(f"/mis-errores/{id_vehiculo}", headers=headers, params={"desde": "2024-02-01T00:00:00", "hasta": "2024-01-01T00:00:00"})
+    assert invertido.status_code == 400
@@ -0,0 +1,51 @@
+import pytest
+
+CSV_IMPORTACION = """marca,modelo,year,vin,rpm,velocidad,revision,codigos_dtc
+Toyota,Yaris,2015,VNKKG0000000000A1,800,0,"{""Frenos"": [""Pastillas""]}",P0300;P0420
+Toyota,Auris,2016,VNKKG0000000000A2,,,,
+Toyota,Auris,2016,CORTO,,,,
+Seat,Ibiza,no-es-año,VSSZZZ6JZ00000003,,,,
+Seat,Ibiza,2019,VNKKG0000000000A1,,,,
+Seat,Leon,2019,VSSZZZ5FZ00000004,,,{mal json,
+Seat,Leon,2019,YA0REGISTRADO0001,,,,
+"""
+
+async def autenticar(client, username):
+    await client.post("/register", json={"username": username, "password": "clave123"})
+    login = await client.post("/login", json={"username": username, "password": "clave123"})
+    return {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+@pytest.mark.anyio
+async def test_importar_csv_en_segundo_plano(client, monkeypatch):
+    monkeypatch.setattr("main.importador.lote", 3)  # Fuerza varios bloques
+    headers = await autenticar(client, "importuser")
+    await client.post("/guardar-vehiculo/", headers=headers, json={
+        "marca": "Kia", "modelo": "Ceed", "year": 2018, "rpm": 0, "velocidad": 0, "vin": "YA0REGISTRADO0001", "revision": {}
+    })
+
+    resp = await client.post("/importar", headers=headers, files={"archivo": ("historico.csv", CSV_IMPORTACION, "text/csv")})
+    assert resp.status_code == 202
+    importacion_id = resp.json()["id"]
+
+    estado = (await client.get(f"/importar/{importacion_id}", headers=headers)).json()
+    assert estado["estado"] == "completada"
+    assert (estado["filas_procesadas"], estado["filas_importadas"], estado["filas_con_error"]) == (7, 2, 5)
+    assert [e["fila"] for e in estado["errores"]] == [4, 5, 6, 7, 8]
+    assert "VIN" in estado["errores"][0]["detalle"]
+
+    vehiculos = (await client.get("/mis-vehiculos/", headers=headers)).json()["vehiculos"]
+    importado = next(v for v in vehiculos if v["vin"] == "VNKKG0000000000A1")
+    assert importado["revision"] == {"Frenos": ["Pastillas"]}
+    errores = (await client.get(f"/mis-errores/{importado['id']}", headers=headers)).json()
+    assert {e["codigo_dtc"] for e in errores} == {"P0300", "P0420"}
+
+    # Otro usuario no ve el trabajo
+    otro = await autenticar(client, "otrouser")
+    assert (await client.get(f"/importar/{importacion_id}", headers=otro)).status_code == 404
+
+@pytest.mark.anyio
+async def test_importar_rechaza_cabecera_incompleta(client):
+    headers = await autenticar(client, "importuser2")
+    resp = await client.post("/importar", headers=headers, files={"archivo": ("malo.csv", "marca,modelo\nSeat,Ibiza\n", "text/csv")})
+    assert resp.status_code == 400
+    assert "year" in resp.json()["detail"]
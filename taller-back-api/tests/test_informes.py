@@ -1,3 +1,4 @@
+import anyio
 import pytest
 
 @pytest.mark.anyio
@@ -21,3 +22,107 @@ async def test_crear_y_ver_informe(client):
     ver_informe = await client.get(f"/informe/{token_informe}")
     assert ver_informe.status_code == 200
     assert "vehiculo" in ver_informe.json()
+
+@pytest.mark.anyio
+async def test_informe_cacheado_y_condicional(client):
+    await client.post("/register", json={"username": "informeuser2", "password": "clave123"})
+    login = await client.post("/login", json={"username": "informeuser2", "password": "clave123"})
+    headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+    vehiculo = await client.post("/guardar-vehiculo/", headers=headers, json={
+        "marca": "Opel", "modelo": "Corsa", "year": 2016, "rpm": 800, "velocidad": 0,
+        "vin": "W0L0XCF0000000000", "revision": {}
+    })
+    id_vehiculo = vehiculo.json()["id"]
+    informe = await client.post(f"/crear-informe/{id_vehiculo}", headers=headers, json={"email": "cliente@correo.com"})
+    url = f"/informe/{informe.json()['token']}"
+
+    primera = await client.get(url)
+    assert primera.status_code == 200
+    etag = primera.headers["ETag"]
+    assert primera.headers["Last-Modified"]
+
+    no_modificado = await client.get(url, headers={"If-None-Match": etag})
+    assert no_modificado.status_code == 304
+
+    # Nuevos errores invalidan el informe cacheado
+    await client.post("/guardar-errores/", headers=headers, json={"vehiculo_id": id_vehiculo, "codigo_dtc": ["P0128"]})
+    actualizado = await client.get(url, headers={"If-None-Match": etag})
+    assert actualizado.status_code == 200
+    assert actualizado.json()["errores"] == ["P0128"]
+
+@pytest.mark.anyio
+async def test_informe_de_vehiculo_eliminado_en_otro_worker(client, otro_worker, monkeypatch):
+    monkeypatch.setattr("main.cache_informes.ttl", 1)
+    await client.post("/register", json={"username": "informeuser4", "password": "clave123"})
+    login = await client.post("/login", json={"username": "informeuser4", "password": "clave123"})
+    headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+    vehiculo = await client.post("/guardar-vehiculo/", headers=headers, json={
+        "marca": "Renault", "modelo": "Clio", "year": 2014, "rpm": 800, "velocidad": 0,
+        "vin": "VF1BR000000000000", "revision": {}
+    })
+    id_vehiculo = vehiculo.json()["id"]
+    informe = await client.post(f"/crear-informe/{id_vehiculo}", headers=headers, json={"email": "cliente@correo.com"})
+    url = f"/informe/{informe.json()['token']}"
+    primera = await client.get(url)
+    assert primera.status_code == 200
+
+    # El worker que elimina el vehículo deja de servir el informe de inmediato; el otro lo sigue
+    # sirviendo desde su caché, sin consultar la base de datos, hasta que caduca (INFORME_CACHE_TTL)
+    assert (await otro_worker.delete(f"/eliminar-vehiculo/{id_vehiculo}", headers=headers)).status_code == 200
+    assert (await otro_worker.get(url)).status_code == 404
+    from sqlalchemy import event
+    from conftest import async_engine
+    consultas = []
+    contar = lambda *args: consultas.append(args[2])
+    event.listen(async_engine.sync_engine, "before_cursor_execute", contar)
+    try:
+        assert (await client.get(url, headers={"If-None-Match": primera.headers["ETag"]})).status_code == 304
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", contar)
+    assert consultas == []
+    await anyio.sleep(1.1)
+    assert (await client.get(url)).status_code == 404
+
+@pytest.mark.anyio
+async def test_envio_correo_desde_bandeja_de_salida(client, unused_tcp_port):
+    from aiosmtpd.controller import Controller
+    from conftest import TestingSessionLocal
+    from main import EnviadorCorreos
+
+    class Buzon:
+        def __init__(self):
+            self.mensajes = []
+
+        async def handle_DATA(self, server, session, envelope):
+            self.mensajes.append(envelope)
+            return "250 OK"
+
+    await client.post("/register", json={"username": "informeuser3", "password": "clave123"})
+    login = await client.post("/login", json={"username": "informeuser3", "password": "clave123"})
+    headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+    vehiculo = await client.post("/guardar-vehiculo/", headers=headers, json={
+        "marca": "Fiat", "modelo": "Punto", "year": 2012, "rpm": 800, "velocidad": 0,
+        "vin": "ZFA19900000000000", "revision": {}
+    })
+    tokens = []
+    for email in ("uno@correo.com", "dos@correo.com"):
+        informe = await client.post(f"/crear-informe/{vehiculo.json()['id']}", headers=headers, json={"email": email})
+        tokens.append(informe.json()["token"])
+
+    estado = await client.get(f"/estado-envio/{tokens[0]}", headers=headers)
+    assert estado.json()["estado"] == "pendiente"
+
+    buzon = Buzon()
+    controlador = Controller(buzon, hostname="127.0.0.1", port=unused_tcp_port)
+    controlador.start()
+    try:
+        enviador = EnviadorCorreos(TestingSessionLocal, "127.0.0.1", unused_tcp_port, "taller@test.com")
+        assert await enviador.procesar_lote() == 2
+    finally:
+        controlador.stop()
+
+    assert sorted(m.rcpt_tos[0] for m in buzon.mensajes) == ["dos@correo.com", "uno@correo.com"]
+    estado = await client.get(f"/estado-envio/{tokens[0]}", headers=headers)
+    assert estado.json()["estado"] == "enviado"
@@ -0,0 +1,52 @@
+import gzip
+import json
+
+import pytest
+
+@pytest.mark.anyio
+async def test_ingesta_lote(client):
+    await client.post("/register", json={"username": "loteuser", "password": "clave123"})
+    login = await client.post("/login", json={"username": "loteuser", "password": "clave123"})
+    headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+    base = {"marca": "Renault", "modelo": "Clio", "year": 2018, "rpm": 850, "velocidad": 0, "revision": {"Motor": ["Aceite"]}}
+    lote = {"vehiculos": [
+        {**base, "vin": "VF1RB000000000001", "errores": ["P0300", "P0171"]},
+        {**base, "vin": "VF1RB000000000002"},
+        {**base, "vin": "CORTO"},
+        {**base, "vin": "VF1RB000000000001"},
+        {**base, "vin": "1HGCM82633A123456"},
+    ]}
+    resp = await client.post("/ingesta/lote", headers=headers, json=lote)
+    assert resp.status_code == 200
+    datos = resp.json()
+    assert datos["guardados"] == 2 and datos["fallidos"] == 3
+    estados = [r["estado"] for r in datos["resultados"]]
+    assert estados == ["creado", "creado", "error", "error", "error"]
+    # El VIN de ejemplo de un escaneo sin VIN no crea ni sobrescribe ningún vehículo
+    assert "ejemplo" in datos["resultados"][4]["detalle"]
+
+    id_vehiculo = datos["resultados"][0]["id"]
+    errores = await client.get(f"/mis-errores/{id_vehiculo}", headers=headers)
+    assert len(errores.json()) == 2
+
+    # Reenviar un VIN propio actualiza el vehículo existente
+    resp = await client.post("/ingesta/lote", headers=headers, json={"vehiculos": [{**base, "rpm": 900, "vin": "VF1RB000000000002"}]})
+    assert resp.json()["resultados"][0]["estado"] == "actualizado"
+    vehiculo = await client.get(f"/mis-vehiculos/{resp.json()['resultados'][0]['id']}", headers=headers)
+    assert vehiculo.json()["rpm"] == 900
+
+@pytest.mark.anyio
+async def test_ingesta_lote_comprimido(client):
+    await client.post("/register", json={"username": "lotegzip", "password": "clave123"})
+    login = await client.post("/login", json={"username": "lotegzip", "password": "clave123"})
+    headers = {"Authorization": f"Bearer {login.json()['access_token']}", "Content-Type": "application/json"}
+
+    lote = {"vehiculos": [{"marca": "Dacia", "modelo": "Sandero", "year": 2020, "rpm": 800, "velocidad": 0, "revision": {},
+                           "vin": "UU1GZIP0000000001", "errores": ["P0420"]}]}
+    resp = await client.post("/ingesta/lote", headers={**headers, "Content-Encoding": "gzip"}, content=gzip.compress(json.dumps(lote).encode()))
+    assert resp.status_code == 200
+    assert resp.json()["resultados"][0]["estado"] == "creado"
+
+    resp = await client.post("/ingesta/lote", headers={**headers, "Content-Encoding": "gzip"}, content=b"no es gzip")
+    assert resp.status_code == 400
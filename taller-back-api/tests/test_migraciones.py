@@ -0,0 +1,107 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from sqlalchemy import Column, ForeignKey, Integer, MetaData, String, Table, create_engine, inspect, text
+
+from main import ALEMBIC_INI, Base, verificar_esquema
+
+def migrar(motor, revision="head"):
+    config = Config(str(ALEMBIC_INI))
+    with motor.begin() as conexion:
+        config.attributes["conexion"] = conexion
+        command.upgrade(config, revision)
+
+def test_migraciones_crean_el_esquema_de_los_modelos(tmp_path):
+    motor = create_engine(f"sqlite:///{tmp_path / 'nueva.db'}")
+    with pytest.raises(RuntimeError):
+        verificar_esquema(motor)
+
+    migrar(motor)
+    verificar_esquema(motor)
+    with motor.connect() as conexion:
+        assert compare_metadata(MigrationContext.configure(conexion), Base.metadata) == []
+
+def test_migraciones_adoptan_base_de_datos_anterior(tmp_path):
+    motor = create_engine(f"sqlite:///{tmp_path / 'anterior.db'}")
+    # Esquema creado con create_all por la primera versión de la API
+    anterior = MetaData()
+    Table("usuarios", anterior,
+          Column("id", Integer, primary_key=True, index=True),
+          Column("username", String(255), unique=True, index=True),
+          Column("password_hash", String(255)))
+    Table("vehiculos", anterior,
+          Column("id", Integer, primary_key=True, index=True),
+          Column("marca", String(255), index=True),
+          Column("modelo", String(255)),
+          Column("year", Integer),
+          Column("rpm", Integer),
+          Column("velocidad", Integer),
+          Column("vin", String(17), unique=True, nullable=False),
+          Column("revision", String(255)),
+          Column("usuario_id", Integer, ForeignKey("usuarios.id")))
+    Table("errores_vehiculos", anterior,
+          Column("id", Integer, primary_key=True, index=True),
+          Column("vehiculo_id", Integer, ForeignKey("vehiculos.id")),
+          Column("codigo_dtc", String(255)))
+    Table("informes_compartidos", anterior,
+          Column("id", Integer, primary_key=True),
+          Column("token", String(100), unique=True, index=True),
+          Column("vehiculo_id", Integer, ForeignKey("vehiculos.id")),
+          Column("email_cliente", String(255)),
+          Column("creado_en", String(255)))
+    anterior.create_all(motor)
+    with motor.begin() as conexion:
+        conexion.execute(text("INSERT INTO usuarios (id, username, password_hash) VALUES (1, 'antiguo', 'x')"))
+        # Revisiones guardadas con str(dict); la segunda quedó truncada por la antigua columna String(255)
+        conexion.execute(text(
+            "INSERT INTO vehiculos (id, marca, modelo, year, vin, revision, usuario_id) "
+            "VALUES (1, 'Seat', 'Ibiza', 2010, 'VSSZZZ6JZAR000001', :antigua, 1), "
+            "(2, 'Seat', 'Leon', 2012, 'VSSZZZ6JZAR000002', :truncada, 1)"
+        ), {"antigua": str({"Frenos": ["Pastillas"]}), "truncada": "{'Frenos': ['Pastil"})
+        conexion.execute(text(
+            "INSERT INTO errores_vehiculos (vehiculo_id, codigo_dtc) VALUES (1, 'P0300'), (1, 'P0300'), (1, 'P0420')"
+        ))
+
+    migrar(motor)
+    verificar_esquema(motor)
+
+    with motor.connect() as conexion:
+        assert compare_metadata(MigrationContext.configure(conexion), Base.metadata) == []
+        errores = dict(conexion.execute(text("SELECT codigo_dtc, ocurrencias FROM errores_vehiculos")).all())
+        revisiones = dict(conexion.execute(text("SELECT id, revision FROM vehiculos")).all())
+        items = conexion.execute(text("SELECT vehiculo_id, parte, detalle FROM revision_items ORDER BY vehiculo_id")).all()
+        estadisticas = dict(conexion.execute(text("SELECT codigo_dtc, detecciones FROM estadisticas_dtc")).all())
+        aportaciones = dict(conexion.execute(text(
+            "SELECT e.codigo_dtc, d.detecciones FROM detecciones_dtc d JOIN estadisticas_dtc e ON e.id = d.estadistica_id "
+            "WHERE d.vehiculo_id = 1"
+        )).all())
+    assert errores == {"P0300": 2, "P0420": 1}
+    assert json.loads(revisiones[1]) == {"Frenos": ["Pastillas"]}
+    assert json.loads(revisiones[2]) == {"sin_clasificar": ["{'Frenos': ['Pastil"]}
+    assert [tuple(i) for i in items] == [(1, "Frenos", "Pastillas"), (2, "sin_clasificar", "{'Frenos': ['Pastil")]
+    assert estadisticas == {"P0300": 2, "P0420": 1}
+    assert aportaciones == estadisticas
+    assert "uq_errores_vehiculo_codigo" in {r["name"] for r in inspect(motor).get_unique_constraints("errores_vehiculos")}
+
+def test_migraciones_no_construyen_la_aplicacion(tmp_path):
+    # Alembic solo necesita los modelos: importar main abriría motores, pools y cachés
+    codigo = (
+        "import sys\n"
+        "from alembic.config import main\n"
+        "main(['-c', sys.argv[1], 'upgrade', 'head'])\n"
+        "assert 'main' not in sys.modules, 'migrar ha importado la aplicación'\n"
+    )
+    entorno = {**os.environ, "DATABASE_URL": f"sqlite:///{tmp_path / 'cli.db'}"}
+    resultado = subprocess.run(
+        [sys.executable, "-c", codigo, str(ALEMBIC_INI)], cwd=ALEMBIC_INI.parent, env=entorno,
+        capture_output=True, text=True,
+    )
+    assert resultado.returncode == 0, resultado.stderr
+    verificar_esquema(create_engine(entorno["DATABASE_URL"]))
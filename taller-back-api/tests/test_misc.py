@@ -11,3 +11,52 @@ async def test_imagen_vehiculo(client):
     resp = await client.get("/car-imagery/", params={"searchTerm": "Mazda 3"})
     assert resp.status_code == 200
     assert "http" in resp.text or "xml" in resp.text  # La respuesta es XML
+
+@pytest.mark.anyio
+async def test_imagen_vehiculo_cache_y_agrupacion(client, monkeypatch, tmp_path):
+    import asyncio
+    import main
+
+    llamadas = []
+
+    async def falsa_consulta(termino):
+        llamadas.append(termino)
+        await asyncio.sleep(0.05)
+        return f"<string>http://img/{termino}</string>"
+
+    monkeypatch.setattr(main, "consultar_carimagery", falsa_consulta)
+    monkeypatch.setattr(main, "cache_imagenes", main.CacheImagenes(10, 60, str(tmp_path / "imagenes.db")))
+
+    respuestas = await asyncio.gather(*[
+        client.get("/car-imagery/", params={"searchTerm": termino})
+        for termino in ["Seat  Leon", "seat leon", "SEAT Leon"]
+    ])
+    assert all(r.status_code == 200 for r in respuestas)
+    assert llamadas == ["seat leon"]
+
+    # El nivel en disco sobrevive a un "reinicio" de la caché en memoria
+    monkeypatch.setattr(main, "cache_imagenes", main.CacheImagenes(10, 60, str(tmp_path / "imagenes.db")))
+    resp = await client.get("/car-imagery/", params={"searchTerm": "Seat Leon"})
+    assert "http://img/seat leon" in resp.text
+    assert len(llamadas) == 1
+
+@pytest.mark.anyio
+async def test_salud_db_y_metricas_pool(client):
+    resp = await client.get("/health/db")
+    assert resp.status_code == 200
+    datos = resp.json()
+    assert datos["estado"] == "ok"
+    assert {"libres", "en_uso", "overflow"} <= set(datos["pool"])
+
+    metricas = await client.get("/metrics")
+    assert "taller_db_pool_checkout_wait_seconds_count" in metricas.text
+
+def test_pool_medido_registra_espera():
+    from sqlalchemy import create_engine, text
+    from main import QueuePoolMedido, metricas_pool
+
+    metricas_pool.reiniciar()
+    motor = create_engine("sqlite:///:memory:", poolclass=QueuePoolMedido, pool_size=1, max_overflow=0)
+    with motor.connect() as conexion:
+        conexion.execute(text("SELECT 1"))
+    assert metricas_pool.resumen()["total"] == 1
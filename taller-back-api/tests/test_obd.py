@@ -0,0 +1,103 @@
+import pytest
+
+from obd_respuestas import (
+    decodificar_dtc, interpretar_dtc, interpretar_multi_pid, interpretar_respuesta_rpm,
+    interpretar_respuesta_velocidad, interpretar_respuesta_vin, leer_vin,
+)
+
+def tramas_can(datos):
+    # Respuesta CAN multi-trama del ELM327: longitud total y tramas numeradas de 6 y 7 bytes
+    hexa = [f"{b:02X}" for b in datos]
+    lineas = [f"{len(datos):03X}", "0: " + " ".join(hexa[:6])]
+    for n, inicio in enumerate(range(6, len(hexa), 7), start=1):
+        lineas.append(f"{n}: " + " ".join((hexa[inicio:inicio + 7] + ["00"] * 7)[:7]))
+    return lineas
+
+def test_decodificar_dtc():
+    assert decodificar_dtc(0x01, 0x33) == "P0133"
+    assert decodificar_dtc(0x41, 0x23) == "C0123"
+    assert decodificar_dtc(0x9A, 0x01) == "B1A01"
+    assert decodificar_dtc(0xC1, 0x00) == "U0100"
+
+def test_interpretar_dtc_iso_y_can():
+    # ISO/KWP: tres códigos por línea, rellenos con 00 00
+    assert interpretar_dtc(["43 01 33 03 00 00 00", "43 04 20 00 00 00 00"], "03", False) == ["P0133", "P0300", "P0420"]
+    # CAN de una trama: el segundo byte es el número de códigos
+    assert interpretar_dtc(["47 02 01 33 C1 00"], "07", True) == ["P0133", "U0100"]
+    # CAN multi-trama con relleno al final
+    assert interpretar_dtc(tramas_can([0x43, 0x04, 0x01, 0x33, 0x02, 0x01, 0x03, 0x00, 0x04, 0x20]), "03", True) == [
+        "P0133", "P0201", "P0300", "P0420"
+    ]
+    # Dos ECUs que informan del mismo código
+    assert interpretar_dtc(["43 01 01 33", "43 01 01 33"], "03", True) == ["P0133"]
+
+@pytest.mark.parametrize("lineas, modo, can", [
+    (["NO DATA"], "03", False),
+    (["SEARCHING...", "UNABLE TO CONNECT"], "03", True),
+    (["43"], "03", True),                       # Sin número de códigos
+    (["43 00"], "03", True),                    # Ningún código
+    (["43 01"], "03", False),                   # Código a medias
+    (["43 01 33"], "07", False),                # Respuesta a otro modo
+    (["43 01 ZZ 00"], "03", True),              # Trama corrupta
+    (["00A"], "03", True),                      # Solo la longitud de una respuesta multi-trama
+])
+def test_interpretar_dtc_tramas_no_validas(lineas, modo, can):
+    assert interpretar_dtc(lineas, modo, can) == []
+
+def test_interpretar_dtc_tramas_incompletas():
+    # El número de códigos promete más de los que llegan: se devuelven los completos
+    assert interpretar_dtc(["43 03 01 33 03"], "03", True) == ["P0133"]
+    # Falta la última trama de una respuesta multi-trama
+    assert interpretar_dtc(tramas_can([0x43, 0x04, 0x01, 0x33, 0x02, 0x01, 0x03, 0x00, 0x04, 0x20])[:2], "03", True) == [
+        "P0133", "P0201"
+    ]
+
+def test_interpretar_multi_pid():
+    valores = interpretar_multi_pid(["41 0C 1A F8 0D 3C 11 80"])
+    assert valores == {"0C": 1726.0, "0D": 60, "11": pytest.approx(50.2, abs=0.1)}
+    # En varias tramas CAN y sin espacios (ATS0)
+    assert interpretar_multi_pid(tramas_can([0x41, 0x0C, 0x1A, 0xF8, 0x0D, 0x3C, 0x05, 0x5A])) == {"0C": 1726.0, "0D": 60, "05": 50}
+    assert interpretar_multi_pid(["410C1AF80D3C"]) == {"0C": 1726.0, "0D": 60}
+    # Dos ECUs (motor y cambio) responden al mismo PID
+    assert interpretar_multi_pid(["41 0D 3C", "41 0D 3C"]) == {"0D": 60}
+
+@pytest.mark.parametrize("lineas, esperado", [
+    (["NO DATA"], {}),
+    (["SEARCHING...", "41 0D 3C"], {"0D": 60}),
+    (["41 0C 1A"], {}),                         # PID de dos bytes con uno solo
+    (["41 0D 3C 0C 1A"], {"0D": 60}),           # Segundo PID truncado
+    (["41 0C ZZ F8"], {}),                      # Trama corrupta
+    (["41 99 00 0D 3C"], {}),                   # PID desconocido: no se puede seguir leyendo
+    (["7F 01 12"], {}),                         # Respuesta negativa
+    ([], {}),
+])
+def test_interpretar_multi_pid_tramas_no_validas(lineas, esperado):
+    assert interpretar_multi_pid(lineas) == esperado
+
+def test_rpm_y_velocidad():
+    assert interpretar_respuesta_rpm(["41 0C 1A F8"]) == 1726.0
+    assert interpretar_respuesta_velocidad(["41 0D 3C"]) == 60
+    assert interpretar_respuesta_rpm(["41 0C 1A"]) == 0
+    assert interpretar_respuesta_velocidad(["NO DATA"]) == 0
+    assert interpretar_respuesta_velocidad(["41 0D"]) == 0
+
+def test_interpretar_vin():
+    vin = "WVWZZZ1KZAW000001"
+    # CAN: "49 02", número de mensajes y los 17 caracteres en tres tramas
+    assert interpretar_respuesta_vin(tramas_can([0x49, 0x02, 0x01] + list(vin.encode()))) == vin
+    # ISO/KWP: cinco líneas numeradas de cuatro bytes, la primera rellena con 00
+    datos = [0, 0, 0] + list(vin.encode())
+    lineas = [f"49 02 {n + 1:02X} " + " ".join(f"{b:02X}" for b in datos[n * 4:n * 4 + 4]) for n in range(5)]
+    assert interpretar_respuesta_vin(lineas) == vin
+    assert leer_vin(lineas) == vin
+
+@pytest.mark.parametrize("lineas", [
+    ["NO DATA"],
+    ["SEARCHING...", "CAN ERROR"],
+    ["014", "0: 49 02 01 57 56 57"],              # Faltan tramas
+    ["49 02 01 00 00 00 57", "49 02 02 ZZ 57 5A 5A"],
+    [],
+])
+def test_leer_vin_incompleto(lineas):
+    with pytest.raises(RuntimeError):
+        leer_vin(lineas)
@@ -0,0 +1,124 @@
+import gzip
+import json
+import struct
+import zlib
+
+import pytest
+import zstandard
+
+from main import codificar_telemetria_columnar, lttb
+
+async def autenticar(client, username):
+    await client.post("/register", json={"username": username, "password": "clave123"})
+    login = await client.post("/login", json={"username": username, "password": "clave123"})
+    return {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+def lote_gzip(lote):
+    return gzip.compress(json.dumps(lote).encode())
+
+@pytest.mark.anyio
+async def test_telemetria_ingesta_y_consulta(client, monkeypatch):
+    headers = await autenticar(client, "teleuser")
+    await client.post("/guardar-vehiculo/", headers=headers, json={
+        "marca": "Seat", "modelo": "Leon", "year": 2020, "rpm": 0, "velocidad": 0, "vin": "VSSZZZ5FZTELE0001", "revision": {}
+    })
+    muestras = [[1000 + i * 0.1, "0c", 800 + (i % 10) * 100] for i in range(1000)]
+    muestras += [[1000 + i * 0.1, "0D", i / 10] for i in range(1000)]
+    cuerpo = lote_gzip({"vin": "VSSZZZ5FZTELE0001", "muestras": muestras})
+    cabeceras = {**headers, "Content-Type": "application/json", "Content-Encoding": "gzip"}
+
+    resp = await client.post("/telemetria/lote", headers=cabeceras, content=cuerpo)
+    assert resp.status_code == 200
+    vehiculo_id = resp.json()["vehiculo_id"]
+    assert resp.json()["muestras"] == 2000
+    # Reenviar el mismo lote no duplica muestras
+    assert (await client.post("/telemetria/lote", headers=cabeceras, content=cuerpo)).status_code == 200
+
+    agregado = (await client.get(f"/telemetria/{vehiculo_id}", headers=headers, params={"pid": "0C,0D", "puntos": 10})).json()
+    cubos = agregado["series"]["0C"]
+    assert len(cubos) == 10
+    assert sum(c["n"] for c in cubos) == 1000
+    assert cubos[0]["min"] == 800 and cubos[0]["max"] == 1700
+    assert agregado["series"]["0D"][-1]["max"] == pytest.approx(99.9)
+
+    reducido = (await client.get(f"/telemetria/{vehiculo_id}", headers=headers, params={
+        "pid": "0D", "puntos": 50, "metodo": "lttb", "desde": 1010, "hasta": 1050
+    })).json()["series"]["0D"]
+    assert len(reducido) == 50
+    assert reducido[0] == [1010, pytest.approx(10)] and reducido[-1] == [1050, pytest.approx(50)]
+
+    monkeypatch.setattr("main.TELEMETRIA_LTTB_MAX_MUESTRAS", 100)
+    excedido = await client.get(f"/telemetria/{vehiculo_id}", headers=headers, params={"pid": "0D", "metodo": "lttb"})
+    assert excedido.status_code == 400
+    acotado = await client.get(f"/telemetria/{vehiculo_id}", headers=headers, params={
+        "pid": "0D", "metodo": "lttb", "desde": 1010, "hasta": 1015
+    })
+    assert len(acotado.json()["series"]["0D"]) == 51
+
+    otro = await autenticar(client, "teleotro")
+    assert (await client.get(f"/telemetria/{vehiculo_id}", headers=otro, params={"pid": "0C"})).status_code == 404
+    assert (await client.post("/telemetria/lote", headers={**otro, "Content-Encoding": "gzip"}, content=cuerpo)).status_code == 404
+
+@pytest.mark.anyio
+async def test_telemetria_rechaza_lotes_no_validos(client, monkeypatch):
+    headers = await autenticar(client, "teleuser2")
+    resp = await client.post("/telemetria/lote", headers={**headers, "Content-Encoding": "gzip"}, content=b"no es gzip")
+    assert resp.status_code == 400
+
+    monkeypatch.setattr("main.TELEMETRIA_MAX_BYTES", 1000)
+    grande = lote_gzip({"vin": "X", "muestras": [[0, "0C", 0]] * 1000})
+    resp = await client.post("/telemetria/lote", headers={**headers, "Content-Encoding": "gzip"}, content=grande)
+    assert resp.status_code == 413
+
+@pytest.mark.anyio
+async def test_telemetria_formato_columnar(client):
+    headers = await autenticar(client, "teleuser3")
+    await client.post("/guardar-vehiculo/", headers=headers, json={
+        "marca": "Seat", "modelo": "Ibiza", "year": 2021, "rpm": 0, "velocidad": 0, "vin": "VSSZZZ6JZTELE0002", "revision": {}
+    })
+    muestras = [[2000 + i * 0.1, "0C", 750.25 + i] for i in range(300)] + [[2000 + i * 0.1, "11", 12.55] for i in range(300)]
+    datos = codificar_telemetria_columnar("VSSZZZ6JZTELE0002", muestras)
+    cabeceras = {**headers, "Content-Type": "application/vnd.taller.telemetria"}
+
+    resp = await client.post("/telemetria/lote", headers={**cabeceras, "Content-Encoding": "zstd"}, content=zstandard.ZstdCompressor().compress(datos))
+    assert resp.status_code == 200
+    assert resp.json()["muestras"] == 600
+    vehiculo_id = resp.json()["vehiculo_id"]
+    resp = await client.post("/telemetria/lote", headers={**cabeceras, "Content-Encoding": "deflate"}, content=zlib.compress(datos))
+    assert resp.status_code == 200
+
+    serie = (await client.get(f"/telemetria/{vehiculo_id}", headers=headers, params={"pid": "0C,11", "puntos": 300, "metodo": "lttb"})).json()["series"]
+    assert serie["0C"] == [[t, v] for t, _, v in muestras[:300]]
+    assert {v for _, v in serie["11"]} == {12.55}
+
+    # Lote truncado
+    resp = await client.post("/telemetria/lote", headers=cabeceras, content=datos[:-3])
+    assert resp.status_code == 400
+
+@pytest.mark.anyio
+async def test_telemetria_columnar_pid_repetido(client):
+    headers = await autenticar(client, "teleuser4")
+    await client.post("/guardar-vehiculo/", headers=headers, json={
+        "marca": "Seat", "modelo": "Leon", "year": 2020, "rpm": 0, "velocidad": 0, "vin": "VSSZZZ5FZTELE0003", "revision": {}
+    })
+    # Dos tramos de la misma grabación del PID 0C, cada uno con su propia serie en el lote
+    tramo1 = codificar_telemetria_columnar("VSSZZZ5FZTELE0003", [[3000 + i, "0C", 800.0 + i] for i in range(5)])
+    tramo2 = codificar_telemetria_columnar("VSSZZZ5FZTELE0003", [[3010 + i, "0C", 900.0 + i] for i in range(5)])
+    cabecera = 8 + len("VSSZZZ5FZTELE0003")
+    datos = tramo1[:cabecera - 2] + struct.pack("<H", 2) + tramo1[cabecera:] + tramo2[cabecera:]
+
+    resp = await client.post("/telemetria/lote", headers={**headers, "Content-Type": "application/vnd.taller.telemetria"}, content=datos)
+    assert resp.status_code == 200
+    assert resp.json()["muestras"] == 10
+    vehiculo_id = resp.json()["vehiculo_id"]
+
+    serie = (await client.get(f"/telemetria/{vehiculo_id}", headers=headers, params={"pid": "0C", "metodo": "lttb"})).json()["series"]["0C"]
+    assert serie == [[3000 + i, 800.0 + i] for i in range(5)] + [[3010 + i, 900.0 + i] for i in range(5)]
+
+def test_lttb_conserva_extremos_y_picos():
+    puntos = [(x, 0.0) for x in range(1000)]
+    puntos[500] = (500, 100.0)
+    reducido = lttb(puntos, 20)
+    assert len(reducido) == 20
+    assert reducido[0] == puntos[0] and reducido[-1] == puntos[-1]
+    assert (500, 100.0) in reducido
@@ -1,3 +1,5 @@
+import json
+
 import pytest
 
 @pytest.mark.anyio
@@ -24,6 +26,7 @@ async def test_guardar_y_obtener_vehiculo(client):
     resp3 = await client.get(f"/mis-vehiculos/{vehiculo_id}", headers=headers)
     assert resp3.status_code == 200
     assert resp3.json()["vin"] == "1HGCM82633A004352"
+    assert set(resp3.json()) == {"id", "marca", "modelo", "year", "rpm", "velocidad", "vin", "revision", "usuario_id", "actualizado_en"}
 
     # Editar
     resp4 = await client.put(f"/editar-vehiculo/{vehiculo_id}", headers=headers, json={
@@ -35,3 +38,210 @@ async def test_guardar_y_obtener_vehiculo(client):
     # Eliminar
     resp5 = await client.delete(f"/eliminar-vehiculo/{vehiculo_id}", headers=headers)
     assert resp5.status_code == 200
+
+@pytest.mark.anyio
+async def test_editar_y_eliminar_con_sentencias_unicas(client):
+    from conftest import TestingSessionLocal
+    from main import CorreoSaliente, ErrorVehiculo, InformeCompartido, RevisionItem, Telemetria
+
+    async def autenticar(username):
+        await client.post("/register", json={"username": username, "password": "clave123"})
+        login = await client.post("/login", json={"username": username, "password": "clave123"})
+        return {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+    headers, otro = await autenticar("cascadauser"), await autenticar("cascadaotro")
+    base = {"marca": "Opel", "modelo": "Astra", "year": 2017, "rpm": 0, "velocidad": 0, "revision": {"Motor": ["Aceite"]}}
+    vehiculo_id = (await client.post("/guardar-vehiculo/", headers=headers, json={**base, "vin": "W0L0AHL0000000001"})).json()["id"]
+    await client.post("/guardar-vehiculo/", headers=headers, json={**base, "vin": "W0L0AHL0000000002"})
+    await client.post("/guardar-errores/", headers=headers, json={"codigo_dtc": ["P0300", "P0171"], "vehiculo_id": vehiculo_id})
+    await client.post("/crear-informe/" + str(vehiculo_id), headers=headers, json={"email": "cliente@test.com"})
+    await client.post("/telemetria/lote", headers=headers, json={"vin": "W0L0AHL0000000001", "muestras": [[1000, "0C", 800]]})
+
+    edicion = {"marca": "Opel", "modelo": "Corsa", "year": 2018, "rpm": 0, "velocidad": 0}
+    assert (await client.put(f"/editar-vehiculo/{vehiculo_id}", headers=otro, json={**edicion, "vin": "W0L0AHL0000000001"})).status_code == 404
+    assert (await client.put(f"/editar-vehiculo/{vehiculo_id}", headers=headers, json={**edicion, "vin": "W0L0AHL0000000002"})).status_code == 400
+    assert (await client.put(f"/editar-vehiculo/{vehiculo_id}", headers=headers, json={**edicion, "vin": "W0L0AHL0000000001"})).status_code == 200
+    assert (await client.get(f"/mis-vehiculos/{vehiculo_id}", headers=headers)).json()["modelo"] == "Corsa"
+
+    db = TestingSessionLocal()
+    try:
+        for modelo in (ErrorVehiculo, InformeCompartido, RevisionItem, Telemetria):
+            assert db.query(modelo).filter(modelo.vehiculo_id == vehiculo_id).count() > 0
+    finally:
+        db.close()
+
+    assert (await client.delete(f"/eliminar-vehiculo/{vehiculo_id}", headers=otro)).status_code == 404
+    resp = await client.delete(f"/eliminar-vehiculo/{vehiculo_id}", headers=headers)
+    assert resp.status_code == 200
+    assert resp.json()["errores_eliminados"] == 2
+
+    # Las filas hijas las borra la base de datos en cascada
+    db = TestingSessionLocal()
+    try:
+        for modelo in (ErrorVehiculo, InformeCompartido, RevisionItem, Telemetria):
+            assert db.query(modelo).filter(modelo.vehiculo_id == vehiculo_id).count() == 0
+        assert db.query(CorreoSaliente).filter(CorreoSaliente.destinatario == "cliente@test.com").count() == 0
+    finally:
+        db.close()
+
+@pytest.mark.anyio
+async def test_mis_vehiculos_paginacion_y_filtros(client):
+    await client.post("/register", json={"username": "flotauser", "password": "clave123"})
+    login = await client.post("/login", json={"username": "flotauser", "password": "clave123"})
+    headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+    for i in range(5):
+        await client.post("/guardar-vehiculo/", headers=headers, json={
+            "marca": "Seat" if i % 2 == 0 else "Kia", "modelo": "Ibiza", "year": 2015 + i,
+            "rpm": 800, "velocidad": 0, "vin": f"VSSZZZ6JZAR00000{i}", "revision": {}
+        })
+
+    # Recorre todas las páginas siguiendo el cursor
+    vistos, cursor = [], None
+    while True:
+        params = {"limite": 2, **({"cursor": cursor} if cursor else {})}
+        resp = await client.get("/mis-vehiculos/", headers=headers, params=params)
+        assert resp.status_code == 200
+        vistos += [v["id"] for v in resp.json()["vehiculos"]]
+        cursor = resp.json()["siguiente_cursor"]
+        if not cursor:
+            break
+    assert len(vistos) == 5 and vistos == sorted(vistos)
+
+    # Filtros y proyección de campos
+    resp = await client.get("/mis-vehiculos/", headers=headers, params={"marca": "Seat", "fields": "vin"})
+    vehiculos = resp.json()["vehiculos"]
+    assert len(vehiculos) == 3
+    assert set(vehiculos[0]) == {"id", "vin"}
+
+    resp = await client.get("/mis-vehiculos/", headers=headers, params={"vin": "VSSZZZ6JZAR000004"})
+    assert len(resp.json()["vehiculos"]) == 1
+
+    resp = await client.get("/mis-vehiculos/", headers=headers, params={"fields": "password"})
+    assert resp.status_code == 400
+
+@pytest.mark.anyio
+async def test_mis_vehiculos_sin_paginar_devuelve_todo(client, monkeypatch):
+    monkeypatch.setattr("main.LIMITE_VEHICULOS_DEFECTO", 2)  # Lista más larga que una página
+    await client.post("/register", json={"username": "listauser", "password": "clave123"})
+    login = await client.post("/login", json={"username": "listauser", "password": "clave123"})
+    headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+    for i in range(5):
+        await client.post("/guardar-vehiculo/", headers=headers, json={
+            "marca": "Seat", "modelo": "Ibiza", "year": 2015, "rpm": 800, "velocidad": 0,
+            "vin": f"VSSZZZ6JZBR00000{i}", "revision": {}
+        })
+
+    # Sin limite ni cursor (como el frontend) llega la flota completa
+    resp = await client.get("/mis-vehiculos/", headers=headers)
+    assert len(resp.json()["vehiculos"]) == 5
+    assert resp.json()["siguiente_cursor"] is None
+
+    # Con cursor y sin limite se pagina con el tamaño por defecto
+    primera = await client.get("/mis-vehiculos/", headers=headers, params={"limite": 2})
+    segunda = await client.get("/mis-vehiculos/", headers=headers, params={"cursor": primera.json()["siguiente_cursor"]})
+    assert len(segunda.json()["vehiculos"]) == 2
+    assert segunda.json()["siguiente_cursor"] is not None
+
+@pytest.mark.anyio
+async def test_sesion_sincrona_con_db_async_desactivado(client):
+    # Con DB_ASYNC=False los endpoints reciben una SesionSincrona con la misma interfaz
+    from main import SesionSincrona, app, get_db
+    from conftest import TestingSessionLocal
+
+    async def override_sincrono():
+        db = SesionSincrona(TestingSessionLocal())
+        try:
+            yield db
+            await db.commit()
+        finally:
+            await db.close()
+
+    original = app.dependency_overrides[get_db]
+    app.dependency_overrides[get_db] = override_sincrono
+    try:
+        await client.post("/register", json={"username": "syncuser", "password": "clave123"})
+        login = await client.post("/login", json={"username": "syncuser", "password": "clave123"})
+        headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+        resp = await client.post("/guardar-vehiculo/", headers=headers, json={
+            "marca": "Seat", "modelo": "Ibiza", "year": 2018,
+            "rpm": 900, "velocidad": 0, "vin": "VSSZZZ6JZJR000001", "revision": {}
+        })
+        assert resp.status_code == 200
+        vehiculo_id = resp.json()["id"]
+
+        errores = await client.post("/guardar-errores/", headers=headers, json={"vehiculo_id": vehiculo_id, "codigo_dtc": ["P0300"]})
+        assert errores.status_code == 200
+
+        exportado = await client.get("/exportar", headers=headers, params={"formato": "ndjson"})
+        assert exportado.text.count("P0300") == 1
+
+        eliminado = await client.delete(f"/eliminar-vehiculo/{vehiculo_id}", headers=headers)
+        assert eliminado.json()["errores_eliminados"] == 1
+    finally:
+        app.dependency_overrides[get_db] = original
+
+@pytest.mark.anyio
+async def test_buscar_revisiones_por_parte_y_detalle(client):
+    await client.post("/register", json={"username": "revuser", "password": "clave123"})
+    login = await client.post("/login", json={"username": "revuser", "password": "clave123"})
+    headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+    revisiones = [
+        {"Frenos": ["Pastillas", "Discos"], "Motor": ["Aceite"]},
+        {"Frenos": ["Discos"]},
+        {"Motor": ["Correa"]},
+    ]
+    for i, revision in enumerate(revisiones):
+        resp = await client.post("/guardar-vehiculo/", headers=headers, json={
+            "marca": "Ford", "modelo": "Focus", "year": 2017,
+            "rpm": 800, "velocidad": 0, "vin": f"WF0XXXGCDX000000{i}", "revision": revision
+        })
+        assert resp.status_code == 200
+
+    # La revisión se devuelve como JSON, no como texto
+    lista = await client.get("/mis-vehiculos/", headers=headers)
+    assert lista.json()["vehiculos"][0]["revision"] == revisiones[0]
+
+    frenos = await client.get("/revisiones/buscar", headers=headers, params={"parte": "Frenos"})
+    assert [v["vin"][-1] for v in frenos.json()["vehiculos"]] == ["0", "1"]
+    assert frenos.json()["vehiculos"][0]["detalles"] == ["Pastillas", "Discos"]
+
+    pastillas = await client.get("/revisiones/buscar", headers=headers, params={"parte": "Frenos", "detalle": "Pastillas"})
+    assert len(pastillas.json()["vehiculos"]) == 1
+
+@pytest.mark.anyio
+async def test_exportar_csv_y_ndjson(client, monkeypatch):
+    import csv
+    import io
+    monkeypatch.setattr("main.EXPORTAR_LOTE", 2)  # Fuerza varias particiones
+
+    await client.post("/register", json={"username": "exportuser", "password": "clave123"})
+    login = await client.post("/login", json={"username": "exportuser", "password": "clave123"})
+    headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+    ids = []
+    for i in range(3):
+        resp = await client.post("/guardar-vehiculo/", headers=headers, json={
+            "marca": "Opel", "modelo": "Astra", "year": 2016, "rpm": 800, "velocidad": 0,
+            "vin": f"W0L0AHL350000000{i}", "revision": {"Motor": ["Aceite"]}
+        })
+        ids.append(resp.json()["id"])
+    await client.post("/guardar-errores/", headers=headers, json={"vehiculo_id": ids[0], "codigo_dtc": ["P0300", "P0420", "P0171"]})
+
+    resp = await client.get("/exportar", headers=headers, params={"formato": "csv"})
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/csv")
+    filas = list(csv.DictReader(io.StringIO(resp.text)))
+    assert len(filas) == 5  # 3 errores del primer vehículo + 2 vehículos sin errores
+    assert json.loads(filas[0]["revision"]) == {"Motor": ["Aceite"]}
+
+    resp = await client.get("/exportar", headers=headers, params={"formato": "ndjson"})
+    vehiculos = [json.loads(linea) for linea in resp.text.splitlines()]
+    assert [v["id"] for v in vehiculos] == ids
+    assert [e["codigo_dtc"] for e in vehiculos[0]["errores"]] == ["P0300", "P0420", "P0171"]
+    assert vehiculos[1]["errores"] == []
+
+    assert (await client.get("/exportar", headers=headers, params={"formato": "xml"})).status_code == 400